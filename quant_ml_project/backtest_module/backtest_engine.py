@@ -1 +1,304 @@
 # 回测引擎核心（撮合、资金管理）
+"""
+回测引擎
+
+包含两种运行模式：
+1. BacktestEngine：单标的逐日循环引擎，逻辑直观，作为结果校验的基准
+2. PanelBacktestEngine：多股票面板引擎，输入（日期 × 股票代码）的信号矩阵和价格矩阵，
+   用数组运算一次性算出全市场的持仓、成交、资金与每日净值，结果与逐日循环引擎一致
+
+面板引擎的交易规则与循环引擎完全相同（每只股票视为一个独立账户）：
+- 信号1且空仓时按当日价格买入；信号-1且持仓时按当日价格卖出
+- 卖出时的收益 = (卖出价 - 买入价) / 买入价 × 当前资金
+- 每日资金只在卖出时更新（不做持仓盯市）
+- 可选的风控（main_app.risk_manager.RiskManager）在撮合前对整张信号矩阵做数组运算：止损、指数熔断
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from backtest_module.performance_analyzer import PerformanceAccumulator
+from config import project_config as cfg
+from main_app.utils.logger import get_logger
+from main_app.utils.profiler import instrument
+
+logger = get_logger(__name__)
+
+class BacktestEngine:
+    def __init__(self, initial_capital=100000, verbose=False):
+        """
+        初始化回测引擎
+        :param initial_capital: 初始资金，默认100000元
+        :param verbose: 是否以INFO级别逐笔输出成交信息；为False时逐笔信息为DEBUG级别，日志级别高于DEBUG时不格式化、不输出
+        """
+        self.initial_capital = initial_capital  # 初始资金
+        self.current_capital = initial_capital  # 当前资金
+        self.verbose = verbose
+        self.daily_capital = []  # 记录每日总资产
+        self.trades = []  # 记录每笔交易：(日期, 信号, 收益)
+        self.metrics = PerformanceAccumulator()  # 逐日推入资产的流式绩效累加器
+
+    def run(self, signals, prices):
+        """
+        核心运行函数：循环每一天，根据信号模拟买卖
+        :param signals: 交易信号列表，1=买入，-1=卖出，0=空仓，长度与prices一致
+        :param prices: 每日价格列表，长度与signals一致
+        """
+        if len(signals) != len(prices):
+            raise ValueError("信号列表和价格列表长度必须一致")
+
+        holding = False  # 是否持有仓位
+        buy_price = 0  # 买入价格
+        fill_level = logging.INFO if self.verbose else logging.DEBUG
+        log_fills = logger.isEnabledFor(fill_level)  # 循环外判断一次，关闭时热循环中没有日志开销
+
+        # 循环每一天处理信号
+        for day in range(len(signals)):
+            signal = signals[day]
+            price = prices[day]
+
+            # 处理买入信号
+            if signal == 1 and not holding:
+                buy_price = price
+                holding = True
+                self.metrics.record_fill(self.current_capital)
+                if log_fills:
+                    logger.log(fill_level, "第%d天：买入，价格=%.2f", day + 1, price)
+
+            # 处理卖出信号
+            elif signal == -1 and holding:
+                profit = (price - buy_price) / buy_price * self.current_capital
+                self.metrics.record_fill(self.current_capital + profit, profit)
+                self.current_capital += profit
+                self.trades.append((day+1, "sell", profit))
+                holding = False
+                if log_fills:
+                    logger.log(fill_level, "第%d天：卖出，价格=%.2f，单笔收益=%.2f", day + 1, price, profit)
+
+            # 记录当日总资产
+            self.daily_capital.append(self.current_capital)
+            self.metrics.update(self.current_capital)
+
+    def calculate_performance(self):
+        """
+        计算绩效指标：总收益率、最大回撤、胜率
+        :return: 指标字典，max_drawdown为非正数（定义同performance_analyzer）
+        """
+        if not self.daily_capital:
+            raise RuntimeError("请先调用run()执行回测")
+
+        # 1. 总收益率
+        total_return = (self.current_capital - self.initial_capital) / self.initial_capital
+
+        # 2. 最大回撤、胜率：取自逐日累加的指标，不再回扫资金曲线
+        snapshot = self.metrics.snapshot()
+        max_drawdown = snapshot["max_drawdown"]
+        win_rate = snapshot["win_rate"]
+
+        # 输出结果
+        logger.info("回测绩效指标：初始资金 %.2f 元，最终资金 %.2f 元，总收益率 %.2f%%，最大回撤 %.2f%%，"
+                    "交易胜率 %.2f%%（盈利交易%d/%d笔）", self.initial_capital, self.current_capital,
+                    total_return * 100, max_drawdown * 100, win_rate * 100, snapshot["win_count"],
+                    snapshot["trade_count"])
+
+        return {
+            "total_return": total_return,
+            "max_drawdown": max_drawdown,
+            "win_rate": win_rate
+        }
+
+
+def _ffill_2d(values, mask):
+    """
+    按列（时间轴）前向填充：mask为True的位置保留原值，其余位置沿用上一个有效值
+    :param values: 二维数组（日期 × 股票）
+    :param mask: 与values同形状的布尔数组，标记有效值
+    :return: 填充后的二维数组，首个有效值之前为NaN
+    """
+    n_days = values.shape[0]
+    idx = np.where(mask, np.arange(n_days)[:, None], -1)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    filled = values[np.maximum(idx, 0), np.arange(values.shape[1])]
+    return np.where(idx >= 0, filled, np.nan)
+
+
+def build_panel(signal_df, price_df, price_col="close"):
+    """
+    把长表格式的信号与价格数据转成对齐的宽表矩阵（日期 × 股票代码）
+    :param signal_df: 信号长表，至少包含date、stock_code、signal三列（signal.csv格式）
+    :param price_df: 价格长表，至少包含date、stock_code和price_col列（standard_data格式）
+    :param price_col: 撮合使用的价格列，默认收盘价
+    :return: (signal_matrix, price_matrix) 两个索引、列完全一致的DataFrame
+    """
+    signal_matrix = signal_df.pivot(index="date", columns="stock_code", values="signal")
+    price_matrix = price_df.pivot(index="date", columns="stock_code", values=price_col)
+
+    # 以价格矩阵为准对齐，没有信号的日期视为0（无操作）
+    signal_matrix = signal_matrix.reindex(index=price_matrix.index, columns=price_matrix.columns)
+    signal_matrix = signal_matrix.fillna(0).astype(np.int8)
+    return signal_matrix, price_matrix
+
+
+@instrument()
+def load_panel(signal_path=cfg.SIGNAL_STORE_PATH, price_path=cfg.STANDARD_DATA_FILE, price_col="close"):
+    """
+    从信号与standard_data.parquet读取数据并构建面板矩阵
+    只读取需要的列，避免把整个行情文件加载进内存
+    :param signal_path: 二进制信号存储目录（SignalStore，内存映射直接得到信号矩阵），或signal.csv文件
+    :param price_path: 标准化行情文件路径（parquet）
+    :param price_col: 撮合使用的价格列
+    :return: (signal_matrix, price_matrix)
+    """
+    price_df = pd.read_parquet(price_path, columns=["date", "stock_code", price_col])
+    price_df["date"] = pd.to_datetime(price_df["date"])
+    price_df["stock_code"] = price_df["stock_code"].astype(str)
+    if os.path.isdir(signal_path):
+        from main_app.data_interface import SignalStore
+
+        price_matrix = price_df.pivot(index="date", columns="stock_code", values=price_col)
+        signal_matrix = SignalStore(signal_path).matrix(price_matrix.index[0], price_matrix.index[-1])
+        signal_matrix = signal_matrix.reindex(index=price_matrix.index, columns=price_matrix.columns, fill_value=0)
+        return signal_matrix, price_matrix
+    signal_df = pd.read_csv(signal_path, usecols=["date", "stock_code", "signal"],
+                            dtype={"stock_code": str}, parse_dates=["date"])
+    return build_panel(signal_df, price_df, price_col)
+
+
+class PanelBacktestEngine:
+    def __init__(self, initial_capital=100000, risk_manager=None):
+        """
+        初始化面板回测引擎
+        :param initial_capital: 每只股票独立账户的初始资金，默认100000元（与BacktestEngine一致）
+        :param risk_manager: 可选的RiskManager，撮合前对信号矩阵施加止损与熔断规则
+        """
+        self.initial_capital = initial_capital
+        self.risk_manager = risk_manager
+        self.positions = None  # 每日收盘后是否持仓（日期 × 股票，布尔）
+        self.capital = None  # 每日资金（日期 × 股票）
+        self.nav = None  # 每只股票的每日净值（资金 / 初始资金）
+        self.portfolio_nav = None  # 等权组合净值（各账户净值的均值）
+        self.trades = None  # 成交记录长表：date, stock_code, side, price, profit
+
+    @instrument("panel_backtest")
+    def run(self, signal_matrix, price_matrix):
+        """
+        用数组运算一次性完成全部股票的回测，热路径上不做任何打印
+        :param signal_matrix: 信号宽表（日期 × 股票代码），1=买入，-1=卖出，0=空仓
+        :param price_matrix: 价格宽表，索引与列需与signal_matrix一致
+        :return: self，方便链式调用calculate_performance()
+        """
+        if signal_matrix.shape != price_matrix.shape:
+            raise ValueError("信号矩阵和价格矩阵形状必须一致")
+        if not (signal_matrix.index.equals(price_matrix.index)
+                and signal_matrix.columns.equals(price_matrix.columns)):
+            raise ValueError("信号矩阵和价格矩阵的日期、股票代码必须对齐，可先调用build_panel()")
+        if self.risk_manager is not None:
+            signal_matrix = self.risk_manager.apply_signals(signal_matrix, price_matrix)
+
+        prices = price_matrix.to_numpy(dtype=np.float64)
+        signals = signal_matrix.to_numpy(dtype=np.float64)
+        # 无价格（停牌、未上市）的日期不能成交，信号视为0
+        signals = np.where(np.isnan(prices), 0.0, signals)
+
+        # 1. 持仓状态：最近一个非0信号为1即持仓（重复买入/空仓卖出信号自动忽略）
+        last_signal = _ffill_2d(signals, signals != 0)
+        holding = last_signal == 1
+        prev_holding = np.zeros_like(holding)
+        prev_holding[1:] = holding[:-1]
+
+        # 2. 成交：由持仓状态的变化得到买入点和卖出点
+        buy = holding & ~prev_holding
+        sell = ~holding & prev_holding
+
+        # 3. 卖出收益率：卖出价相对最近一次买入价
+        buy_price = _ffill_2d(prices, buy)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            trade_return = np.where(sell, (prices - buy_price) / buy_price, 0.0)
+
+        # 4. 资金曲线：每次卖出时资金按收益率复利增长
+        capital = self.initial_capital * np.cumprod(1.0 + trade_return, axis=0)
+        capital_before = np.empty_like(capital)
+        capital_before[0] = self.initial_capital
+        capital_before[1:] = capital[:-1]
+        profit = trade_return * capital_before
+
+        # 5. 整理输出
+        index, columns = price_matrix.index, price_matrix.columns
+        self.positions = pd.DataFrame(holding, index=index, columns=columns)
+        self.capital = pd.DataFrame(capital, index=index, columns=columns)
+        self.nav = self.capital / self.initial_capital
+        self.portfolio_nav = self.nav.mean(axis=1).rename("portfolio_nav")
+        self.trades = self._collect_trades(buy, sell, prices, profit, index, columns)
+        return self
+
+    @staticmethod
+    def _collect_trades(buy, sell, prices, profit, index, columns):
+        """把买卖点矩阵转换为成交记录长表（按日期、股票代码排序）"""
+        day_idx, stock_idx = np.nonzero(buy | sell)
+        is_sell = sell[day_idx, stock_idx]
+        trades = pd.DataFrame({
+            "date": index[day_idx],
+            "stock_code": columns[stock_idx],
+            "side": np.where(is_sell, "sell", "buy"),
+            "price": prices[day_idx, stock_idx],
+            "profit": np.where(is_sell, profit[day_idx, stock_idx], np.nan),
+        })
+        return trades
+
+    def calculate_performance(self):
+        """
+        向量化计算每只股票账户的绩效指标：总收益率、最大回撤、胜率、交易次数
+        :return: 以stock_code为索引的绩效DataFrame，max_drawdown为非正数（定义同performance_analyzer）
+        """
+        if self.capital is None:
+            raise RuntimeError("请先调用run()执行回测")
+
+        capital = self.capital.to_numpy()
+
+        # 1. 总收益率
+        total_return = capital[-1] / self.initial_capital - 1
+
+        # 2. 最大回撤
+        peak = np.maximum.accumulate(capital, axis=0)
+        max_drawdown = ((capital - peak) / peak).min(axis=0)
+
+        # 3. 胜率（盈利卖出笔数 / 卖出笔数，无交易记为0）
+        sells = self.trades[self.trades["side"] == "sell"]
+        trade_count = sells.groupby("stock_code").size().reindex(self.capital.columns, fill_value=0)
+        win_count = (sells[sells["profit"] > 0].groupby("stock_code").size()
+                     .reindex(self.capital.columns, fill_value=0))
+        win_rate = np.where(trade_count > 0, win_count / trade_count.clip(lower=1), 0.0)
+
+        return pd.DataFrame({
+            "total_return": total_return,
+            "max_drawdown": max_drawdown,
+            "win_rate": win_rate,
+            "trade_count": trade_count.to_numpy(),
+        }, index=self.capital.columns)
+
+
+# 测试代码
+if __name__ == "__main__":
+    from main_app.utils.logger import setup_logging
+    setup_logging()
+
+    # 模拟信号（1=买入，-1=卖出，0=空仓）
+    test_signals = [1, 0, 0, -1, 1, 0, -1, 0, 1, -1]
+    # 模拟价格数据
+    test_prices = [10, 10.2, 10.5, 10.8, 10.6, 10.9, 11.2, 11.0, 11.5, 12.0]
+
+    # 逐日循环引擎
+    engine = BacktestEngine(initial_capital=100000, verbose=True)
+    engine.run(test_signals, test_prices)
+    engine.calculate_performance()
+
+    # 面板引擎：同一组数据应得到相同结果
+    dates = pd.date_range("2023-01-02", periods=len(test_prices), freq="B")
+    panel_signals = pd.DataFrame({"000001": test_signals}, index=dates)
+    panel_prices = pd.DataFrame({"000001": test_prices}, index=dates)
+    panel = PanelBacktestEngine(initial_capital=100000).run(panel_signals, panel_prices)
+    print("\n面板引擎绩效：")
+    print(panel.calculate_performance())
+    print(f"与循环引擎每日资金一致：{np.allclose(panel.capital['000001'], engine.daily_capital)}")
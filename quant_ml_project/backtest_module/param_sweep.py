@@ -0,0 +1,158 @@
+# 均线交叉策略参数网格扫描
+"""
+均线交叉策略的参数网格扫描
+
+规则与 均线趋势法.backtest_ma_cross 完全一致：
+- 均线用 rolling(window, min_periods=1).mean()
+- 金叉（短均线上穿长均线）买入、死叉卖出，持仓状态前向延续
+- 策略日收益 = 前一日持仓 × 当日涨跌幅，前一日出现买入信号时扣除一次交易成本
+- 年化收益 = 期末净值^(252/交易日数) - 1；夏普 = √252 × 均值 / (标准差 + 1e-6)
+- 最大回撤 = min(净值 / 运行峰值 - 1)，非正数（与performance_analyzer、回测引擎一致）
+
+不同之处在于一次调用评估整个网格（短均线 × 长均线 × 交易成本 × 标的）：
+- 每个窗口的均线只用累加和算一次，所有参数对共享
+- 参数对按批堆成三维数组（参数对 × 日期 × 标的），信号、净值、指标都是数组运算
+- 热路径上不画图、不写文件，只返回一张指标表
+"""
+import numpy as np
+import pandas as pd
+
+ANNUAL_DAYS = 252
+
+
+def rolling_means(price_matrix, windows):
+    """
+    用累加和一次性计算多个窗口的均线（等价于rolling(window, min_periods=1).mean()）
+    :param price_matrix: 价格数组（日期 × 标的），首个有效价格之前为NaN
+    :param windows: 窗口列表
+    :return: {窗口: 均线数组}，首个有效价格之前为NaN
+    """
+    valid = ~np.isnan(price_matrix)
+    csum = np.vstack([np.zeros((1, price_matrix.shape[1])), np.cumsum(np.where(valid, price_matrix, 0.0), axis=0)])
+    ccount = np.vstack([np.zeros((1, price_matrix.shape[1])), np.cumsum(valid, axis=0)])
+    means = {}
+    for window in windows:
+        lag = np.maximum(np.arange(1, len(price_matrix) + 1) - window, 0)
+        count = ccount[1:] - ccount[lag]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means[window] = np.where(count > 0, (csum[1:] - csum[lag]) / count, np.nan)
+    return means
+
+
+def _evaluate_pairs(ma_short, ma_long, returns, valid, costs):
+    """
+    批量评估一批参数对
+    :param ma_short: 短均线（参数对 × 日期 × 标的）
+    :param ma_long: 长均线，形状同上
+    :param returns: 标的日收益率（日期 × 标的），无效位置为0
+    :param valid: 有效收益日（日期 × 标的），即首个有效价格之后的交易日
+    :param costs: 交易成本列表
+    :return: {成本: {指标名: 数组(参数对 × 标的)}}
+    """
+    # 1. 金叉/死叉：当日短均线在上（下），前一日不在上（下）；首个有效价格当天没有前一日，不产生信号
+    above, below = ma_short > ma_long, ma_short < ma_long
+    golden = np.zeros_like(above)
+    death = np.zeros_like(above)
+    np.greater(above[:, 1:], above[:, :-1], out=golden[:, 1:])
+    np.greater(below[:, 1:], below[:, :-1], out=death[:, 1:])
+    golden &= valid
+    death &= valid
+    trade_count = golden.sum(axis=1) + death.sum(axis=1)
+
+    # 2. 持仓：金叉后持有到死叉。两线不相等时持仓状态就是"短均线在上"，
+    #    只有两线恰好相等（或还没有均线）的日子才沿用前一日的状态；
+    #    相等日的前一日不是持仓状态时沿用的结果就是空仓，与above一致，只需处理"持仓后出现相等"的情况
+    position = above
+    tie = ~(above | below)
+    if (tie[:, 1:] & above[:, :-1]).any():
+        steps = np.arange(above.shape[1])[None, :, None]
+        last_state = np.maximum.accumulate(np.where(tie, -1, steps), axis=1)
+        position = np.take_along_axis(above, np.maximum(last_state, 0), axis=1) & (last_state >= 0)
+
+    # 3. 前一日持仓的收益，前一日金叉买入时扣除成本
+    gross = np.zeros(above.shape)
+    np.multiply(position[:, :-1], returns[1:], out=gross[:, 1:])
+    n_days = valid.sum(axis=0)
+
+    out = {}
+    for cost in costs:
+        daily = gross.copy()
+        daily[:, 1:] -= cost * golden[:, :-1]
+        # 首个有效交易日不可能持仓或买入，净值为1，与有效区之前一致，因此峰值无需屏蔽
+        nav = np.cumprod(1.0 + daily, axis=1)
+        drawdown = (nav / np.maximum.accumulate(nav, axis=1)).min(axis=1) - 1.0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = daily.sum(axis=1) / n_days
+            std = np.sqrt(np.maximum(np.einsum("ptn,ptn->pn", daily, daily) - n_days * mean ** 2, 0) / (n_days - 1))
+            final_nav = nav[:, -1]
+            out[cost] = {
+                "total_return": final_nav - 1,
+                "annual_return": final_nav ** (ANNUAL_DAYS / n_days) - 1,
+                "max_drawdown": drawdown,
+                "sharpe": np.sqrt(ANNUAL_DAYS) * mean / (std + 1e-6),
+                "trade_count": trade_count,
+            }
+    return out
+
+
+def sweep_ma_cross(price_matrix, short_windows=(5, 10, 20), long_windows=(20, 30, 60), costs=(0.001,),
+                   instruments=None, max_cells=4_000_000):
+    """
+    均线交叉策略参数网格扫描
+    :param price_matrix: 收盘价宽表（日期 × 标的，如build_panel返回的price_matrix），
+                         上市前为NaN，中间停牌的缺失价格按前值填充
+    :param short_windows: 短均线窗口网格
+    :param long_windows: 长均线窗口网格，只评估 短窗口 < 长窗口 的组合
+    :param costs: 交易成本网格（每次买入扣除的比例，均线趋势法默认0.001）
+    :param instruments: 参与扫描的标的列表，None表示price_matrix的全部列
+    :param max_cells: 每批三维数组（参数对 × 日期 × 标的）的最大元素数，控制峰值内存
+    :return: 指标表，每行一个（short, long, cost, stock_code）：
+             total_return, annual_return, max_drawdown, sharpe, trade_count
+    """
+    if instruments is not None:
+        price_matrix = price_matrix[list(instruments)]
+    prices = price_matrix.ffill().to_numpy(dtype=np.float64)
+    codes = np.asarray(price_matrix.columns)
+    pairs = [(s, l) for s in sorted(set(short_windows)) for l in sorted(set(long_windows)) if s < l]
+    if not pairs:
+        raise ValueError("没有满足 短窗口 < 长窗口 的参数组合")
+
+    # 1. 所有窗口的均线只算一次
+    means = rolling_means(prices, sorted({w for pair in pairs for w in pair}))
+
+    # 2. 标的日收益率；有效收益日为首个有效价格之后的交易日（与pct_change后dropna一致）
+    returns = np.zeros_like(prices)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns[1:] = prices[1:] / prices[:-1] - 1
+    valid = np.zeros(prices.shape, dtype=bool)
+    valid[1:] = ~np.isnan(prices[1:]) & ~np.isnan(prices[:-1])
+    returns = np.where(valid, returns, 0.0)
+
+    # 3. 参数对分批堆叠评估
+    batch = max(1, int(max_cells // max(prices.size, 1)))
+    frames = []
+    for start in range(0, len(pairs), batch):
+        chunk = pairs[start:start + batch]
+        ma_short = np.stack([means[s] for s, _ in chunk])
+        ma_long = np.stack([means[l] for _, l in chunk])
+        for cost, metrics in _evaluate_pairs(ma_short, ma_long, returns, valid, costs).items():
+            frame = pd.DataFrame({name: values.ravel() for name, values in metrics.items()})
+            frame.insert(0, "stock_code", np.tile(codes, len(chunk)))
+            frame.insert(0, "cost", cost)
+            frame.insert(0, "long", np.repeat([l for _, l in chunk], len(codes)))
+            frame.insert(0, "short", np.repeat([s for s, _ in chunk], len(codes)))
+            frames.append(frame)
+    return pd.concat(frames, ignore_index=True).sort_values(["short", "long", "cost", "stock_code"],
+                                                            ignore_index=True)
+
+
+def summarize_sweep(results, metric="sharpe"):
+    """
+    把逐标的结果汇总为每组参数在全部标的上的均值，按metric降序排列
+    :param results: sweep_ma_cross的返回值
+    :param metric: 排序使用的指标
+    :return: 每行一组(short, long, cost)的汇总表
+    """
+    summary = results.groupby(["short", "long", "cost"])[
+        ["total_return", "annual_return", "max_drawdown", "sharpe", "trade_count"]].mean()
+    return summary.sort_values(metric, ascending=False).reset_index()
@@ -1 +1,474 @@
 # 绩效指标计算与分析
+"""
+绩效指标计算
+
+两种形式，指标定义完全相同：
+1. PerformanceAccumulator：流式累加器，每推入一根K线（当日净值/资产）或一笔成交只做O(1)更新，
+   维护运行峰值与回撤、Welford均值/方差、盈亏笔数、成交额；任意时刻可snapshot()取出当前指标，
+   适合模拟盘监控和逐日循环回测，不需要回扫历史
+2. batch_performance：向量化批量形式，对成千上万列净值一次性计算同样的指标，适合参数扫描
+
+指标定义：
+- 日收益率 r_t = V_t / V_{t-1} - 1
+- total_return = V_last / V_first - 1；annual_return = (1 + total_return)^(年交易日 / 收益天数) - 1
+- volatility = 日收益标准差(ddof=1) × √年交易日；sharpe = (日均收益 - 日无风险利率) / 日收益标准差 × √年交易日
+- max_drawdown = min(V_t / 运行峰值 - 1)，非正数；回测引擎、组合回测、参数扫描（param_sweep）、
+  批量回测（batch_backtest）都使用这一约定
+- win_rate = 盈利平仓笔数 / 平仓笔数；turnover = 累计成交额 / 平均资产
+
+稳健性分析：单条回测路径只给出一个夏普、一个回撤，这里在成千上万条重采样路径上重新计算指标，给出置信区间：
+- bootstrap_analysis：日收益率的平稳/块自助法
+- trade_shuffle_analysis：交易顺序打乱
+- perturbation_analysis：信号延迟与交易成本的随机扰动
+所有路径按批生成为（路径 × 日期）数组一次性评估，每批元素数不超过max_cells，内存占用有上界
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+
+# 指标字段顺序（snapshot与batch_performance共用）
+METRIC_NAMES = ["total_return", "annual_return", "volatility", "sharpe", "max_drawdown", "current_drawdown",
+                "win_rate", "win_count", "loss_count", "trade_count", "turnover", "bars"]
+
+
+class PerformanceAccumulator:
+    def __init__(self, initial_value=None, annual_days=cfg.ANNUAL_TRADING_DAYS, risk_free_rate=cfg.RISK_FREE_RATE):
+        """
+        初始化流式绩效累加器
+        :param initial_value: 初始净值/资金，None表示以第一次update()的值为起点
+        :param annual_days: 年化交易日数
+        :param risk_free_rate: 年化无风险利率
+        """
+        self.annual_days = annual_days
+        self.daily_rf = risk_free_rate / annual_days
+        self.first_value = initial_value
+        self.last_value = initial_value
+        self.peak = initial_value
+        self.max_drawdown = 0.0
+        self.bars = 0 if initial_value is None else 1  # 已推入的资产值个数
+        self.value_sum = 0.0 if initial_value is None else float(initial_value)
+        # Welford在线均值/方差（日收益率）
+        self.n_returns = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # 成交统计
+        self.win_count = 0
+        self.loss_count = 0
+        self.trade_count = 0
+        self.traded_amount = 0.0
+
+    def update(self, value):
+        """
+        推入一根K线的资产值（收盘后的净值或总资产）
+        :param value: 当日资产值
+        :return: self
+        """
+        value = float(value)
+        if self.last_value is None:
+            self.first_value = self.last_value = self.peak = value
+            self.bars, self.value_sum = 1, value
+            return self
+
+        # 1. Welford更新日收益率的均值与二阶中心矩
+        r = value / self.last_value - 1
+        self.n_returns += 1
+        delta = r - self.mean
+        self.mean += delta / self.n_returns
+        self.m2 += delta * (r - self.mean)
+
+        # 2. 运行峰值与回撤
+        self.peak = max(self.peak, value)
+        self.max_drawdown = min(self.max_drawdown, value / self.peak - 1)
+
+        self.last_value = value
+        self.bars += 1
+        self.value_sum += value
+        return self
+
+    def record_fill(self, amount, profit=None):
+        """
+        记录一笔成交
+        :param amount: 成交金额（计入成交额，取绝对值）
+        :param profit: 平仓盈亏；开仓成交传None，不计入胜负
+        :return: self
+        """
+        self.traded_amount += abs(float(amount))
+        if profit is not None:
+            self.trade_count += 1
+            if profit > 0:
+                self.win_count += 1
+            else:
+                self.loss_count += 1
+        return self
+
+    def snapshot(self):
+        """
+        当前时刻的全部指标（不修改累加器状态）
+        :return: 指标字典，字段见METRIC_NAMES
+        """
+        n = self.n_returns
+        total_return = self.last_value / self.first_value - 1 if self.first_value else 0.0
+        std = math.sqrt(self.m2 / (n - 1)) if n > 1 else float("nan")
+        mean_value = self.value_sum / self.bars if self.bars else float("nan")
+        return {
+            "total_return": total_return,
+            "annual_return": (1 + total_return) ** (self.annual_days / n) - 1 if n else 0.0,
+            "volatility": std * math.sqrt(self.annual_days),
+            "sharpe": (self.mean - self.daily_rf) / std * math.sqrt(self.annual_days) if std > 0 else float("nan"),
+            "max_drawdown": self.max_drawdown,
+            "current_drawdown": self.last_value / self.peak - 1 if self.peak else 0.0,
+            "win_rate": self.win_count / self.trade_count if self.trade_count else 0.0,
+            "win_count": self.win_count,
+            "loss_count": self.loss_count,
+            "trade_count": self.trade_count,
+            "turnover": self.traded_amount / mean_value if self.bars else 0.0,
+            "bars": self.bars,
+        }
+
+
+def batch_performance(nav, trades=None, annual_days=cfg.ANNUAL_TRADING_DAYS, risk_free_rate=cfg.RISK_FREE_RATE,
+                      key_col="stock_code"):
+    """
+    向量化计算多列净值的绩效指标（与PerformanceAccumulator逐根推入的结果一致）
+    :param nav: 净值/资产宽表（日期 × 列），各列可以在不同日期开始（开始前为NaN）
+    :param trades: 可选的成交长表，需包含key_col、amount列，平仓成交另有profit列（开仓为NaN）
+    :param annual_days: 年化交易日数
+    :param risk_free_rate: 年化无风险利率
+    :param key_col: trades中与nav列名对应的列
+    :return: 以nav列名为索引的指标DataFrame
+    """
+    values = nav.to_numpy(dtype=np.float64) if isinstance(nav, pd.DataFrame) else np.asarray(nav, dtype=np.float64)
+    columns = nav.columns if isinstance(nav, pd.DataFrame) else pd.RangeIndex(values.shape[1])
+    valid = ~np.isnan(values)
+    bars = valid.sum(axis=0)
+
+    # 1. 首末有效值与日收益率（只在相邻两日都有值时计算）
+    first_idx = valid.argmax(axis=0)
+    last_idx = len(values) - 1 - valid[::-1].argmax(axis=0)
+    cols = np.arange(values.shape[1])
+    first_value, last_value = values[first_idx, cols], values[last_idx, cols]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = values[1:] / values[:-1] - 1
+        n_returns = (~np.isnan(returns)).sum(axis=0)
+        total_return = last_value / first_value - 1
+        mean = np.nansum(returns, axis=0) / n_returns
+        std = np.sqrt(np.nansum((returns - mean) ** 2, axis=0) / (n_returns - 1))
+        std = np.where(n_returns > 1, std, np.nan)
+
+        # 2. 运行峰值（fmax忽略NaN）与回撤
+        peak = np.fmax.accumulate(values, axis=0)
+        drawdown = values / peak - 1
+        max_drawdown = np.minimum(np.nanmin(np.where(valid, drawdown, 0.0), axis=0), 0.0)
+        current_drawdown = last_value / peak[-1] - 1
+
+        result = pd.DataFrame({
+            "total_return": total_return,
+            "annual_return": np.where(n_returns > 0, (1 + total_return) ** (annual_days / n_returns) - 1, 0.0),
+            "volatility": std * np.sqrt(annual_days),
+            "sharpe": np.where(std > 0, (mean - risk_free_rate / annual_days) / std * np.sqrt(annual_days), np.nan),
+            "max_drawdown": max_drawdown,
+            "current_drawdown": current_drawdown,
+        }, index=columns)
+
+    # 3. 成交统计
+    if trades is not None and len(trades):
+        closed = trades.dropna(subset=["profit"]) if "profit" in trades.columns else trades.iloc[:0]
+        win_count = (closed["profit"] > 0).groupby(closed[key_col]).sum()
+        trade_count = closed.groupby(key_col).size()
+        traded_amount = trades["amount"].abs().groupby(trades[key_col]).sum()
+        win_count = win_count.reindex(columns, fill_value=0).to_numpy()
+        trade_count = trade_count.reindex(columns, fill_value=0).to_numpy()
+        traded_amount = traded_amount.reindex(columns, fill_value=0.0).to_numpy()
+    else:
+        win_count = trade_count = np.zeros(len(columns), dtype=np.int64)
+        traded_amount = np.zeros(len(columns))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result["win_rate"] = np.where(trade_count > 0, win_count / np.maximum(trade_count, 1), 0.0)
+        result["win_count"] = win_count
+        result["loss_count"] = trade_count - win_count
+        result["trade_count"] = trade_count
+        result["turnover"] = np.where(bars > 0, traded_amount / (np.nansum(values, axis=0) / bars), 0.0)
+    result["bars"] = bars
+    return result[METRIC_NAMES]
+
+
+# ---------------------- 稳健性分析（自助法 / 蒙特卡洛） ----------------------
+# 重采样路径上计算的指标（定义与batch_performance一致，每条路径的净值从1开始）
+ROBUST_METRICS = ["total_return", "annual_return", "volatility", "sharpe", "max_drawdown"]
+BOOTSTRAP_METHODS = ("stationary", "block", "iid")
+
+
+def path_metrics(returns, annual_days=cfg.ANNUAL_TRADING_DAYS, risk_free_rate=cfg.RISK_FREE_RATE):
+    """
+    逐行计算一批收益率路径的指标
+    :param returns: 日收益率二维数组（路径 × 日期），不含NaN
+    :return: {指标名: 长度为路径数的数组}，字段见ROBUST_METRICS
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    n_days = returns.shape[1]
+    nav = np.cumprod(1.0 + returns, axis=1)
+    total_return = nav[:, -1] - 1
+
+    # 峰值包含起点净值1；原地计算回撤，控制峰值内存
+    peak = np.maximum.accumulate(nav, axis=1)
+    np.maximum(peak, 1.0, out=peak)
+    np.divide(nav, peak, out=nav)
+    max_drawdown = np.minimum(nav.min(axis=1) - 1, 0.0)
+
+    mean = returns.mean(axis=1)
+    std = returns.std(axis=1, ddof=1) if n_days > 1 else np.full(len(returns), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "total_return": total_return,
+            "annual_return": (1 + total_return) ** (annual_days / n_days) - 1,
+            "volatility": std * np.sqrt(annual_days),
+            "sharpe": np.where(std > 0, (mean - risk_free_rate / annual_days) / std * np.sqrt(annual_days), np.nan),
+            "max_drawdown": max_drawdown,
+        }
+
+
+def bootstrap_indices(rng, n_paths, n_days, method="stationary", block_size=20):
+    """
+    生成自助法重采样的日期下标（路径 × 日期）
+    :param rng: numpy随机数生成器
+    :param method: "stationary"（平稳自助法，块长服从均值为block_size的几何分布）、
+                   "block"（固定块长的循环块自助法）或 "iid"（逐日独立重采样，不保留自相关）
+    :param block_size: 平均/固定块长（交易日），用来保留收益率的自相关与波动聚集
+    :return: int64数组，每行是一条重采样路径在原序列中的下标（超出末尾时循环回到开头）
+    """
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError(f"method只能是{BOOTSTRAP_METHODS}之一，收到：{method}")
+    if method == "iid":
+        return rng.integers(0, n_days, (n_paths, n_days))
+    if method == "block":
+        n_blocks = -(-n_days // block_size)
+        starts = rng.integers(0, n_days, (n_paths, n_blocks, 1))
+        return ((starts + np.arange(block_size)).reshape(n_paths, -1)[:, :n_days]) % n_days
+
+    # 平稳自助法：每天以1/block_size的概率开始新块，新块起点随机；否则接着上一天的下一个位置
+    steps = np.arange(n_days)
+    new_block = rng.random((n_paths, n_days)) < 1.0 / block_size
+    new_block[:, 0] = True
+    block_start = np.maximum.accumulate(np.where(new_block, steps, 0), axis=1)  # 所在块的开始日
+    index = np.take_along_axis(rng.integers(0, n_days, (n_paths, n_days)), block_start, axis=1)
+    index += steps - block_start
+    index %= n_days
+    return index
+
+
+def segment_bounds(position):
+    """
+    把持仓序列切成连续不变的段（一笔交易的持有期或一段空仓期）
+    :param position: 一维持仓序列（0/1、权重或持仓编号），取值变化处即新段的开始
+    :return: (各段开始下标, 各段长度)
+    """
+    position = np.asarray(position)
+    starts = np.flatnonzero(np.r_[True, position[1:] != position[:-1]])
+    return starts, np.diff(np.r_[starts, len(position)])
+
+
+def shuffle_indices(rng, n_paths, starts, lengths):
+    """
+    交易顺序打乱的日期下标：每条路径把各段随机排列后首尾相接，段内的逐日收益保持原顺序
+    :param starts: 各段开始下标（见segment_bounds）
+    :param lengths: 各段长度
+    :return: int64数组（路径 × 日期）
+    """
+    n_days, n_segments = int(lengths.sum()), len(starts)
+    order = np.argsort(rng.random((n_paths, n_segments)), axis=1)
+    new_lengths = lengths[order]
+    new_ends = np.cumsum(new_lengths, axis=1)
+
+    # 各路径加上 行号 × 天数 的偏移后拼成一个递增数组，一次searchsorted找出每天落在哪一段
+    offset = (np.arange(n_paths) * n_days)[:, None]
+    days = np.arange(n_days)
+    segment = np.searchsorted((new_ends + offset).ravel(), (days + offset).ravel(), side="right")
+    position_in_segment = np.tile(days, n_paths) - (new_ends - new_lengths).ravel()[segment]
+    return (starts[order.ravel()[segment]] + position_in_segment).reshape(n_paths, n_days)
+
+
+def _strategy_returns(weights, asset_returns, delay):
+    """
+    持仓权重延迟delay天生效时的毛收益与换手：第t天收益 = Σ w[t-1-delay] × r[t]，换手 = Σ|w[t-1-delay] - w[t-2-delay]|
+    :return: (毛收益, 换手)，长度均为日期数
+    """
+    lagged = np.zeros_like(weights)
+    lagged[1 + delay:] = weights[:len(weights) - 1 - delay]
+    gross = (lagged * asset_returns).sum(axis=1)
+    turnover = np.abs(np.diff(lagged, axis=0, prepend=0.0)).sum(axis=1)
+    return gross, turnover
+
+
+class RobustnessReport:
+    def __init__(self, name, samples, observed, params=None):
+        """
+        一项稳健性分析的结果
+        :param name: 分析名称（bootstrap / trade_shuffle / perturbation）
+        :param samples: 每条重采样路径一行的指标表（路径 × ROBUST_METRICS）
+        :param observed: 原始路径的指标（Series）
+        :param params: 分析参数
+        """
+        self.name = name
+        self.samples = samples
+        self.observed = observed
+        self.params = params or {}
+
+    def confidence_intervals(self, confidence=0.95):
+        """
+        各指标的分布与置信区间（分位数法）
+        :param confidence: 置信水平，如0.95对应2.5%与97.5%分位数
+        :return: 以指标为索引的DataFrame：observed, mean, std, lower, median, upper, p_below_zero
+        """
+        alpha = (1 - confidence) / 2
+        values = self.samples[ROBUST_METRICS]
+        with np.errstate(invalid="ignore"):
+            quantiles = values.quantile([alpha, 0.5, 1 - alpha])
+        return pd.DataFrame({
+            "observed": self.observed[ROBUST_METRICS],
+            "mean": values.mean(),
+            "std": values.std(),
+            "lower": quantiles.iloc[0],
+            "median": quantiles.iloc[1],
+            "upper": quantiles.iloc[2],
+            "p_below_zero": (values < 0).mean(),
+        })
+
+
+def _simulate(name, observed_returns, make_returns, n_paths, max_cells, annual_days, risk_free_rate, params):
+    """
+    分批生成并评估重采样路径：每批不超过max_cells个元素（路径数 × 日期数），峰值内存与总路径数无关
+    :param observed_returns: 原始路径的日收益率（一维）
+    :param make_returns: make_returns(批大小) -> 该批路径的收益率数组（批大小 × 日期）
+    """
+    n_days = len(observed_returns)
+    if n_days < 2:
+        raise ValueError("收益率序列至少需要2个交易日")
+    batch = max(1, int(max_cells // n_days))
+    samples = {metric: np.empty(n_paths) for metric in ROBUST_METRICS}
+    for start in range(0, n_paths, batch):
+        stop = min(start + batch, n_paths)
+        for metric, values in path_metrics(make_returns(stop - start), annual_days, risk_free_rate).items():
+            samples[metric][start:stop] = values
+    observed = path_metrics(observed_returns[None, :], annual_days, risk_free_rate)
+    observed = pd.Series({metric: values[0] for metric, values in observed.items()})
+    return RobustnessReport(name, pd.DataFrame(samples)[ROBUST_METRICS], observed, params)
+
+
+def _daily_returns(returns):
+    """日收益率转为一维float64数组，去掉NaN（如pct_change的第一行）"""
+    returns = np.asarray(returns, dtype=np.float64).ravel()
+    return returns[~np.isnan(returns)]
+
+
+def bootstrap_analysis(returns, n_paths=10000, method="stationary", block_size=20, seed=0, max_cells=4_000_000,
+                       annual_days=cfg.ANNUAL_TRADING_DAYS, risk_free_rate=cfg.RISK_FREE_RATE):
+    """
+    日收益率的自助法重采样：回答"同样的收益分布换一种出现顺序/组合，夏普、年化、回撤会落在什么范围"
+    :param returns: 策略日收益率（Series或数组，NaN会被去掉）
+    :param n_paths: 重采样路径数
+    :param method: "stationary" / "block" / "iid"，见bootstrap_indices
+    :param block_size: 平均/固定块长（交易日）
+    :param seed: 随机种子（同一seed与max_cells下结果完全相同）
+    :param max_cells: 每批路径数 × 日期数的上限
+    :return: RobustnessReport
+    """
+    returns = _daily_returns(returns)
+    rng = np.random.default_rng(seed)
+    return _simulate("bootstrap", returns,
+                     lambda size: returns[bootstrap_indices(rng, size, len(returns), method, block_size)],
+                     n_paths, max_cells, annual_days, risk_free_rate,
+                     {"n_paths": n_paths, "method": method, "block_size": block_size, "seed": seed})
+
+
+def trade_shuffle_analysis(returns, position, n_paths=10000, seed=0, max_cells=4_000_000,
+                           annual_days=cfg.ANNUAL_TRADING_DAYS, risk_free_rate=cfg.RISK_FREE_RATE):
+    """
+    交易顺序打乱：各笔交易（及空仓期）整体随机换序，每笔交易内部的逐日收益不变。
+    总收益、年化收益与夏普在打乱后不变，回撤的分布反映"同样的交易以不同顺序出现"时的路径风险
+    :param returns: 策略日收益率，与position等长（NaN的日期同时从两者中去掉）
+    :param position: 每日持仓序列，取值变化处为新一段的开始（组合回测可用"有成交的交易日"的累计计数）
+    :return: RobustnessReport
+    """
+    returns, position = np.asarray(returns, dtype=np.float64).ravel(), np.asarray(position).ravel()
+    if len(returns) != len(position):
+        raise ValueError("returns与position长度必须一致")
+    keep = ~np.isnan(returns)
+    returns, position = returns[keep], position[keep]
+    starts, lengths = segment_bounds(position)
+    rng = np.random.default_rng(seed)
+    return _simulate("trade_shuffle", returns, lambda size: returns[shuffle_indices(rng, size, starts, lengths)],
+                     n_paths, max_cells, annual_days, risk_free_rate,
+                     {"n_paths": n_paths, "segments": len(starts), "seed": seed})
+
+
+def perturbation_analysis(weights, asset_returns, cost=0.001, n_paths=10000, max_delay=2, cost_range=(0.5, 2.0),
+                          seed=0, max_cells=4_000_000, annual_days=cfg.ANNUAL_TRADING_DAYS,
+                          risk_free_rate=cfg.RISK_FREE_RATE):
+    """
+    信号延迟与交易成本扰动：每条路径随机抽取信号生效延迟（0~max_delay天）与成本倍数，重新计算策略收益
+    策略日收益 = Σ 前一日（再延迟d天）的持仓权重 × 当日标的收益 - 成本 × 倍数 × 换手
+    每种延迟的毛收益与换手只算一次，各路径只是按(延迟, 成本倍数)组合，计算量与标的数无关
+    :param weights: 每日收盘后的持仓权重（日期 × 标的的DataFrame/数组，单标的可为一维0/1持仓）
+    :param asset_returns: 标的日收益率，形状与weights相同（NaN按0处理）
+    :param cost: 单位换手的交易成本（如均线策略每次买入扣0.001）
+    :param max_delay: 最大延迟天数，每条路径在0~max_delay中等概率抽取
+    :param cost_range: 成本倍数的均匀分布区间
+    :return: RobustnessReport（observed为延迟0、成本倍数1的原始路径）
+    """
+    weights = np.nan_to_num(np.asarray(weights, dtype=np.float64))
+    asset_returns = np.nan_to_num(np.asarray(asset_returns, dtype=np.float64))
+    if weights.ndim == 1:
+        weights, asset_returns = weights[:, None], asset_returns.reshape(len(asset_returns), -1)
+    if weights.shape != asset_returns.shape:
+        raise ValueError("weights与asset_returns形状必须一致")
+    if not 0 <= max_delay < len(weights) - 1:
+        raise ValueError("max_delay必须在0到交易日数-2之间")
+
+    # 1. 每种延迟的毛收益与换手（延迟数 × 日期）
+    gross, turnover = map(np.array, zip(*[_strategy_returns(weights, asset_returns, d)
+                                          for d in range(max_delay + 1)]))
+
+    # 2. 各路径按抽到的延迟取出对应行，扣除扰动后的成本
+    rng = np.random.default_rng(seed)
+
+    def make_returns(size):
+        delay = rng.integers(0, max_delay + 1, size)
+        multiplier = rng.uniform(cost_range[0], cost_range[1], size)
+        return gross[delay] - (cost * multiplier)[:, None] * turnover[delay]
+
+    return _simulate("perturbation", gross[0] - cost * turnover[0], make_returns, n_paths, max_cells,
+                     annual_days, risk_free_rate, {"n_paths": n_paths, "cost": cost, "max_delay": max_delay,
+                                                   "cost_range": tuple(cost_range), "seed": seed})
+
+
+def robustness_analysis(returns, position=None, weights=None, asset_returns=None, cost=0.001, n_paths=10000,
+                        method="stationary", block_size=20, max_delay=2, cost_range=(0.5, 2.0), seed=0,
+                        max_cells=4_000_000):
+    """
+    按提供的输入执行全部可做的稳健性分析
+    :param returns: 策略日收益率（自助法）
+    :param position: 每日持仓序列（交易顺序打乱），None表示不做
+    :param weights: 每日持仓权重，与asset_returns一起提供时做延迟与成本扰动
+    :param asset_returns: 标的日收益率
+    :return: {分析名称: RobustnessReport}
+    """
+    reports = {"bootstrap": bootstrap_analysis(returns, n_paths, method, block_size, seed, max_cells)}
+    if position is not None:
+        reports["trade_shuffle"] = trade_shuffle_analysis(returns, position, n_paths, seed, max_cells)
+    if weights is not None and asset_returns is not None:
+        reports["perturbation"] = perturbation_analysis(weights, asset_returns, cost, n_paths, max_delay, cost_range,
+                                                        seed, max_cells)
+    return reports
+
+
+def summarize_robustness(reports, confidence=0.95):
+    """
+    把多项分析的置信区间拼成一张表
+    :param reports: robustness_analysis的返回值
+    :return: 以(分析名称, 指标)为索引的DataFrame
+    """
+    return pd.concat({name: report.confidence_intervals(confidence) for name, report in reports.items()},
+                     names=["analysis", "metric"])
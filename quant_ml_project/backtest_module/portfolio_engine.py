@@ -0,0 +1,411 @@
+# 多股票组合回测（Top-K选股、调仓、交易成本）
+"""
+Top-K横截面组合回测
+
+与PanelBacktestEngine（每只股票一个独立账户）不同，这里只有一个账户，资金在股票之间分配：
+1. 目标权重：每个调仓日按模型置信度（confidence）对当日可交易的股票排序，持有前K只，
+   等权或按置信度加权，单只股票权重不超过max_weight（超出部分留作现金）；
+   整张目标权重矩阵（日期 × 股票）用数组运算一次算出
+2. 撮合：调仓日收盘后的目标在下一个交易日按执行价（默认开盘价）成交；逐日推进，每日对全部股票做向量运算
+   - 100股整手：目标股数向下取整到整手
+   - 先卖后买；买入金额超过可用现金时按比例缩减（仍为整手）
+   - T+1：当日买入的股份不计入可卖数量（每日只撮合一次，卖出只动用前一日的持仓）
+   - 停牌（无价格、成交量为0或suspended=1）不能交易；开盘价涨停不能买入、跌停不能卖出，
+     未能成交的股票在之后的交易日继续按目标股数补单，直到下一个调仓日
+3. 风控（可选，main_app.risk_manager.RiskManager）：目标权重矩阵整体做行业集中度、波动率目标、指数熔断调整；
+   个股止损在每日收盘后对全部持仓做一次数组判断（成本价、持仓以来最高价），触发的股票下一个交易日卖出，
+   本调仓周期内不再买回
+4. 成本：双边佣金（不足最低佣金按最低收取）、卖出印花税、滑点；
+   滑点 = 基础滑点 + 冲击系数 × √(成交金额 / 当日成交额)，成交占当日成交额越高滑点越大
+   （没有成交额数据时只有基础滑点）
+
+默认参数来自项目设计：双边佣金万分之1.5、卖出印花税千分之1、滑点0.2%、单只股票持仓上限5%、月度调仓、最多持有30只
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from main_app.utils.profiler import instrument
+
+# 默认交易成本与组合约束（strategy_params.yaml的portfolio一节可覆盖）
+DEFAULT_COSTS = {
+    "commission": 0.00015,  # 佣金费率（买卖双边）
+    "min_commission": 5.0,  # 单笔最低佣金（元）
+    "stamp_duty": 0.001,  # 印花税（仅卖出）
+    "slippage": 0.002,  # 基础滑点
+    "impact": 0.1,  # 冲击系数：滑点额外增加 impact × √(成交金额 / 当日成交额)
+}
+LOT_SIZE = 100  # 一手股数
+LIMIT_TOLERANCE = 1e-4  # 判断涨跌停时的相对误差
+
+
+def price_limit_ratio(stock_codes):
+    """
+    各股票的涨跌幅限制：创业板（300/301）、科创板（688）为20%，北交所（8/4开头）为30%，其余为10%
+    :return: float数组
+    """
+    codes = pd.Index(stock_codes).astype(str)
+    ratio = np.full(len(codes), 0.10)
+    ratio[codes.str.startswith(("300", "301", "688"))] = 0.20
+    ratio[codes.str.startswith(("8", "4"))] = 0.30
+    return ratio
+
+
+def rebalance_mask(index, freq="monthly"):
+    """
+    调仓决策日：每个周期的最后一个交易日（下一个交易日执行）
+    :param index: 交易日索引（DatetimeIndex）
+    :param freq: "daily" / "weekly" / "monthly"，或整数n（每n个交易日一次）
+    :return: bool数组
+    """
+    n = len(index)
+    if freq == "daily":
+        return np.ones(n, dtype=bool)
+    if isinstance(freq, int):
+        return np.arange(n) % freq == freq - 1
+    periods = {"weekly": "W", "monthly": "M"}
+    if freq not in periods:
+        raise ValueError(f"不支持的调仓频率：{freq}，可选 daily / weekly / monthly 或整数")
+    period = pd.DatetimeIndex(index).to_period(periods[freq]).asi8
+    return np.r_[period[1:] != period[:-1], True]
+
+
+def target_weights(scores, eligible, mask, top_k=30, weighting="equal", max_weight=0.05, min_score=None):
+    """
+    调仓日的目标权重矩阵
+    :param scores: 置信度矩阵（日期 × 股票，float）
+    :param eligible: 可选入的股票（bool矩阵，与scores同形状）
+    :param mask: 调仓决策日（bool数组）
+    :param top_k: 持有股票数
+    :param weighting: "equal"（等权）或 "score"（按置信度加权）
+    :param max_weight: 单只股票的权重上限
+    :param min_score: 置信度低于该值的股票不入选，None表示不限制
+    :return: float矩阵，调仓决策日为目标权重，其余日期为NaN
+    """
+    weights = np.full(scores.shape, np.nan)
+    rows = np.flatnonzero(mask)
+    if not len(rows) or not scores.shape[1]:
+        return weights
+    # 1. 每行取置信度最高的K只（不可选的股票记为-inf，不会入选）
+    score = np.where(eligible[rows], scores[rows], np.nan)
+    if min_score is not None:
+        score = np.where(score >= min_score, score, np.nan)
+    ranked = np.where(np.isnan(score), -np.inf, score)
+    k = min(top_k, scores.shape[1])
+    top = np.argpartition(-ranked, k - 1, axis=1)[:, :k]
+    chosen = np.zeros(score.shape, dtype=bool)
+    np.put_along_axis(chosen, top, True, axis=1)
+    chosen &= np.isfinite(ranked)
+
+    # 2. 分配权重并截断到上限
+    if weighting == "equal":
+        raw = chosen.astype(np.float64)
+    elif weighting == "score":
+        raw = np.where(chosen, np.clip(np.nan_to_num(score), 0, None), 0.0)
+    else:
+        raise ValueError(f"不支持的加权方式：{weighting}，可选 equal / score")
+    total = raw.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights[rows] = np.minimum(np.where(total > 0, raw / total, 0.0), max_weight)
+    return weights
+
+
+@instrument()
+def load_portfolio_panel(signal_path=cfg.SIGNAL_STORE_PATH, price_path=cfg.STANDARD_DATA_FILE, exec_col="open"):
+    """
+    读取组合回测需要的面板：置信度、收盘价、执行价、成交额、是否可交易
+    :param signal_path: 二进制信号存储目录
+    :param price_path: 标准化行情文件（parquet）
+    :param exec_col: 执行价所在的列
+    :return: dict，各值为索引、列一致的DataFrame
+    """
+    import pyarrow.parquet as pq
+
+    from main_app.data_interface import SignalStore
+
+    available = set(pq.read_schema(price_path).names)
+    columns = ["date", "stock_code", "close", exec_col] + [c for c in ("amount", "volume", "suspended")
+                                                           if c in available]
+    price_df = pd.read_parquet(price_path, columns=list(dict.fromkeys(columns)))
+    price_df["date"] = pd.to_datetime(price_df["date"])
+    price_df["stock_code"] = price_df["stock_code"].astype(str)
+    wide = price_df.pivot(index="date", columns="stock_code")
+
+    panel = {"close": wide["close"], "exec_price": wide[exec_col]}
+    tradable = wide[exec_col].notna()
+    if "volume" in available:
+        tradable &= wide["volume"].fillna(0) > 0
+    if "suspended" in available:
+        tradable &= wide["suspended"].fillna(1) == 0
+    panel["tradable"] = tradable
+    if "amount" in available:
+        panel["amount"] = wide["amount"]
+    scores = SignalStore(signal_path).matrix(field="confidence")
+    panel["scores"] = scores.reindex(index=panel["close"].index, columns=panel["close"].columns)
+    return panel
+
+
+class PortfolioBacktestEngine:
+    def __init__(self, initial_capital=cfg.INITIAL_CAPITAL, top_k=30, weighting="equal", rebalance="monthly",
+                 max_weight=0.05, min_score=None, lot_size=LOT_SIZE, costs=None, risk_manager=None):
+        """
+        初始化Top-K组合回测引擎
+        :param initial_capital: 初始资金（元）
+        :param top_k: 持有股票数
+        :param weighting: "equal"（等权）或 "score"（按置信度加权）
+        :param rebalance: 调仓频率，见rebalance_mask
+        :param max_weight: 单只股票的权重上限
+        :param min_score: 置信度低于该值的股票不入选
+        :param lot_size: 一手股数
+        :param costs: 覆盖DEFAULT_COSTS的交易成本参数
+        :param risk_manager: 可选的RiskManager
+        """
+        self.initial_capital = initial_capital
+        self.top_k = top_k
+        self.weighting = weighting
+        self.rebalance = rebalance
+        self.max_weight = max_weight
+        self.min_score = min_score
+        self.lot_size = lot_size
+        self.costs = {**DEFAULT_COSTS, **(costs or {})}
+        self.risk_manager = risk_manager
+        self.target = None  # 目标权重（调仓决策日 × 股票，其余日期NaN）
+        self.shares = None  # 每日收盘后的持仓股数（日期 × 股票）
+        self.weights = None  # 每日收盘后的实际权重
+        self.daily = None  # 每日汇总：value, cash, turnover, commission, stamp_duty, slippage, n_holdings
+        self.nav = None  # 组合净值
+        self.trades = None  # 成交记录长表
+        self.stops = None  # 触发止损的位置（日期 × 股票，bool），下一个交易日卖出
+
+    def _slippage(self, notional, amount):
+        """各笔成交的滑点比例"""
+        rate = np.full(len(notional), self.costs["slippage"])
+        if amount is not None and self.costs["impact"]:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                impact = self.costs["impact"] * np.sqrt(notional / amount)
+            rate += np.where(np.isfinite(impact), impact, 0.0)
+        return rate
+
+    def _commission(self, notional):
+        return np.where(notional > 0, np.maximum(notional * self.costs["commission"], self.costs["min_commission"]),
+                        0.0)
+
+    @instrument("portfolio_backtest")
+    def run(self, scores, close, exec_price=None, tradable=None, amount=None):
+        """
+        执行组合回测
+        :param scores: 置信度宽表（日期 × 股票代码），决策日收盘后可得
+        :param close: 收盘价宽表（估值用，停牌日可为NaN）
+        :param exec_price: 执行价宽表（默认与close相同）
+        :param tradable: 可交易标记宽表（bool），默认执行价非空即可交易
+        :param amount: 当日成交额宽表（元），用于计算冲击滑点，None表示只有基础滑点
+        :return: self
+        """
+        index, columns = close.index, close.columns
+        close_values = close.to_numpy(dtype=np.float64)
+        price_values = close_values if exec_price is None else exec_price.reindex_like(close).to_numpy(np.float64)
+        can_trade = ~np.isnan(price_values)
+        if tradable is not None:
+            can_trade &= tradable.reindex_like(close).fillna(False).to_numpy(dtype=bool)
+        amount_values = None if amount is None else amount.reindex_like(close).to_numpy(dtype=np.float64)
+        score_values = scores.reindex_like(close).to_numpy(dtype=np.float64)
+
+        # 1. 目标权重：决策日按当日收盘后的置信度选股，下一个交易日执行
+        decision = rebalance_mask(index, self.rebalance)
+        eligible = ~np.isnan(close_values) & ~np.isnan(score_values)
+        self.target = target_weights(score_values, eligible, decision, self.top_k, self.weighting,
+                                     self.max_weight, self.min_score)
+        risk = self.risk_manager
+        if risk is not None:
+            self.target = risk.apply_weights(self.target, close)
+            decision = ~np.isnan(self.target).all(axis=1)
+        execute = np.r_[False, decision[:-1]]
+
+        # 2. 涨跌停：执行价相对前一日收盘价触及涨跌停
+        last_close = pd.DataFrame(close_values).ffill().to_numpy()
+        prev_close = np.vstack([np.full((1, len(columns)), np.nan), last_close[:-1]])
+        limit = price_limit_ratio(columns)
+        with np.errstate(invalid="ignore"):
+            up_locked = price_values >= prev_close * (1 + limit) * (1 - LIMIT_TOLERANCE)
+            down_locked = price_values <= prev_close * (1 - limit) * (1 + LIMIT_TOLERANCE)
+
+        # 3. 逐日撮合（每日对全部股票做向量运算）
+        n_days, n_stocks = close_values.shape
+        lot = self.lot_size
+        shares = np.zeros(n_stocks)
+        avg_cost = np.zeros(n_stocks)
+        target_shares = None
+        pending = np.zeros(n_stocks, dtype=bool)
+        cash = float(self.initial_capital)
+        shares_out = np.zeros((n_days, n_stocks), dtype=np.float64)
+        peak = np.zeros(n_stocks)
+        stops = np.zeros((n_days, n_stocks), dtype=bool)
+        use_stops = risk is not None and risk.has_stops
+        daily = np.zeros((n_days, 7))
+        trade_parts = []
+        for t in range(n_days):
+            price = price_values[t]
+            mark = np.where(can_trade[t], price, last_close[t - 1] if t else price)
+            mark = np.where(np.isnan(mark), 0.0, mark)
+            if execute[t]:
+                # 调仓执行日：按执行前的组合市值换算目标股数（整手）
+                value = cash + shares @ mark
+                target_shares = np.where(mark > 0, np.floor(self.target[t - 1] * value / np.where(mark > 0, mark, 1.0)
+                                                            / lot) * lot, 0.0)
+                active = np.ones(n_stocks, dtype=bool)
+            else:
+                active = pending
+            commission_paid = stamp_paid = slippage_paid = traded = 0.0
+            if target_shares is not None and active.any():
+                delta = np.where(active, target_shares - shares, 0.0)
+                sellable = shares.copy()  # T+1：只有前一日收盘时的持仓可以卖出
+                sell_ok = can_trade[t] & ~down_locked[t]
+                buy_ok = can_trade[t] & ~up_locked[t]
+                day_amount = None if amount_values is None else amount_values[t]
+
+                # 3.1 卖出
+                sell_qty = np.where((delta < 0) & sell_ok, np.minimum(-delta, sellable), 0.0)
+                sell_idx = np.flatnonzero(sell_qty)
+                if len(sell_idx):
+                    qty, px = sell_qty[sell_idx], price[sell_idx]
+                    notional = qty * px
+                    slip = self._slippage(notional, None if day_amount is None else day_amount[sell_idx])
+                    fill_px = px * (1 - slip)
+                    gross = qty * fill_px
+                    commission, stamp = self._commission(gross), gross * self.costs["stamp_duty"]
+                    profit = (fill_px - avg_cost[sell_idx]) * qty - commission - stamp
+                    cash += gross.sum() - commission.sum() - stamp.sum()
+                    shares[sell_idx] -= qty
+                    avg_cost[shares == 0] = 0.0
+                    trade_parts.append((t, sell_idx, -qty, fill_px, gross, commission, stamp, notional * slip, profit))
+                    commission_paid += commission.sum()
+                    stamp_paid += stamp.sum()
+                    slippage_paid += (notional * slip).sum()
+                    traded += gross.sum()
+
+                # 3.2 买入：现金不足时按比例缩减（缩减后仍为整手，留出佣金）
+                buy_qty = np.where((delta > 0) & buy_ok, delta, 0.0)
+                buy_idx = np.flatnonzero(buy_qty)
+                if len(buy_idx):
+                    qty, px = buy_qty[buy_idx], price[buy_idx]
+                    slip = self._slippage(qty * px, None if day_amount is None else day_amount[buy_idx])
+                    fill_px = px * (1 + slip)
+                    gross_need = (qty * fill_px).sum() * (1 + self.costs["commission"])
+                    fixed_need = self.costs["min_commission"] * len(qty)
+                    if gross_need + fixed_need > cash:
+                        scale = max(cash - fixed_need, 0.0) / gross_need
+                        qty = np.floor(qty * scale / lot) * lot
+                        keep = qty > 0
+                        buy_idx, qty, px, slip, fill_px = (buy_idx[keep], qty[keep], px[keep], slip[keep],
+                                                           fill_px[keep])
+                    gross = qty * fill_px
+                    commission = self._commission(gross)
+                    cash -= gross.sum() + commission.sum()
+                    held = shares[buy_idx]
+                    avg_cost[buy_idx] = (avg_cost[buy_idx] * held + gross + commission) / (held + qty)
+                    shares[buy_idx] += qty
+                    trade_parts.append((t, buy_idx, qty, fill_px, gross, commission, np.zeros(len(qty)),
+                                        qty * px * slip, np.full(len(qty), np.nan)))
+                    commission_paid += commission.sum()
+                    slippage_paid += (qty * px * slip).sum()
+                    traded += gross.sum()
+
+                # 3.3 因停牌、涨跌停未能成交的股票，之后的交易日继续补单
+                blocked = ((delta < 0) & ~sell_ok) | ((delta > 0) & ~buy_ok)
+                pending = blocked & (shares != target_shares)
+
+            # 4. 收盘估值（停牌股按最近收盘价）
+            valuation = np.where(np.isnan(last_close[t]), 0.0, last_close[t])
+            value = cash + shares @ valuation
+            shares_out[t] = shares
+            daily[t] = (value, cash, traded / value if value else 0.0, commission_paid, stamp_paid, slippage_paid,
+                        np.count_nonzero(shares))
+
+            # 5. 止损：收盘价相对成本价、持仓以来最高价触发的股票，目标改为0，下一个交易日起卖出
+            if use_stops:
+                held = shares > 0
+                peak = np.where(held, np.fmax(peak, close_values[t]), 0.0)
+                stops[t] = held & ~np.isnan(close_values[t]) & risk.stop_triggered(close_values[t], avg_cost, peak)
+                if stops[t].any() and target_shares is not None:
+                    target_shares = np.where(stops[t], 0.0, target_shares)
+                    pending = pending | stops[t]
+
+        # 6. 整理输出
+        self.stops = pd.DataFrame(stops, index=index, columns=columns)
+        self.shares = pd.DataFrame(shares_out, index=index, columns=columns)
+        self.daily = pd.DataFrame(daily, index=index, columns=["value", "cash", "turnover", "commission",
+                                                               "stamp_duty", "slippage", "n_holdings"])
+        self.daily["n_holdings"] = self.daily["n_holdings"].astype(np.int64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weights = shares_out * np.nan_to_num(last_close) / self.daily["value"].to_numpy()[:, None]
+        self.weights = pd.DataFrame(weights, index=index, columns=columns)
+        self.nav = (self.daily["value"] / self.initial_capital).rename("nav")
+        self.trades = self._collect_trades(trade_parts, index, columns)
+        return self
+
+    @staticmethod
+    def _collect_trades(parts, index, columns):
+        """把逐日的成交数组拼成成交记录长表"""
+        names = ["date", "stock_code", "side", "shares", "price", "amount", "commission", "stamp_duty", "slippage",
+                 "profit"]
+        if not parts:
+            return pd.DataFrame(columns=names)
+        day = np.concatenate([np.full(len(p[1]), p[0]) for p in parts])
+        stock = np.concatenate([p[1] for p in parts])
+        qty = np.concatenate([p[2] for p in parts])
+        return pd.DataFrame({
+            "date": index[day],
+            "stock_code": columns[stock],
+            "side": np.where(qty < 0, "sell", "buy"),
+            "shares": np.abs(qty).astype(np.int64),
+            "price": np.concatenate([p[3] for p in parts]),
+            "amount": np.concatenate([p[4] for p in parts]),
+            "commission": np.concatenate([p[5] for p in parts]),
+            "stamp_duty": np.concatenate([p[6] for p in parts]),
+            "slippage": np.concatenate([p[7] for p in parts]),
+            "profit": np.concatenate([p[8] for p in parts]),
+        })[names]
+
+    def calculate_performance(self):
+        """
+        组合绩效指标（与batch_performance定义一致）及交易成本汇总
+        :return: Series
+        """
+        from backtest_module.performance_analyzer import batch_performance
+
+        if self.nav is None:
+            raise RuntimeError("请先调用run()执行回测")
+        trades = self.trades.assign(portfolio="portfolio")
+        result = batch_performance(self.daily[["value"]].rename(columns={"value": "portfolio"}), trades,
+                                   key_col="portfolio").iloc[0]
+        costs = self.daily[["commission", "stamp_duty", "slippage"]].sum()
+        result["total_cost"] = costs.sum()
+        for name, value in costs.items():
+            result[name] = value
+        result["avg_holdings"] = self.daily["n_holdings"].mean()
+        return result
+
+
+def run_portfolio_backtest(signal_path=cfg.SIGNAL_STORE_PATH, price_path=cfg.STANDARD_DATA_FILE,
+                           exec_col="open", output_path=cfg.PORTFOLIO_RESULT_FILE, **engine_kwargs):
+    """
+    读取信号存储与标准化行情，执行组合回测并把每日汇总写入CSV
+    :param exec_col: 执行价所在的列
+    :param output_path: 每日汇总的输出文件，None表示不写出
+    :param engine_kwargs: 传给PortfolioBacktestEngine的参数
+    :return: PortfolioBacktestEngine对象
+    """
+    panel = load_portfolio_panel(signal_path, price_path, exec_col)
+    engine = PortfolioBacktestEngine(**engine_kwargs).run(panel["scores"], panel["close"], panel["exec_price"],
+                                                          panel["tradable"], panel.get("amount"))
+    if output_path is not None:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        engine.daily.assign(nav=engine.nav).to_csv(output_path, encoding="utf-8-sig")
+    return engine
+
+
+if __name__ == "__main__":
+    result = run_portfolio_backtest()
+    print(result.calculate_performance())
@@ -1 +1,312 @@
 # 可视化报告与建议生成
+"""
+回测结果导出
+
+- 写Excel：优先用XlsxWriter的constant_memory模式（逐行流式写出，内存占用与行数无关），
+  未安装时退回openpyxl的write_only模式；数字格式按列设置一次（日期列、百分比列），
+  不再逐个单元格设置number_format
+- 日期列在写出前整体换算为Excel序列号，单元格只写数字，显示格式由列格式决定；缺失值与±inf写为空单元格
+- 汇总导出：多策略、全市场的结果默认只导出汇总指标（Parquet/CSV），逐日明细按需导出
+- ReportExporter：在后台线程中排队导出，回测主流程提交后立即返回，不等待写文件
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+
+def _copy_on_write():
+    """pandas是否开启了写时复制：浅拷贝出的DataFrame不会被原数据的原地修改影响"""
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+# 默认列格式：按列名匹配（列名包含关键字即使用该格式）
+DATE_FORMAT = "yyyy-mm-dd"
+PERCENT_FORMAT = "0.00%"
+DEFAULT_COLUMN_FORMATS = {
+    "date": DATE_FORMAT, "日期": DATE_FORMAT,
+    "return": PERCENT_FORMAT, "drawdown": PERCENT_FORMAT, "win_rate": PERCENT_FORMAT, "收益": PERCENT_FORMAT,
+    "回撤": PERCENT_FORMAT, "胜率": PERCENT_FORMAT,
+}
+
+_EXCEL_EPOCH = np.datetime64("1899-12-30", "ns")
+
+
+def resolve_column_formats(df, column_formats=None):
+    """
+    确定每一列的数字格式
+    :param column_formats: {列名: 格式}，优先于按关键字匹配的默认格式；值为None表示该列不设格式
+    :return: {列位置: 格式}
+    """
+    column_formats = column_formats or {}
+    formats = {}
+    for i, col in enumerate(df.columns):
+        name = str(col)
+        if name in column_formats:
+            fmt = column_formats[name]
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            fmt = DATE_FORMAT
+        else:
+            fmt = next((f for key, f in DEFAULT_COLUMN_FORMATS.items() if key in name.lower()), None)
+        if fmt:
+            formats[i] = fmt
+    return formats
+
+
+def _excel_rows(df):
+    """
+    把DataFrame整理为可直接逐行写出的值：日期 → Excel序列号，缺失值与±inf → None
+    （Excel没有inf，XlsxWriter遇到inf会报错）
+    :return: 行迭代器
+    """
+    columns = []
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            serial = (values.dt.tz_localize(None) if values.dt.tz is not None else values).to_numpy("datetime64[ns]")
+            values = pd.Series((serial - _EXCEL_EPOCH) / np.timedelta64(1, "D"), index=values.index)
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(str)
+        elif pd.api.types.is_float_dtype(values):
+            values = values.where(np.isfinite(values))
+        values = values.astype(object)
+        columns.append(values.where(values.notna(), None).tolist())
+    return zip(*columns)
+
+
+def _write_xlsxwriter(sheets, path, column_formats, col_width):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_numbers": False})
+    try:
+        header_format = workbook.add_format({"bold": True})
+        cell_formats = {}
+        for sheet_name, df in sheets.items():
+            worksheet = workbook.add_worksheet(str(sheet_name)[:31])
+            # 1. 列格式：每列只设置一次
+            for i, fmt in resolve_column_formats(df, column_formats).items():
+                if fmt not in cell_formats:
+                    cell_formats[fmt] = workbook.add_format({"num_format": fmt})
+                worksheet.set_column(i, i, col_width, cell_formats[fmt])
+            # 2. 逐行流式写出（constant_memory模式下每行写完即刷到临时文件）
+            worksheet.write_row(0, 0, [str(c) for c in df.columns], header_format)
+            for r, row in enumerate(_excel_rows(df), start=1):
+                worksheet.write_row(r, 0, row)
+    finally:
+        workbook.close()
+
+
+def _write_openpyxl(sheets, path, column_formats, col_width):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    for sheet_name, df in sheets.items():
+        worksheet = workbook.create_sheet(str(sheet_name)[:31])
+        formats = resolve_column_formats(df, column_formats)
+        for i in range(len(df.columns)):
+            worksheet.column_dimensions[get_column_letter(i + 1)].width = col_width
+        worksheet.append([str(c) for c in df.columns])
+        # write_only模式不支持列样式，只有设了格式的列逐格包装，其余列直接写值
+        for row in _excel_rows(df):
+            if formats:
+                row = list(row)
+                for i, fmt in formats.items():
+                    if row[i] is not None:
+                        cell = WriteOnlyCell(worksheet, value=row[i])
+                        cell.number_format = fmt
+                        row[i] = cell
+            worksheet.append(row)
+    workbook.save(path)
+
+
+def write_excel(sheets, path, column_formats=None, engine=None, col_width=12):
+    """
+    流式写出Excel工作簿
+    :param sheets: {工作表名: DataFrame}，或单个DataFrame（写入Sheet1）；索引不写出，需要时先reset_index()
+    :param path: 输出文件（.xlsx）
+    :param column_formats: {列名: 数字格式}，未指定的列按resolve_column_formats的默认规则
+    :param engine: "xlsxwriter" / "openpyxl"，None表示优先xlsxwriter
+    :param col_width: 列宽
+    :return: 输出路径
+    """
+    if isinstance(sheets, pd.DataFrame):
+        sheets = {"Sheet1": sheets}
+    if engine is None:
+        try:
+            import xlsxwriter  # noqa: F401
+            engine = "xlsxwriter"
+        except ImportError:
+            engine = "openpyxl"
+    writers = {"xlsxwriter": _write_xlsxwriter, "openpyxl": _write_openpyxl}
+    if engine not in writers:
+        raise ValueError(f"不支持的Excel引擎：{engine}，可选 {list(writers)}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    writers[engine](sheets, path, column_formats, col_width)
+    return path
+
+
+def write_table(df, path, index=False):
+    """
+    按扩展名写出Parquet或CSV（.parquet / .csv）
+    :return: 输出路径
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        df.to_parquet(path, index=index)
+    elif ext == ".csv":
+        df.to_csv(path, index=index, encoding="utf-8-sig")
+    else:
+        raise ValueError(f"不支持的文件类型：{ext}，可选 .parquet / .csv")
+    return path
+
+
+def summarize_nav(nav, trades=None, key_col="stock_code"):
+    """
+    多列净值（每列一个策略或一只股票）→ 每列一行的汇总指标，代替逐日明细
+    :param nav: 净值宽表（日期 × 列）
+    :param trades: 可选的成交长表，见batch_performance
+    :return: 汇总指标DataFrame
+    """
+    from backtest_module.performance_analyzer import batch_performance
+
+    # 面板回测的成交记录没有成交额，胜率等照常统计，换手率记为NaN
+    no_amount = trades is not None and "amount" not in trades.columns
+    if no_amount:
+        trades = trades.assign(amount=0.0)
+    summary = batch_performance(nav, trades, key_col=key_col)
+    if no_amount:
+        summary["turnover"] = np.nan
+    summary.index.name = summary.index.name or key_col
+    summary.insert(0, "start_date", nav.apply(pd.Series.first_valid_index))
+    summary.insert(1, "end_date", nav.apply(pd.Series.last_valid_index))
+    return summary
+
+
+def export_backtest(engine, path, include_daily=False, include_trades=True, column_formats=None):
+    """
+    导出面板回测结果：汇总指标 + 组合净值（+ 可选的逐日净值明细、成交记录）
+    :param engine: 已run()的PanelBacktestEngine
+    :param path: 输出文件，.xlsx写成多个工作表；.parquet/.csv只写汇总，其余部分写到同名加后缀的文件
+    :param include_daily: 是否导出每只股票的逐日净值（全市场时体积很大，默认不导出）
+    :param include_trades: 是否导出成交记录
+    :return: 写出的文件路径列表
+    """
+    if engine.nav is None:
+        raise RuntimeError("请先调用run()执行回测")
+    sheets = {
+        "summary": summarize_nav(engine.nav, engine.trades).reset_index(),
+        "portfolio": engine.portfolio_nav.rename_axis("date").reset_index(),
+    }
+    if include_trades:
+        sheets["trades"] = engine.trades
+    if include_daily:
+        sheets["daily_nav"] = engine.nav.rename_axis("date").reset_index()
+
+    if path.lower().endswith(".xlsx"):
+        return [write_excel(sheets, path, column_formats)]
+    root, ext = os.path.splitext(path)
+    return [write_table(df, path if name == "summary" else f"{root}_{name}{ext}") for name, df in sheets.items()]
+
+
+class ReportExporter:
+    def __init__(self, max_workers=1):
+        """
+        后台导出器：导出任务在线程池中排队执行，提交后立即返回
+        提交时对DataFrame做快照，之后调用方继续修改原数据不影响导出内容：
+        pandas开启写时复制（3.0起默认）时为浅拷贝，否则为深拷贝
+        :param max_workers: 同时执行的导出任务数（默认1，按提交顺序写文件）
+        """
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self._lock = threading.Lock()
+        self.futures = []
+        self.errors = []  # (任务说明, 异常)
+
+    @staticmethod
+    def _snapshot(data):
+        if isinstance(data, (pd.DataFrame, pd.Series)):
+            return data.copy(deep=not _copy_on_write())
+        if isinstance(data, dict):
+            return {key: ReportExporter._snapshot(value) for key, value in data.items()}
+        return data
+
+    def submit(self, func, *args, description=None, **kwargs):
+        """
+        提交任意导出函数
+        :return: Future对象
+        """
+        args = tuple(self._snapshot(a) for a in args)
+        kwargs = {key: self._snapshot(value) for key, value in kwargs.items()}
+        description = description or getattr(func, "__name__", "export")
+
+        def task():
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                with self._lock:
+                    self.errors.append((description, e))
+                raise
+
+        future = self._pool.submit(task)
+        self.futures.append(future)
+        return future
+
+    def excel(self, sheets, path, column_formats=None, engine=None):
+        """后台写出Excel，参数见write_excel"""
+        return self.submit(write_excel, sheets, path, column_formats, engine, description=path)
+
+    def table(self, df, path, index=False):
+        """后台写出Parquet/CSV，参数见write_table"""
+        return self.submit(write_table, df, path, index, description=path)
+
+    def backtest(self, engine, path, **kwargs):
+        """后台导出面板回测结果，参数见export_backtest（回测引擎的结果在提交时固定）"""
+        from types import SimpleNamespace
+
+        snapshot = SimpleNamespace(nav=self._snapshot(engine.nav), trades=self._snapshot(engine.trades),
+                                   portfolio_nav=self._snapshot(engine.portfolio_nav))
+        return self.submit(export_backtest, snapshot, path, description=path, **kwargs)
+
+    def wait(self):
+        """
+        等待已提交的导出全部完成
+        :return: 失败的任务列表 [(任务说明, 异常)]
+        """
+        for future in list(self.futures):
+            try:
+                future.result()
+            except Exception:
+                pass
+        self.futures = [f for f in self.futures if not f.done()]
+        return list(self.errors)
+
+    def close(self):
+        """等待全部导出完成并关闭线程池"""
+        errors = self.wait()
+        self._pool.shutdown(wait=True)
+        return errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == "__main__":
+    from backtest_module.backtest_engine import PanelBacktestEngine, load_panel
+
+    signal_matrix, price_matrix = load_panel()
+    result = PanelBacktestEngine(cfg.INITIAL_CAPITAL).run(signal_matrix, price_matrix)
+    with ReportExporter() as exporter:
+        exporter.backtest(result, os.path.join(cfg.BACKTEST_OUTPUT_PATH, "backtest_report.xlsx"))
@@ -1 +1,58 @@
 # 项目核心参数配置 - 时间范围、路径、标的等
+# 所有模块都从这里读取全局常量，保证大家用的参数一致
+import os
+
+# 项目根目录（quant_ml_project/）
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 数据存储根路径
+DATA_PATH = os.path.join(PROJECT_ROOT, "data_module", "outputs")
+RAW_DATA_FILE = os.path.join(DATA_PATH, "raw_data.parquet")
+STANDARD_DATA_FILE = os.path.join(DATA_PATH, "standard_data.parquet")
+MARKET_STORE_PATH = os.path.join(DATA_PATH, "market_store")  # 按股票、年份分区的列式行情存储
+FETCH_CACHE_PATH = os.path.join(DATA_PATH, "fetch_cache")  # 数据抓取的本地缓存与断点记录
+FACTOR_DATA_FILE = os.path.join(DATA_PATH, "factor_data.parquet")  # 标准化数据 + 因子列（流水线factors阶段输出）
+
+# 配置文件路径
+API_CONFIG_FILE = os.path.join(PROJECT_ROOT, "config", "api_config.yaml")
+STRATEGY_PARAMS_FILE = os.path.join(PROJECT_ROOT, "config", "strategy_params.yaml")
+
+# 策略输出路径
+STRATEGY_OUTPUT_PATH = os.path.join(PROJECT_ROOT, "strategy_module", "outputs")
+SIGNAL_FILE = os.path.join(STRATEGY_OUTPUT_PATH, "signal.csv")
+SIGNAL_STORE_PATH = os.path.join(STRATEGY_OUTPUT_PATH, "signal_store")  # 二进制信号存储（signal.csv为其导出格式）
+MODEL_FILE = os.path.join(STRATEGY_OUTPUT_PATH, "trained_model.pkl")
+LABEL_FILE = os.path.join(STRATEGY_OUTPUT_PATH, "labels.parquet")
+FEATURE_CACHE_PATH = os.path.join(STRATEGY_OUTPUT_PATH, "feature_cache")  # 滚动训练共享的特征矩阵缓存
+FACTOR_REPORT_FILE = os.path.join(STRATEGY_OUTPUT_PATH, "factor_evaluation.csv")
+SEARCH_CACHE_PATH = os.path.join(STRATEGY_OUTPUT_PATH, "search_cache")  # 超参数搜索共享的特征矩阵与未来收益率
+SEARCH_RESULT_FILE = os.path.join(STRATEGY_OUTPUT_PATH, "search_results.jsonl")  # 每个(试验, 折)一行，用于断点续跑
+SEARCH_SUMMARY_FILE = os.path.join(STRATEGY_OUTPUT_PATH, "search_summary.csv")
+
+# 回测输出路径
+BACKTEST_OUTPUT_PATH = os.path.join(PROJECT_ROOT, "backtest_module", "outputs")
+PANEL_CACHE_PATH = os.path.join(BACKTEST_OUTPUT_PATH, "panel_cache")  # 批量回测共享的内存映射面板
+BATCH_RESULT_FILE = os.path.join(BACKTEST_OUTPUT_PATH, "batch_results.jsonl")
+BACKTEST_RESULT_FILE = os.path.join(BACKTEST_OUTPUT_PATH, "backtest_performance.csv")
+PORTFOLIO_RESULT_FILE = os.path.join(BACKTEST_OUTPUT_PATH, "portfolio_daily.csv")  # Top-K组合回测的每日汇总
+
+# 主流程缓存与运行指标路径
+PIPELINE_CACHE_PATH = os.path.join(PROJECT_ROOT, "main_app", "outputs", "pipeline_cache")  # 流水线各阶段的中间产物缓存
+METRICS_FILE = os.path.join(PROJECT_ROOT, "main_app", "outputs", "metrics.jsonl")  # 各阶段、子步骤的耗时/内存/行数，每次运行追加
+PROFILE_OUTPUT_PATH = os.path.join(PROJECT_ROOT, "main_app", "outputs", "profiles")  # 按需开启的性能剖析结果
+
+# 基准测试输出路径
+BENCHMARK_OUTPUT_PATH = os.path.join(PROJECT_ROOT, "scripts", "outputs")
+BENCHMARK_HISTORY_FILE = os.path.join(BENCHMARK_OUTPUT_PATH, "benchmark_history.jsonl")  # 每次基准测试追加一行记录
+
+# 股票池（先放3只做测试，全量为沪深300+中证500成分股）
+STOCK_POOL = ['000001', '000002', '600036']
+
+# 数据时间范围
+START_DATE = '2018-01-01'
+END_DATE = '2025-12-31'
+
+# 回测基础参数
+INITIAL_CAPITAL = 1000000  # 初始资金（元）
+ANNUAL_TRADING_DAYS = 252  # 年化交易日数
+RISK_FREE_RATE = 0.0  # 无风险利率
@@ -0,0 +1,14 @@
+# 策略参数文件读取
+"""
+读取strategy_params.yaml（模型、标签、风控、超参数搜索等各节参数）
+
+放在config包中，流水线与各策略、风控模块都从这里读取，库模块不必依赖流水线入口main_app.main_pipeline
+"""
+from config import project_config as cfg
+
+
+def load_strategy_params(path=cfg.STRATEGY_PARAMS_FILE):
+    """读取strategy_params.yaml（文件为空时返回空字典）"""
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
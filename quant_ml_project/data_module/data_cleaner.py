@@ -1 +1,231 @@
 # 数据清洗与标准化
+"""
+数据清洗与标准化（中期报告中的清洗规则）
+
+逐只股票的规则（进程池并行，每个进程读取并处理一批股票，批内向量化）：
+- 按日期排序、去重，对齐到全市场交易日历
+- 停牌日前向填充价格，最多填充5个交易日；填充日成交量记为0，并标记suspended=1
+- 超过填充上限仍缺失的行直接删除
+
+横截面规则（按日期分组的向量化运算，按日期分块处理以控制内存）：
+- 财务数据缺失值用同日同行业均值填充（无行业列时用同日全市场均值）
+- 3σ去极值 + MAD（中位数绝对偏差）二次校验
+- 横截面Z-score标准化（standardize_cross_section，由因子计算run_factor_mining在因子列上调用）
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from data_module.factor_miner import FACTOR_REGISTRY, FUNDAMENTAL
+from main_app.data_interface import compact_dtypes
+from main_app.utils.profiler import instrument
+
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+
+# 财务数据列：基本面因子依赖的原始列
+FINANCIAL_COLUMNS = sorted({col for spec in FACTOR_REGISTRY.values()
+                            if spec.category == FUNDAMENTAL for col in spec.inputs})
+
+# MAD换算为标准差的系数（正态分布下 σ ≈ 1.4826 × MAD）
+MAD_SCALE = 1.4826
+
+
+# ---------------------- 1. 逐只股票清洗 ----------------------
+def clean_stock_batch(df, calendar, max_fill_days=5):
+    """
+    清洗一批股票（一只或多只）的数据，批内按股票分组做向量化处理
+    :param df: 行情长表
+    :param calendar: 全市场交易日历（已排序的datetime64数组）
+    :param max_fill_days: 停牌日最多前向填充的交易日数
+    :return: 清洗后的DataFrame，增加suspended列（1=停牌填充日）
+    """
+    df = df.drop_duplicates(["stock_code", "date"], keep="last")
+
+    # 1. 每只股票对齐到上市期间（首条至末条记录）的交易日历，停牌日以空行出现
+    span = df.groupby("stock_code")["date"].agg(["min", "max"])
+    lo = np.searchsorted(calendar, span["min"].to_numpy())
+    hi = np.searchsorted(calendar, span["max"].to_numpy(), side="right")
+    lengths = hi - lo
+    day_idx = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(lo, lengths)
+    full_index = pd.MultiIndex.from_arrays([np.repeat(span.index.to_numpy(), lengths), calendar[day_idx]],
+                                           names=["stock_code", "date"])
+    df = df.set_index(["stock_code", "date"])
+    inserted = ~full_index.isin(df.index)
+    df = df.reindex(full_index)
+
+    # 2. 停牌日前向填充价格（最多max_fill_days天），成交量、成交额记为0
+    #    停牌日只指对齐日历时补出、且确实被填充了价格的行；原始数据中只缺个别价格的行照常填充价格，成交量保留
+    fill_cols = [c for c in df.columns if c not in ("volume", "amount")]
+    df[fill_cols] = df.groupby(level="stock_code")[fill_cols].ffill(limit=max_fill_days)
+    suspended = pd.Series(inserted, index=df.index) & df["close"].notna()
+    for col in ("volume", "amount"):
+        if col in df.columns:
+            df[col] = df[col].where(~suspended, 0)
+    df["suspended"] = suspended.astype(np.int8)
+
+    # 3. 超过填充上限仍缺失价格的行删除
+    df = df.dropna(subset=[c for c in PRICE_COLUMNS if c in df.columns])
+    return df.reset_index()
+
+
+def _normalize_keys(raw):
+    """日期转为日期类型、股票代码转为字符串，去掉日期或股票代码缺失的行"""
+    raw = raw.assign(date=pd.to_datetime(raw["date"]), stock_code=raw["stock_code"].astype(str))
+    return raw.dropna(subset=["date", "stock_code"])
+
+
+def _clean_stock_batch(args):
+    """
+    进程池任务：清洗一批股票
+    任务中的数据为DataFrame时直接清洗；为parquet路径时在子进程内只读取本批股票的行，父进程不持有原始数据
+    """
+    raw, codes, calendar, max_fill_days = args
+    if not isinstance(raw, pd.DataFrame):
+        raw = _normalize_keys(pd.read_parquet(raw, filters=[("stock_code", "in", list(codes))]))
+    return clean_stock_batch(raw, calendar, max_fill_days)
+
+
+@instrument()
+def clean_per_stock(raw, max_fill_days=5, n_workers=None, batches_per_worker=4):
+    """
+    并行执行逐只股票的清洗规则
+    :param raw: 原始行情长表，或原始parquet文件路径（此时父进程只读取date、stock_code两列来划分批次，
+                各批原始数据由子进程按股票代码过滤读取）
+    :param max_fill_days: 停牌日最多前向填充的交易日数
+    :param n_workers: 进程数，默认使用全部CPU核心；1表示在当前进程内执行
+    :param batches_per_worker: 每个进程分到的批次数（批次越多负载越均衡）
+    :return: 清洗后的长表，按股票、日期排序
+    """
+    from_file = not isinstance(raw, pd.DataFrame)
+    if from_file:
+        # 原始文件中的股票代码类型不变，用于子进程按代码过滤读取
+        keys = pd.read_parquet(raw, columns=["date", "stock_code"]).dropna()
+        codes = keys["stock_code"].unique()
+        calendar = np.sort(pd.to_datetime(keys["date"]).unique())
+        del keys
+    else:
+        raw = _normalize_keys(raw)
+        codes = raw["stock_code"].unique()
+        calendar = np.sort(raw["date"].unique())
+    n_workers = n_workers or os.cpu_count() or 1
+
+    n_batches = max(1, min(len(codes), n_workers * batches_per_worker))
+    code_batches = [batch for batch in np.array_split(codes, n_batches) if len(batch)]
+    if from_file:
+        tasks = [(raw, batch, calendar, max_fill_days) for batch in code_batches]
+    else:
+        batch_of_code = pd.Series(np.repeat(np.arange(len(code_batches)), [len(b) for b in code_batches]),
+                                  index=np.concatenate(code_batches))
+        tasks = [(batch, None, calendar, max_fill_days)
+                 for _, batch in raw.groupby(raw["stock_code"].map(batch_of_code), sort=False)]
+
+    if n_workers == 1:
+        results = [_clean_stock_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_clean_stock_batch, tasks))
+    return pd.concat(results, ignore_index=True).sort_values(["stock_code", "date"], ignore_index=True)
+
+
+# ---------------------- 2. 横截面规则 ----------------------
+def _date_chunks(df, chunk_days, date_col="date"):
+    """按交易日把数据切成若干块，每块包含连续的chunk_days个交易日"""
+    days = np.sort(df[date_col].unique())
+    for start in range(0, len(days), chunk_days):
+        mask = df[date_col].between(days[start], days[min(start + chunk_days, len(days)) - 1])
+        yield df.index[mask]
+
+
+def fill_industry_mean(df, columns, industry_col="industry", date_col="date"):
+    """
+    财务数据缺失值用同日同行业均值填充，行业均值也缺失时用同日全市场均值
+    :return: 填充后的DataFrame（原地修改并返回）
+    """
+    keys = [df[date_col], df[industry_col]] if industry_col in df.columns else [df[date_col]]
+    for col in columns:
+        if df[col].isna().any():
+            df[col] = df[col].fillna(df.groupby(keys)[col].transform("mean"))
+            df[col] = df[col].fillna(df.groupby(df[date_col])[col].transform("mean"))
+    return df
+
+
+def winsorize_cross_section(df, columns, n_sigma=3.0, n_mad=5.0, date_col="date"):
+    """
+    横截面去极值：先按3σ原则截断，再用MAD做二次校验
+    :param n_sigma: 3σ截断的倍数
+    :param n_mad: MAD校验的倍数（以 MAD × 1.4826 为单位）
+    :return: 去极值后的DataFrame（原地修改并返回）
+    """
+    grouped_date = df[date_col]
+    for col in columns:
+        values = df[col]
+        # 第一步：3σ截断
+        grouped = values.groupby(grouped_date)
+        mean, std = grouped.transform("mean"), grouped.transform("std")
+        values = values.clip(mean - n_sigma * std, mean + n_sigma * std)
+        # 第二步：MAD二次校验
+        median = values.groupby(grouped_date).transform("median")
+        mad = (values - median).abs().groupby(grouped_date).transform("median") * MAD_SCALE
+        df[col] = values.clip(median - n_mad * mad, median + n_mad * mad)
+    return df
+
+
+def standardize_cross_section(df, columns, date_col="date", chunk_days=250):
+    """
+    横截面Z-score标准化：每个交易日内 (x - 均值) / 标准差，按日期分块处理
+    :return: 标准化后的DataFrame（原地修改并返回），数值列转为float32
+    """
+    columns = list(columns)
+    for index in _date_chunks(df, chunk_days, date_col):
+        chunk = df.loc[index, [date_col] + columns]
+        grouped = chunk.groupby(date_col)[columns]
+        zscore = (chunk[columns] - grouped.transform("mean")) / grouped.transform("std")
+        df.loc[index, columns] = zscore.astype(np.float32)
+    return df
+
+
+@instrument()
+def clean_cross_section(df, columns, industry_col="industry", date_col="date", chunk_days=250):
+    """
+    按日期分块执行财务数据的横截面规则：行业均值填充 → 3σ + MAD去极值
+    :param chunk_days: 每块包含的交易日数，决定峰值内存
+    """
+    columns = [c for c in columns if c in df.columns]
+    if not columns:
+        return df
+    for index in _date_chunks(df, chunk_days, date_col):
+        chunk = df.loc[index, [date_col] + columns + ([industry_col] if industry_col in df.columns else [])]
+        chunk = fill_industry_mean(chunk, columns, industry_col, date_col)
+        chunk = winsorize_cross_section(chunk, columns, date_col=date_col)
+        df.loc[index, columns] = chunk[columns]
+    return df
+
+
+def clean_data(input_path=cfg.RAW_DATA_FILE, output_path=cfg.STANDARD_DATA_FILE,
+               financial_cols=None, max_fill_days=5, n_workers=None, chunk_days=250):
+    """
+    清洗原始数据并写入standard_data.parquet
+    内存：原始数据只在子进程中按股票分批读取，父进程不持有原始全量数据；横截面规则按日期分块，额外占用与chunk_days成正比。
+    但清洗后的全量数据会完整保存在内存中（写出一个parquet并作为返回值），峰值内存约为清洗后数据集的大小
+    :param input_path: 原始数据文件（raw_data.parquet）
+    :param output_path: 输出的标准化数据文件
+    :param financial_cols: 需要做横截面处理的财务数据列，默认FINANCIAL_COLUMNS中数据已有的列
+    :param max_fill_days: 停牌日最多前向填充的交易日数
+    :param n_workers: 逐只股票清洗的进程数
+    :param chunk_days: 横截面处理每块的交易日数
+    :return: 清洗后的DataFrame
+    """
+    df = clean_per_stock(input_path, max_fill_days, n_workers)
+    financial_cols = FINANCIAL_COLUMNS if financial_cols is None else financial_cols
+    df = clean_cross_section(df, financial_cols, chunk_days=chunk_days)
+    df = compact_dtypes(df)
+    df.to_parquet(output_path, index=False)
+    return df
+
+
+if __name__ == "__main__":
+    cleaned = clean_data()
+    print(f"数据清洗完成：{len(cleaned)}行，{cleaned['stock_code'].nunique()}只股票")
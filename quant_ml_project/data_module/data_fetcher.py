@@ -1 +1,418 @@
 # 多源数据获取与调度器
+"""
+多源数据获取与调度器
+
+- 数据源适配：AKShare / Tushare / baostock，统一输出字段
+  date, stock_code, open, high, low, close, volume；另有LocalStubSource本地模拟数据源，
+  用于离线测试调度器；synthetic数据源见synthetic_market.SyntheticSource
+- 令牌桶限流：每个数据源一个TokenBucket，并发线程共享同一个请求配额（默认每秒2次）
+- 重试与退避：请求失败按 base × 2^n（加随机抖动）等待后重试
+- 断点续传：FetchCheckpoint在磁盘上记录每个(数据源, 股票)已下载的日期区间，
+  重新运行时只抓取缺失的区间；已下载数据缓存在本地parquet中
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from main_app.utils.profiler import instrument
+
+# 统一输出字段
+FETCH_COLUMNS = ["date", "stock_code", "open", "high", "low", "close", "volume"]
+
+
+def load_api_config(path=cfg.API_CONFIG_FILE):
+    """读取api_config.yaml"""
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+# ---------------------- 1. 限流与断点记录 ----------------------
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        """
+        令牌桶限流器（线程安全）
+        :param rate: 每秒补充的令牌数，即平均每秒请求次数上限
+        :param capacity: 桶容量，即允许的瞬时突发请求数，默认等于rate（至少为1）
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，没有令牌时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class FetchCheckpoint:
+    def __init__(self, path):
+        """
+        断点记录：每个(数据源, 股票)已下载完成的日期区间列表（闭区间，自动合并）
+        :param path: JSON文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._done = json.load(f)
+
+    @staticmethod
+    def _key(source, symbol):
+        return f"{source}|{symbol}"
+
+    def missing_ranges(self, source, symbol, start_date, end_date):
+        """
+        计算[start_date, end_date]中尚未下载的区间
+        :return: [(start, end), ...]，日期为pd.Timestamp
+        """
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        gaps = []
+        cursor = start
+        with self._lock:
+            ranges = list(self._done.get(self._key(source, symbol), []))
+        for done_start, done_end in ranges:
+            done_start, done_end = pd.Timestamp(done_start), pd.Timestamp(done_end)
+            if done_end < cursor:
+                continue
+            if done_start > end:
+                break
+            if done_start > cursor:
+                gaps.append((cursor, done_start - pd.Timedelta(days=1)))
+            cursor = max(cursor, done_end + pd.Timedelta(days=1))
+        if cursor <= end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def mark_done(self, source, symbol, start_date, end_date):
+        """记录一个下载完成的区间，并与已有区间合并后写盘"""
+        key = self._key(source, symbol)
+        with self._lock:
+            ranges = [(pd.Timestamp(s), pd.Timestamp(e)) for s, e in self._done.get(key, [])]
+            ranges.append((pd.Timestamp(start_date), pd.Timestamp(end_date)))
+            ranges.sort()
+            merged = [list(ranges[0])]
+            for s, e in ranges[1:]:
+                if s <= merged[-1][1] + pd.Timedelta(days=1):
+                    merged[-1][1] = max(merged[-1][1], e)
+                else:
+                    merged.append([s, e])
+            self._done[key] = [[s.strftime("%Y-%m-%d"), e.strftime("%Y-%m-%d")] for s, e in merged]
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._done, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+# ---------------------- 2. 数据源适配 ----------------------
+class DataSource:
+    """数据源基类：子类实现fetch()，返回FETCH_COLUMNS格式的DataFrame"""
+    name = "base"
+
+    def __init__(self, rate_per_second=2):
+        self.rate_per_second = rate_per_second
+
+    def fetch(self, symbol, start_date, end_date):
+        raise NotImplementedError
+
+
+class AKShareSource(DataSource):
+    name = "akshare"
+
+    def __init__(self, rate_per_second=2, adjust="qfq"):
+        super().__init__(rate_per_second)
+        self.adjust = adjust
+
+    def fetch(self, symbol, start_date, end_date):
+        import akshare as ak
+        from main_app.data_interface import CSV_COLUMN_MAP
+        df = ak.stock_zh_a_hist(symbol=symbol, period="daily", adjust=self.adjust,
+                                start_date=pd.Timestamp(start_date).strftime("%Y%m%d"),
+                                end_date=pd.Timestamp(end_date).strftime("%Y%m%d"))
+        df = df.rename(columns=CSV_COLUMN_MAP)
+        df["stock_code"] = symbol
+        return df
+
+
+class TushareSource(DataSource):
+    name = "tushare"
+
+    def __init__(self, token, rate_per_second=2):
+        super().__init__(rate_per_second)
+        self.token = token
+        self._pro = None
+
+    @staticmethod
+    def _ts_code(symbol):
+        """6位代码 → Tushare代码（600/601/603/605/688开头为上交所）"""
+        return f"{symbol}.SH" if symbol.startswith(("6", "9")) else f"{symbol}.SZ"
+
+    def fetch(self, symbol, start_date, end_date):
+        if self._pro is None:
+            import tushare as ts
+            ts.set_token(self.token)
+            self._pro = ts.pro_api()
+        df = self._pro.daily(ts_code=self._ts_code(symbol),
+                             start_date=pd.Timestamp(start_date).strftime("%Y%m%d"),
+                             end_date=pd.Timestamp(end_date).strftime("%Y%m%d"),
+                             fields="trade_date,open,high,low,close,vol")
+        df = df.rename(columns={"trade_date": "date", "vol": "volume"})
+        df["date"] = pd.to_datetime(df["date"], format="%Y%m%d")
+        df["stock_code"] = symbol
+        return df
+
+
+class BaostockSource(DataSource):
+    name = "baostock"
+
+    def __init__(self, rate_per_second=2):
+        super().__init__(rate_per_second)
+        self._logged_in = False
+        self._lock = threading.Lock()
+
+    def fetch(self, symbol, start_date, end_date):
+        import baostock as bs
+        # baostock的会话不是线程安全的，同一时间只发一个请求
+        with self._lock:
+            if not self._logged_in:
+                bs.login()
+                self._logged_in = True
+            prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
+            rs = bs.query_history_k_data_plus(f"{prefix}.{symbol}", "date,open,high,low,close,volume",
+                                              start_date=pd.Timestamp(start_date).strftime("%Y-%m-%d"),
+                                              end_date=pd.Timestamp(end_date).strftime("%Y-%m-%d"),
+                                              frequency="d", adjustflag="2")
+            if rs.error_code != "0":
+                raise RuntimeError(f"baostock请求失败：{rs.error_msg}")
+            rows = []
+            while rs.next():
+                rows.append(rs.get_row_data())
+        df = pd.DataFrame(rows, columns=rs.fields)
+        df["stock_code"] = symbol
+        return df
+
+
+class LocalStubSource(DataSource):
+    name = "stub"
+
+    def __init__(self, rate_per_second=1000, latency=0.0, failure_rate=0.0, seed=0):
+        """
+        本地模拟数据源：不联网，按股票代码生成确定性的日线数据，用于离线测试调度器
+        :param latency: 每次请求的模拟网络延迟（秒）
+        :param failure_rate: 请求随机失败的概率，用来测试重试逻辑
+        :param seed: 随机种子
+        """
+        super().__init__(rate_per_second)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def fetch(self, symbol, start_date, end_date):
+        with self._lock:
+            self.calls += 1
+            failed = self._rng.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            raise ConnectionError(f"模拟请求失败：{symbol}")
+
+        # 以固定起点生成整条价格序列再截取，保证同一股票任意区间的数据相互一致；
+        # 成交量用独立的随机数流，取值不随请求的结束日期变化
+        all_days = np.arange(np.datetime64("2010-01-01"), np.datetime64(pd.Timestamp(end_date).date()) + 1)
+        all_dates = pd.DatetimeIndex(all_days[np.is_busday(all_days)])
+        rng = np.random.default_rng(self.seed * 1000003 + int(symbol))
+        volume_rng = np.random.default_rng([self.seed, int(symbol), 1])
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(all_dates))))
+        mask = all_dates >= pd.Timestamp(start_date)
+        close = close[mask]
+        return pd.DataFrame({
+            "date": all_dates[mask],
+            "stock_code": symbol,
+            "open": close * 0.995,
+            "high": close * 1.01,
+            "low": close * 0.99,
+            "close": close,
+            "volume": volume_rng.integers(100000, 10000000, len(all_dates))[mask].astype(np.float64),
+        })
+
+
+def create_source(name, api_config=None):
+    """按名称创建数据源，限流参数从api_config.yaml读取"""
+    api_config = api_config if api_config is not None else load_api_config()
+    source_config = api_config.get(name, {}) or {}
+    rate = source_config.get("rate_per_second", 2)
+    if name == "akshare":
+        return AKShareSource(rate)
+    if name == "tushare":
+        return TushareSource(source_config.get("token", ""), rate)
+    if name == "baostock":
+        return BaostockSource(rate)
+    if name == "stub":
+        return LocalStubSource()
+    if name == "synthetic":
+        from data_module.synthetic_market import SyntheticSource
+        return SyntheticSource(**source_config)
+    raise ValueError(f"未知数据源：{name}")
+
+
+# ---------------------- 3. 抓取调度器 ----------------------
+class FetchScheduler:
+    def __init__(self, source, cache_dir=cfg.FETCH_CACHE_PATH, max_workers=8, max_retries=3, backoff_base=1.0):
+        """
+        并发抓取调度器
+        :param source: DataSource对象
+        :param cache_dir: 本地缓存目录（每只股票一个parquet + checkpoint.json）
+        :param max_workers: 并发线程数（实际请求速率仍受令牌桶限制）
+        :param max_retries: 单个请求最多重试次数
+        :param backoff_base: 退避基数（秒）
+        """
+        self.source = source
+        self.cache_dir = os.path.join(cache_dir, source.name)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.bucket = TokenBucket(source.rate_per_second)
+        self.checkpoint = FetchCheckpoint(os.path.join(self.cache_dir, "checkpoint.json"))
+        self.failures = {}  # 股票代码 → 最后一次错误信息
+
+    def _cache_path(self, symbol):
+        return os.path.join(self.cache_dir, f"{symbol}.parquet")
+
+    def _request(self, symbol, start, end):
+        """限流 + 重试地请求一个区间"""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                return self.source.fetch(symbol, start, end)
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_base * (2 ** attempt) * (1 + random.random() * 0.5))
+
+    def _fetch_symbol(self, symbol, gaps):
+        """抓取一只股票的全部缺失区间，写入缓存后再记录断点（同一股票只在一个线程里处理）"""
+        yesterday = pd.Timestamp.today().normalize() - pd.Timedelta(days=1)
+        for start, end in gaps:
+            df = self._request(symbol, start, end)
+            has_rows = df is not None and not df.empty
+            if has_rows:
+                self._merge_cache(symbol, df)
+            done_end = end
+            if end > yesterday:
+                # 当天的日线可能还没发布（盘中运行或数据源延迟发布）：
+                # 断点只记录到实际返回的最后一个交易日，最晚记到昨天，下次运行会重新请求当天
+                last_date = pd.to_datetime(df["date"]).max() if has_rows else yesterday
+                done_end = min(end, max(yesterday, last_date))
+            if done_end >= start:
+                self.checkpoint.mark_done(self.source.name, symbol, start, done_end)
+
+    def _merge_cache(self, symbol, new):
+        """把新下载的数据并入该股票的缓存文件"""
+        path = self._cache_path(symbol)
+        new = new.copy()
+        new["date"] = pd.to_datetime(new["date"])
+        new["stock_code"] = new["stock_code"].astype(str)
+        for col in FETCH_COLUMNS[2:]:
+            new[col] = pd.to_numeric(new[col], errors="coerce")
+        new = new[FETCH_COLUMNS]
+        if os.path.exists(path):
+            new = pd.concat([pd.read_parquet(path), new], ignore_index=True)
+        new = new.drop_duplicates(["date"], keep="last").sort_values("date")
+        tmp_path = path + ".tmp"
+        new.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    @instrument("fetch_scheduler")
+    def run(self, symbols, start_date, end_date):
+        """
+        抓取全部股票在[start_date, end_date]内的数据，已下载的区间直接读缓存
+        :param symbols: 股票代码列表
+        :return: 合并后的长表DataFrame（FETCH_COLUMNS），失败的股票记录在self.failures
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # 未来的日期不能记为"已下载"，结束日期最多到今天（当天是否完成见_fetch_symbol）
+        end_date = min(pd.Timestamp(end_date), pd.Timestamp.today().normalize())
+        self.failures = {}
+        tasks = {}
+        for symbol in symbols:
+            gaps = self.checkpoint.missing_ranges(self.source.name, symbol, start_date, end_date)
+            if gaps:
+                tasks[symbol] = gaps
+
+        if tasks:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {pool.submit(self._fetch_symbol, s, g): s for s, g in tasks.items()}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        self.failures[futures[future]] = str(e)
+
+        return self.load_cached(symbols, start_date, end_date)
+
+    def load_cached(self, symbols, start_date, end_date):
+        """从本地缓存读取数据"""
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        frames = []
+        for symbol in symbols:
+            path = self._cache_path(symbol)
+            if os.path.exists(path):
+                df = pd.read_parquet(path)
+                frames.append(df[(df["date"] >= start) & (df["date"] <= end)])
+        if not frames:
+            return pd.DataFrame(columns=FETCH_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+
+def fetch_data(stock_list=cfg.STOCK_POOL, start_date=cfg.START_DATE, end_date=cfg.END_DATE,
+               source="akshare", output_path=cfg.RAW_DATA_FILE):
+    """
+    获取原始行情并写入raw_data.parquet
+    :param stock_list: 股票代码列表
+    :param start_date: 开始日期
+    :param end_date: 结束日期
+    :param source: 数据源名称（akshare / tushare / baostock / stub）
+    :param output_path: 输出文件
+    :return: (原始数据DataFrame, 失败股票字典)
+    """
+    api_config = load_api_config()
+    fetcher_config = api_config.get("fetcher", {}) or {}
+    scheduler = FetchScheduler(create_source(source, api_config),
+                               max_workers=fetcher_config.get("max_workers", 8),
+                               max_retries=fetcher_config.get("max_retries", 3),
+                               backoff_base=fetcher_config.get("backoff_base", 1.0))
+    raw = scheduler.run(stock_list, start_date, end_date)
+    raw.to_parquet(output_path, index=False)
+    return raw, scheduler.failures
+
+
+if __name__ == "__main__":
+    raw_data, failed = fetch_data()
+    print(f"数据获取完成：{len(raw_data)}行，失败{len(failed)}只股票")
+    for code, error in failed.items():
+        print(f"  {code}: {error}")
@@ -1 +1,569 @@
 # 基础因子计算（量价、财务、情绪）
+"""
+因子引擎
+
+- 因子注册表：每个因子用@register_factor声明一次（名称、类别、依赖的原始列），
+  计算函数只描述公式，不关心数据如何分组
+- 中间量共享：FactorContext缓存移动平均、EWM、滚动标准差等中间结果，
+  MA20、EMA12等在多个因子间只计算一次
+- 全市场一次计算：长表(date, stock_code)先转成宽表（每列一只股票），
+  滚动/EWM运算在宽表上按列向量化完成，天然不会跨股票串数据，最后再转回长表
+
+输出的因子列采用英文小写+下划线命名（如return_5d、ma_20_ratio）。
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from main_app.data_interface import compact_dtypes
+from main_app.utils.profiler import instrument
+
+FactorSpec = namedtuple("FactorSpec", ["name", "category", "func", "inputs"])
+
+# 因子注册表：因子名 → FactorSpec，按注册顺序即为输出列顺序
+FACTOR_REGISTRY = {}
+
+# 因子类别
+TECHNICAL = "technical"  # 技术指标类
+PRICE_VOLUME = "price_volume"  # 量价类
+FUNDAMENTAL = "fundamental"  # 基本面类
+
+
+def register_factor(name, category, inputs=("close",)):
+    """
+    因子注册装饰器
+    :param name: 因子名（即输出列名）
+    :param category: 因子类别
+    :param inputs: 计算所需的原始列，数据中缺少这些列时该因子自动跳过
+    """
+    def decorator(func):
+        if name in FACTOR_REGISTRY:
+            raise ValueError(f"因子 {name} 重复注册")
+        FACTOR_REGISTRY[name] = FactorSpec(name, category, func, tuple(inputs))
+        return func
+    return decorator
+
+
+class FactorContext:
+    def __init__(self, fields, ewm_seed=None, seed_row=None):
+        """
+        因子计算上下文，持有原始字段宽表并缓存中间结果
+        :param fields: dict，原始列名 → 宽表DataFrame（行序 × 股票代码）
+        :param ewm_seed: 增量模式下各EWM的初始状态，dict：EWM键 → 每只股票在历史最后一行的EWM值
+        :param seed_row: 增量模式下历史最后一行所在的行号，EWM从该行的种子值继续递推
+        """
+        self.fields = fields
+        self.ewm_seed = ewm_seed
+        self.seed_row = seed_row
+        self._cache = {}
+
+    def _cached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def field(self, name):
+        """原始字段宽表"""
+        return self.fields[name]
+
+    def returns(self, periods=1, name="close"):
+        """N日收益率"""
+        return self._cached(("returns", name, periods),
+                            lambda: self.field(name) / self.shift(name, periods) - 1)
+
+    def shift(self, name, periods):
+        """字段向后平移N日"""
+        return self._cached(("shift", name, periods), lambda: self.field(name).shift(periods))
+
+    def ma(self, name, window):
+        """简单移动平均"""
+        return self._cached(("ma", name, window),
+                            lambda: self.field(name).rolling(window, min_periods=window).mean())
+
+    def std(self, name, window):
+        """滚动标准差"""
+        return self._cached(("std", name, window),
+                            lambda: self.field(name).rolling(window, min_periods=window).std())
+
+    def rolling_max(self, name, window):
+        return self._cached(("max", name, window),
+                            lambda: self.field(name).rolling(window, min_periods=window).max())
+
+    def rolling_min(self, name, window):
+        return self._cached(("min", name, window),
+                            lambda: self.field(name).rolling(window, min_periods=window).min())
+
+    def ewm(self, name, span=None, com=None):
+        """
+        指数移动平均（adjust=False，与均线趋势法中的MACD/RSI算法一致）
+        缺失值直接跳过（ignore_na=True）：下一个有效值只与上一个EWM值加权，与中间隔了几行无关，
+        因此每只股票的递推状态只有一个EWM值，增量计算以它为种子即可与全量计算完全一致
+        :param name: 字段名，也可以是通过derive()登记的派生字段
+        :param span: EWM跨度（MACD用）
+        :param com: EWM质心（RSI、KDJ用）
+        """
+        key = ("ewm", name, span, com)
+        return self._cached(key, lambda: self._ewm(key, name, span, com))
+
+    def _ewm(self, key, name, span, com):
+        data = self.field(name)
+        if self.ewm_seed is None:
+            return data.ewm(span=span, com=com, adjust=False, ignore_na=True).mean()
+        if key not in self.ewm_seed:
+            raise KeyError(f"增量状态中缺少 {key}，请先全量计算一次")
+        # 把历史最后一行替换为上次保存的EWM值，adjust=False的递推即可从种子值继续
+        seeded = data.iloc[self.seed_row:].copy()
+        seeded.iloc[0] = self.ewm_seed[key]
+        return seeded.ewm(span=span, com=com, adjust=False, ignore_na=True).mean().reindex(data.index)
+
+    def ewm_state(self, last_rows):
+        """
+        提取每只股票最后一条记录处的EWM值，作为下次增量计算的种子
+        :param last_rows: 每只股票最后一条记录所在的行号（与宽表列顺序一致）
+        :return: dict：EWM键 → 数组
+        """
+        cols = np.arange(len(last_rows))
+        return {key: wide.to_numpy()[last_rows, cols]
+                for key, wide in self._cache.items() if key[0] == "ewm"}
+
+    def derive(self, name, compute):
+        """
+        登记派生字段（如MACD的DIFF），登记后可像原始字段一样参与ewm/ma等运算
+        :param name: 派生字段名
+        :param compute: 无参函数，返回宽表DataFrame
+        """
+        if name not in self.fields:
+            self.fields[name] = compute()
+        return self.fields[name]
+
+
+# ---------------------- 技术指标类因子（18个） ----------------------
+def _ma_ratio(window):
+    return lambda ctx: ctx.field("close") / ctx.ma("close", window)
+
+
+for _window in (5, 10, 20, 60):
+    register_factor(f"ma_{_window}_ratio", TECHNICAL)(_ma_ratio(_window))
+
+
+@register_factor("ma_5_20_spread", TECHNICAL)
+def ma_5_20_spread(ctx):
+    return ctx.ma("close", 5) / ctx.ma("close", 20) - 1
+
+
+@register_factor("ema_12_ratio", TECHNICAL)
+def ema_12_ratio(ctx):
+    return ctx.field("close") / ctx.ewm("close", span=12)
+
+
+def _macd_diff(ctx):
+    return ctx.derive("macd_diff", lambda: ctx.ewm("close", span=12) - ctx.ewm("close", span=26))
+
+
+@register_factor("macd_diff", TECHNICAL)
+def macd_diff(ctx):
+    return _macd_diff(ctx) / ctx.field("close")
+
+
+@register_factor("macd_dea", TECHNICAL)
+def macd_dea(ctx):
+    _macd_diff(ctx)
+    return ctx.ewm("macd_diff", span=9) / ctx.field("close")
+
+
+@register_factor("macd_hist", TECHNICAL)
+def macd_hist(ctx):
+    return 2 * (_macd_diff(ctx) - ctx.ewm("macd_diff", span=9)) / ctx.field("close")
+
+
+def _rsi(period):
+    def compute(ctx):
+        delta = ctx.derive("close_delta", lambda: ctx.field("close").diff(1))
+        ctx.derive("gain", lambda: delta.clip(lower=0))
+        ctx.derive("loss", lambda: (-delta).clip(lower=0))
+        rs = ctx.ewm("gain", com=period) / (ctx.ewm("loss", com=period) + 1e-6)
+        return 100 - 100 / (1 + rs)
+    return compute
+
+
+for _period in (6, 14):
+    register_factor(f"rsi_{_period}", TECHNICAL)(_rsi(_period))
+
+
+@register_factor("atr_14", TECHNICAL, inputs=("high", "low", "close"))
+def atr_14(ctx):
+    prev_close = ctx.shift("close", 1)
+    ctx.derive("true_range", lambda: np.maximum(
+        ctx.field("high") - ctx.field("low"),
+        np.maximum((ctx.field("high") - prev_close).abs(), (ctx.field("low") - prev_close).abs())))
+    return ctx.ma("true_range", 14) / ctx.field("close")
+
+
+@register_factor("boll_position_20", TECHNICAL)
+def boll_position_20(ctx):
+    return (ctx.field("close") - ctx.ma("close", 20)) / (2 * ctx.std("close", 20))
+
+
+@register_factor("boll_width_20", TECHNICAL)
+def boll_width_20(ctx):
+    return 4 * ctx.std("close", 20) / ctx.ma("close", 20)
+
+
+def _kdj_k(ctx):
+    ctx.derive("rsv_9", lambda: (ctx.field("close") - ctx.rolling_min("low", 9))
+               / (ctx.rolling_max("high", 9) - ctx.rolling_min("low", 9)) * 100)
+    return ctx.derive("kdj_k", lambda: ctx.ewm("rsv_9", com=2))
+
+
+@register_factor("kdj_k", TECHNICAL, inputs=("high", "low", "close"))
+def kdj_k(ctx):
+    return _kdj_k(ctx)
+
+
+@register_factor("kdj_d", TECHNICAL, inputs=("high", "low", "close"))
+def kdj_d(ctx):
+    _kdj_k(ctx)
+    return ctx.ewm("kdj_k", com=2)
+
+
+@register_factor("williams_r_14", TECHNICAL, inputs=("high", "low", "close"))
+def williams_r_14(ctx):
+    high_max, low_min = ctx.rolling_max("high", 14), ctx.rolling_min("low", 14)
+    return (high_max - ctx.field("close")) / (high_max - low_min) * -100
+
+
+@register_factor("trix_12", TECHNICAL)
+def trix_12(ctx):
+    ctx.derive("ema_12", lambda: ctx.ewm("close", span=12))
+    ctx.derive("ema_12_2", lambda: ctx.ewm("ema_12", span=12))
+    ctx.derive("ema_12_3", lambda: ctx.ewm("ema_12_2", span=12))
+    return ctx.returns(1, "ema_12_3")
+
+
+# ---------------------- 量价类因子（12个） ----------------------
+def _return(periods):
+    return lambda ctx: ctx.returns(periods)
+
+
+for _periods in (1, 5, 20, 60):
+    register_factor(f"return_{_periods}d", PRICE_VOLUME)(_return(_periods))
+
+
+def _volatility(window):
+    def compute(ctx):
+        ctx.derive("return_1d", lambda: ctx.returns(1))
+        return ctx.std("return_1d", window)
+    return compute
+
+
+for _window in (20, 60):
+    register_factor(f"volatility_{_window}d", PRICE_VOLUME)(_volatility(_window))
+
+
+@register_factor("volume_change_5d", PRICE_VOLUME, inputs=("volume",))
+def volume_change_5d(ctx):
+    return ctx.returns(5, "volume")
+
+
+@register_factor("volume_ratio_5_20", PRICE_VOLUME, inputs=("volume",))
+def volume_ratio_5_20(ctx):
+    return ctx.ma("volume", 5) / ctx.ma("volume", 20)
+
+
+@register_factor("price_volume_corr_20", PRICE_VOLUME, inputs=("close", "volume"))
+def price_volume_corr_20(ctx):
+    # 滚动相关系数 = (E[xy] - E[x]E[y]) / (σx·σy)，复用已缓存的均值与标准差
+    ctx.derive("close_x_volume", lambda: ctx.field("close") * ctx.field("volume"))
+    cov = (ctx.ma("close_x_volume", 20) - ctx.ma("close", 20) * ctx.ma("volume", 20)) * 20 / 19
+    return cov / (ctx.std("close", 20) * ctx.std("volume", 20))
+
+
+@register_factor("amplitude_20", PRICE_VOLUME, inputs=("high", "low", "close"))
+def amplitude_20(ctx):
+    ctx.derive("amplitude", lambda: (ctx.field("high") - ctx.field("low")) / ctx.shift("close", 1))
+    return ctx.ma("amplitude", 20)
+
+
+@register_factor("close_position_20", PRICE_VOLUME, inputs=("high", "low", "close"))
+def close_position_20(ctx):
+    low_min = ctx.rolling_min("low", 20)
+    return (ctx.field("close") - low_min) / (ctx.rolling_max("high", 20) - low_min)
+
+
+@register_factor("illiquidity_20", PRICE_VOLUME, inputs=("close", "volume"))
+def illiquidity_20(ctx):
+    # Amihud非流动性：|日收益率| / 成交额（亿元），成交额缺失时用 收盘价×成交量 近似
+    turnover_value = ctx.fields["amount"] if "amount" in ctx.fields else ctx.field("close") * ctx.field("volume")
+    ctx.derive("abs_return_per_value", lambda: ctx.returns(1).abs() / (turnover_value / 1e8))
+    return ctx.ma("abs_return_per_value", 20)
+
+
+# ---------------------- 基本面类因子（12个） ----------------------
+def _passthrough(column):
+    return lambda ctx: ctx.field(column)
+
+
+def _inverse(column):
+    return lambda ctx: 1 / ctx.field(column).where(ctx.field(column) != 0)
+
+
+for _name, _column in (("pe_ttm", "pe_ttm"), ("pb", "pb"), ("ps_ttm", "ps_ttm"), ("roe", "roe"),
+                       ("roa", "roa"), ("gross_margin", "gross_margin"), ("net_margin", "net_margin"),
+                       ("net_profit_growth", "net_profit_growth"), ("revenue_growth", "revenue_growth"),
+                       ("debt_to_asset", "debt_to_asset")):
+    register_factor(_name, FUNDAMENTAL, inputs=(_column,))(_passthrough(_column))
+
+register_factor("ep_ttm", FUNDAMENTAL, inputs=("pe_ttm",))(_inverse("pe_ttm"))
+register_factor("bp", FUNDAMENTAL, inputs=("pb",))(_inverse("pb"))
+
+
+# ---------------------- 因子计算入口 ----------------------
+def available_factors(columns, names=None):
+    """
+    根据数据已有的列筛选可计算的因子
+    :param columns: 数据中已有的列名
+    :param names: 指定的因子名列表，None表示注册表中全部因子
+    :return: 可计算的因子名列表（保持注册顺序）
+    """
+    names = list(FACTOR_REGISTRY) if names is None else list(names)
+    unknown = [n for n in names if n not in FACTOR_REGISTRY]
+    if unknown:
+        raise KeyError(f"未注册的因子：{unknown}")
+    columns = set(columns)
+    return [n for n in names if set(FACTOR_REGISTRY[n].inputs) <= columns]
+
+
+@instrument()
+def to_wide(df, columns, date_col="date", code_col="stock_code"):
+    """
+    长表 → 宽表字典。宽表按"行序"对齐：第k行是每只股票自己的第k条记录，
+    停牌缺失的日期不会在窗口里插入空值，结果与逐只股票单独计算完全一致
+    :param df: 行情长表
+    :param columns: 需要转换的原始列
+    :return: (fields, layout) fields为 列名 → 宽表DataFrame（行序 × 股票代码）；
+             layout为(row_pos, stock_idx, dates, codes)，用于转回长表
+    """
+    data = df.sort_values([code_col, date_col], kind="stable")
+    if data.duplicated([code_col, date_col]).any():
+        raise ValueError("存在重复的(日期, 股票代码)记录，请先清洗数据")
+
+    codes = data[code_col].astype(str).to_numpy()
+    stock_codes, stock_idx = np.unique(codes, return_inverse=True)
+    row_pos = _group_row_number(codes)  # 数据已按股票排序，组是连续的
+
+    fields = {}
+    for col in columns:
+        values = np.full((row_pos.max() + 1, len(stock_codes)), np.nan)
+        values[row_pos, stock_idx] = data[col].to_numpy(dtype=np.float64)
+        fields[col] = pd.DataFrame(values, columns=stock_codes)
+    return fields, (row_pos, stock_idx, data[date_col].to_numpy(), codes)
+
+
+@instrument()
+def from_wide(results, layout, date_col="date", code_col="stock_code"):
+    """
+    宽表字典 → 长表，行与原始数据一一对应，按股票、日期排序；因子值存为float32
+    """
+    row_pos, stock_idx, dates, codes = layout
+    out = pd.DataFrame({date_col: dates, code_col: codes})
+    for name, wide in results.items():
+        out[name] = wide.to_numpy()[row_pos, stock_idx].astype(np.float32)
+    return out
+
+
+def _match_source_layout(out, df, code_col="stock_code"):
+    """输入是紧凑布局（categorical股票代码、交易日历）时，输出保持同样的布局"""
+    if isinstance(df[code_col].dtype, pd.CategoricalDtype):
+        out[code_col] = pd.Categorical(out[code_col], categories=df[code_col].cat.categories)
+    out.attrs.update(df.attrs)
+    return out
+
+
+def _input_columns(names, columns):
+    """因子依赖的原始列（成交额存在时一并带上，供非流动性因子使用）"""
+    return sorted({col for n in names for col in FACTOR_REGISTRY[n].inputs} | ({"amount"} & set(columns)))
+
+
+def _evaluate(fields, names, ewm_seed=None, seed_row=None):
+    """在宽表上依次计算因子，返回(因子宽表字典, 上下文)"""
+    ctx = FactorContext(fields, ewm_seed, seed_row)
+    results = {}
+    for name in names:
+        results[name] = FACTOR_REGISTRY[name].func(ctx).replace([np.inf, -np.inf], np.nan)
+    return results, ctx
+
+
+@instrument()
+def compute_factors(df, names=None, date_col="date", code_col="stock_code"):
+    """
+    对长表(date, stock_code)一次性计算全市场、全部因子
+    :param df: 行情长表，需包含date、stock_code及因子依赖的原始列
+    :param names: 需要计算的因子名，None表示全部可计算因子
+    :return: 长表DataFrame：date、stock_code + 因子列
+    """
+    names = available_factors(df.columns, names)
+    fields, layout = to_wide(df, _input_columns(names, df.columns), date_col, code_col)
+    results, _ = _evaluate(fields, names)
+    return _match_source_layout(from_wide(results, layout, date_col, code_col), df, code_col)
+
+
+# ---------------------- 增量计算 ----------------------
+# 每只股票保存的尾部行数，需 ≥ 最长滚动窗口(60) + 最大平移(1)
+TAIL_ROWS = 80
+
+
+class IncrementalFactorEngine:
+    def __init__(self, names=None, tail_rows=TAIL_ROWS, date_col="date", code_col="stock_code"):
+        """
+        增量因子引擎：首次全量计算后保存状态，之后每天只计算新追加的交易日
+        保存的状态包括：
+        - 每只股票最近tail_rows条原始数据（滚动窗口的尾部）
+        - 每个EWM在每只股票最后一条记录处的值（EMA12/EMA26/DEA、RSI的平均涨跌幅等）
+        :param names: 需要计算的因子名，None表示全部可计算因子
+        :param tail_rows: 保存的尾部行数
+        """
+        self.names = names
+        self.tail_rows = tail_rows
+        self.date_col = date_col
+        self.code_col = code_col
+        self.inputs = None  # 因子依赖的原始列
+        self.tails = None  # 尾部原始数据（长表）
+        self.ewm_state = None  # EWM键 → Series(index=stock_code)
+        self.last_date = None  # Series：stock_code → 已计算到的最后日期
+
+    def fit(self, df):
+        """
+        全量计算并建立增量状态
+        :param df: 全部历史行情长表
+        :return: 全部历史的因子长表
+        """
+        self.names = available_factors(df.columns, self.names)
+        self.inputs = _input_columns(self.names, df.columns)
+        fields, layout = to_wide(df, self.inputs, self.date_col, self.code_col)
+        results, ctx = _evaluate(fields, self.names)
+
+        stock_codes = fields[self.inputs[0]].columns
+        last_rows = np.bincount(layout[1], minlength=len(stock_codes)) - 1
+        self.ewm_state = {key: pd.Series(values, index=stock_codes)
+                          for key, values in ctx.ewm_state(last_rows).items()}
+        self._update_tails(df)
+        return _match_source_layout(from_wide(results, layout, self.date_col, self.code_col), df, self.code_col)
+
+    def update(self, new_df):
+        """
+        增量计算：只为新追加的交易日计算因子，计算量与新增行数成正比，与历史长度无关
+        :param new_df: 新增行情长表（已计算过的日期会被忽略）
+        :return: 新增行的因子长表（输入为紧凑布局时输出同样的布局，可直接与fit()的结果拼接）
+        """
+        if self.tails is None:
+            raise RuntimeError("请先调用fit()全量计算，或用load()加载已保存的状态")
+        date_col, code_col = self.date_col, self.code_col
+        source = new_df
+
+        # 1. 过滤掉已经计算过的日期
+        new_df = new_df.assign(**{code_col: new_df[code_col].astype(str)})
+        last_date = new_df[code_col].map(self.last_date)
+        new_df = new_df[last_date.isna() | (new_df[date_col] > last_date)]
+        new_df = new_df.sort_values([code_col, date_col], kind="stable")
+        if new_df.empty:
+            return _match_source_layout(pd.DataFrame(columns=[date_col, code_col] + self.names), source, code_col)
+
+        # 2. 拼接 尾部数据 + 新数据：尾部右对齐到第tail_rows-1行，新数据从第tail_rows行开始
+        stock_codes = np.unique(new_df[code_col].to_numpy())
+        tails = self.tails[self.tails[code_col].isin(stock_codes)]
+        tail_codes = tails[code_col].to_numpy()
+        new_codes = new_df[code_col].to_numpy()
+        tail_stock = np.searchsorted(stock_codes, tail_codes)
+        new_stock = np.searchsorted(stock_codes, new_codes)
+        tail_pos = self.tail_rows - np.bincount(tail_stock, minlength=len(stock_codes))[tail_stock] \
+            + _group_row_number(tail_codes)
+        new_count = np.bincount(new_stock, minlength=len(stock_codes))
+        new_pos = self.tail_rows + _group_row_number(new_codes)
+
+        fields = {}
+        for col in self.inputs:
+            values = np.full((self.tail_rows + new_count.max(), len(stock_codes)), np.nan)
+            values[tail_pos, tail_stock] = tails[col].to_numpy(dtype=np.float64)
+            values[new_pos, new_stock] = new_df[col].to_numpy(dtype=np.float64)
+            fields[col] = pd.DataFrame(values, columns=stock_codes)
+
+        # 3. 以保存的EWM值为种子计算因子
+        ewm_seed = {key: state.reindex(stock_codes).to_numpy() for key, state in self.ewm_state.items()}
+        results, ctx = _evaluate(fields, self.names, ewm_seed, seed_row=self.tail_rows - 1)
+
+        # 4. 更新状态
+        for key, values in ctx.ewm_state(self.tail_rows + new_count - 1).items():
+            state = self.ewm_state[key].reindex(self.ewm_state[key].index.union(stock_codes))
+            state.loc[stock_codes] = values
+            self.ewm_state[key] = state
+        self._update_tails(new_df)
+
+        layout = (new_pos, new_stock, new_df[date_col].to_numpy(), new_codes)
+        return _match_source_layout(from_wide(results, layout, date_col, code_col), source, code_col)
+
+    def _update_tails(self, df):
+        """把新数据并入尾部，每只股票只保留最近tail_rows条"""
+        cols = [self.date_col, self.code_col] + self.inputs
+        data = df[cols].assign(**{self.code_col: df[self.code_col].astype(str)})
+        if self.tails is not None:
+            data = pd.concat([self.tails, data], ignore_index=True)
+        data = data.sort_values([self.code_col, self.date_col], kind="stable")
+        self.tails = data.groupby(self.code_col, sort=False).tail(self.tail_rows).reset_index(drop=True)
+        self.last_date = self.tails.groupby(self.code_col)[self.date_col].max()
+
+    def save(self, path):
+        """保存增量状态"""
+        pd.to_pickle({
+            "names": self.names, "tail_rows": self.tail_rows, "inputs": self.inputs,
+            "date_col": self.date_col, "code_col": self.code_col,
+            "tails": self.tails, "ewm_state": self.ewm_state,
+        }, path)
+
+    @classmethod
+    def load(cls, path):
+        """加载增量状态"""
+        state = pd.read_pickle(path)
+        engine = cls(state["names"], state["tail_rows"], state["date_col"], state["code_col"])
+        engine.inputs = state["inputs"]
+        engine.tails = state["tails"]
+        engine.ewm_state = state["ewm_state"]
+        engine.last_date = engine.tails.groupby(engine.code_col)[engine.date_col].max()
+        return engine
+
+
+def _group_row_number(codes):
+    """已按股票排序的代码数组 → 组内行号"""
+    starts = np.r_[0, np.flatnonzero(codes[1:] != codes[:-1]) + 1]
+    counts = np.diff(np.r_[starts, len(codes)])
+    return np.arange(len(codes)) - np.repeat(starts, counts)
+
+
+def run_factor_mining(input_path=cfg.STANDARD_DATA_FILE, output_path=cfg.STANDARD_DATA_FILE, names=None,
+                      standardize=True):
+    """
+    读取标准化数据，计算因子后合并写回（与接口规范一致：扩展standard_data.parquet的因子列）
+    :param input_path: 输入的标准化数据文件
+    :param output_path: 输出文件，默认覆盖输入文件
+    :param names: 需要计算的因子名，None表示全部可计算因子
+    :param standardize: 是否对因子列做横截面Z-score标准化（data_cleaner.standardize_cross_section）
+    :return: 含因子列的DataFrame
+    """
+    df = compact_dtypes(pd.read_parquet(input_path))
+    df["date"] = pd.to_datetime(df["date"])
+    factors = compute_factors(df, names)
+    factor_cols = [c for c in factors.columns if c not in ("date", "stock_code")]
+    merged = df.drop(columns=[c for c in factor_cols if c in df.columns]).merge(
+        factors, on=["date", "stock_code"], how="left")
+    if standardize:
+        # data_cleaner在模块级导入了本模块的因子注册表，这里延迟导入避免循环引用
+        from data_module.data_cleaner import standardize_cross_section
+        merged = standardize_cross_section(merged, factor_cols)
+    merged.to_parquet(output_path, index=False)
+    return merged
+
+
+if __name__ == "__main__":
+    result = run_factor_mining()
+    print(f"因子计算完成：{len(result)}行，共{len(FACTOR_REGISTRY)}个注册因子")
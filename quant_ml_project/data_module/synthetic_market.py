@@ -0,0 +1,169 @@
+# 可复现的模拟行情生成器
+"""
+可复现的模拟行情生成器（用于基准测试与离线调试）
+
+- N只股票 × T个交易日的长表，字段与抓取结果一致：date, stock_code, open, high, low, close, volume，另有amount
+- 价格为几何随机游走：市场因子 × beta + 个股噪声，单日涨跌幅截断在±10%（A股涨跌停）
+- OHLC关系始终成立：open由前收盘加跳空得到，high ≥ max(open, close)，low ≤ min(open, close)
+- 成交量为对数正态分布，与当日涨跌幅绝对值正相关，按100股取整
+- 部分股票在样本中途上市；停牌日整行缺失（与数据源一致），复牌后价格带跳空
+- 少量随机缺失值（字段为NaN），用来覆盖清洗逻辑；amount在注入缺失值之后计算，量价缺失时成交额也缺失
+- 每只股票的价格与缺失值都使用由(seed, 股票序号)派生的独立随机数流：同一seed下，第i只股票的数据与股票总数无关，
+  小规模样本是大规模样本的子集
+- SyntheticSource：以模拟行情为数据源的DataSource，可直接交给FetchScheduler（数据源名"synthetic"）
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_module.data_fetcher import FETCH_COLUMNS, DataSource
+
+PRICE_LIMIT = 0.10  # 单日涨跌幅上限
+MISSING_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+def stock_codes(n_stocks):
+    """模拟股票代码：000001, 000002, ..."""
+    return [f"{i + 1:06d}" for i in range(n_stocks)]
+
+
+def trading_calendar(n_days, start_date="2015-01-05"):
+    """从start_date起的n_days个工作日（datetime64[ns]数组）"""
+    start = np.datetime64(pd.Timestamp(start_date).date())
+    first = np.busday_offset(start, 0, roll="forward")
+    return np.busday_offset(first, np.arange(n_days)).astype("datetime64[ns]")
+
+
+def _market_returns(n_days, seed, drift=0.0003, vol=0.012):
+    rng = np.random.default_rng([seed, 0])
+    return rng.normal(drift, vol, n_days)
+
+
+def _simulate_stock(index, market, seed, suspension_rate, max_suspension_days, listing_rate):
+    """
+    生成一只股票的完整序列
+    :return: (有效行的交易日序号, open, high, low, close, volume)
+    """
+    n_days = len(market)
+    rng = np.random.default_rng([seed, 1, index])
+
+    # 1. 个股参数：beta、特质波动率、初始价格、成交量水平
+    beta = rng.uniform(0.5, 1.5)
+    vol = rng.uniform(0.01, 0.035)
+    price0 = np.exp(rng.uniform(np.log(3), np.log(80)))
+    volume0 = np.exp(rng.uniform(np.log(2e5), np.log(2e7)))
+
+    # 2. 收盘价：对数收益率截断在涨跌停以内后累乘
+    returns = np.clip(beta * market + rng.normal(0, vol, n_days), np.log(1 - PRICE_LIMIT), np.log(1 + PRICE_LIMIT))
+    close = price0 * np.exp(np.cumsum(returns))
+
+    # 3. 开盘价 = 前收盘 × 跳空（跳空后的开盘价也不超过涨跌停），最高/最低价包住开盘与收盘
+    prev_close = np.r_[price0, close[:-1]]
+    gap = np.clip(rng.normal(0, vol * 0.3, n_days), np.log(1 - PRICE_LIMIT), np.log(1 + PRICE_LIMIT))
+    open_ = prev_close * np.exp(gap)
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, vol * 0.5, n_days)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, vol * 0.5, n_days)))
+    high = np.maximum(np.minimum(high, prev_close * (1 + PRICE_LIMIT)), np.maximum(open_, close))
+    low = np.minimum(np.maximum(low, prev_close * (1 - PRICE_LIMIT)), np.minimum(open_, close))
+
+    # 4. 成交量：与|收益率|/波动率正相关，按手（100股）取整
+    volume = volume0 * np.exp(0.4 * np.abs(returns) / vol + rng.normal(0, 0.3, n_days))
+    volume = np.maximum(np.round(volume / 100) * 100, 100)
+
+    # 5. 上市日与停牌：上市前、停牌期间整行缺失
+    valid = np.ones(n_days, dtype=bool)
+    if rng.random() < listing_rate:
+        valid[:rng.integers(1, max(n_days * 4 // 5, 2))] = False
+    starts = np.flatnonzero(rng.random(n_days) < suspension_rate)
+    lengths = rng.integers(1, max_suspension_days + 1, len(starts))
+    for start, length in zip(starts, lengths):
+        valid[start:start + length] = False
+    rows = np.flatnonzero(valid)
+    return rows, open_[rows], high[rows], low[rows], close[rows], volume[rows]
+
+
+def generate_market(n_stocks=50, n_days=252, start_date="2015-01-05", seed=0, suspension_rate=0.002,
+                    max_suspension_days=20, listing_rate=0.2, missing_rate=0.0005, dtype=np.float32):
+    """
+    生成模拟的多股票日线长表
+    :param n_stocks: 股票数
+    :param n_days: 交易日数（约252个交易日为一年）
+    :param start_date: 第一个交易日（之后按工作日排列）
+    :param seed: 随机种子，相同参数与种子生成完全相同的数据
+    :param suspension_rate: 每个交易日开始一段停牌的概率
+    :param max_suspension_days: 单次停牌的最长交易日数
+    :param listing_rate: 在样本中途上市的股票比例
+    :param missing_rate: 单个字段值随机缺失（NaN）的比例
+    :param dtype: 价格、成交量列的浮点类型
+    :return: 按股票、日期排序的DataFrame：date, stock_code, open, high, low, close, volume, amount
+    """
+    # 1. 公共部分：交易日历、市场因子
+    calendar = trading_calendar(n_days, start_date)
+    market = _market_returns(n_days, seed)
+    codes = stock_codes(n_stocks)
+
+    # 2. 逐只股票生成（每只股票一条独立随机数流），最后一次性拼接
+    parts = [_simulate_stock(i, market, seed, suspension_rate, max_suspension_days, listing_rate)
+             for i in range(n_stocks)]
+    sizes = np.array([len(part[0]) for part in parts])
+    columns = {name: np.concatenate([part[k] for part in parts]).astype(dtype)
+               for k, name in enumerate(["open", "high", "low", "close", "volume"], start=1)}
+    df = pd.DataFrame({
+        "date": calendar[np.concatenate([part[0] for part in parts])],
+        "stock_code": np.repeat(np.array(codes, dtype=object), sizes),
+        **columns,
+    })
+
+    # 3. 随机缺失值：每只股票一条独立的随机数流（与价格序列的流分开），缺失位置与股票总数无关
+    if missing_rate > 0:
+        draws = [np.random.default_rng([seed, 2, i]).random((len(MISSING_COLUMNS), size))
+                 for i, size in enumerate(sizes)]
+        missing = np.concatenate(draws, axis=1) < missing_rate
+        for k, col in enumerate(MISSING_COLUMNS):
+            df.loc[missing[k], col] = np.nan
+
+    # 4. 成交额（量 × 均价）在缺失值之后计算，量价缺失的行成交额也缺失
+    df["amount"] = (df["volume"] * (df["open"] + df["high"] + df["low"] + df["close"]) / 4).astype(dtype)
+    return df
+
+
+class SyntheticSource(DataSource):
+    name = "synthetic"
+
+    def __init__(self, market=None, rate_per_second=1e6, **kwargs):
+        """
+        模拟行情数据源：按股票代码返回generate_market生成的数据，不联网、不限速（用于测量调度器自身的开销）
+        :param market: 已生成的模拟行情，None表示按kwargs生成
+        :param kwargs: 传给generate_market的参数
+        """
+        super().__init__(rate_per_second)
+        market = generate_market(**kwargs) if market is None else market
+        self._groups = {code: group[FETCH_COLUMNS].reset_index(drop=True)
+                        for code, group in market.groupby("stock_code", sort=False)}
+        self.symbols = list(self._groups)
+
+    def fetch(self, symbol, start_date, end_date):
+        df = self._groups.get(str(symbol))
+        if df is None:
+            return pd.DataFrame(columns=FETCH_COLUMNS)
+        return df[(df["date"] >= pd.Timestamp(start_date)) & (df["date"] <= pd.Timestamp(end_date))]
+
+
+def write_market(path, **kwargs):
+    """
+    生成模拟行情并写入parquet（可直接作为clean_data的输入）
+    :param path: 输出文件
+    :param kwargs: 传给generate_market的参数
+    :return: 生成的DataFrame
+    """
+    df = generate_market(**kwargs)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    df.to_parquet(path, index=False)
+    return df
+
+
+if __name__ == "__main__":
+    market = generate_market(n_stocks=5, n_days=20)
+    print(market.head(10))
+    print(f"{len(market)}行，{market['stock_code'].nunique()}只股票")
@@ -1 +1,48 @@
 # 主窗口布局
+"""
+主窗口（Streamlit）
+
+启动：在quant_ml_project目录下运行 streamlit run frontend/main_window.py
+控制器与缓存是进程级单例（main_app.gui_controller.get_controller），页面重跑时不会重新加载数据。
+"""
+import os
+import sys
+
+# streamlit run时脚本所在目录在sys.path中，项目根目录不在，需要手动加入
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+
+def main():
+    import streamlit as st
+
+    from backtest_module.report_generator import ReportExporter
+    from frontend import result_panel, strategy_panel
+    from main_app.gui_controller import get_controller
+
+    @st.cache_resource
+    def exporter():
+        return ReportExporter()
+
+    st.set_page_config(page_title="量化选股回测", layout="wide")
+    st.title("量化选股回测")
+    controller = get_controller()
+
+    with st.sidebar:
+        result, status = strategy_panel.render(st, controller)
+        if st.button("运行主流程"):
+            st.session_state["pipeline_job"] = controller.submit_pipeline()
+        if "pipeline_job" in st.session_state:
+            pipeline_status = controller.poll(st.session_state["pipeline_job"])
+            st.caption(f"主流程：{pipeline_status['status']} {pipeline_status['message'][:80]}")
+            if pipeline_status["status"] in ("pending", "running"):
+                status = status or pipeline_status
+    result_panel.render(st, result, exporter())
+    strategy_panel.schedule_poll(st, status)
+
+
+if __name__ == "__main__":
+    main()
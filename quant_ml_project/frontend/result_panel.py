@@ -1 +1,34 @@
 # 结果展示面板
+"""
+结果展示面板（Streamlit）：组合净值曲线、各股票绩效表，以及在后台线程中导出报告
+"""
+import os
+
+from config import project_config as cfg
+
+
+def render(st, result, exporter=None):
+    """
+    展示回测结果
+    :param st: streamlit模块
+    :param result: GuiController回测任务的结果（portfolio_nav、performance、trades）
+    :param exporter: 可选的ReportExporter，传入时显示导出按钮
+    """
+    st.subheader("回测结果")
+    if result is None:
+        st.info("等待回测结果……")
+        return
+    nav = result["portfolio_nav"]
+    performance = result["performance"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("组合总收益", f"{nav.iloc[-1] / nav.iloc[0] - 1:.2%}")
+    col2.metric("组合最大回撤", f"{(nav / nav.cummax() - 1).min():.2%}")
+    col3.metric("平均胜率", f"{performance['win_rate'].mean():.2%}")
+    st.line_chart(nav)
+    st.dataframe(performance.sort_values("total_return", ascending=False))
+
+    if exporter is not None and st.button("导出报告（后台）"):
+        path = os.path.join(cfg.BACKTEST_OUTPUT_PATH, "gui_report.xlsx")
+        exporter.excel({"performance": performance.reset_index(), "portfolio": nav.rename_axis("date").reset_index()},
+                       path)
+        st.success(f"已提交导出：{path}")
@@ -1 +1,69 @@
 # 策略调整面板
+"""
+策略调整面板（Streamlit）
+
+滑块变化时页面会重跑：先查结果缓存，命中则立即展示；未命中则提交后台回测任务，
+页面在任务运行期间展示上一次的结果与进度条，并定时轮询，不在请求线程中等待回测。
+点击"取消"后记住被取消的参数，页面重跑时不再自动提交同一组参数，直到参数变化或点击"重新运行"。
+"""
+import time
+
+POLL_INTERVAL = 0.5  # 任务运行时页面轮询间隔（秒）
+
+
+def strategy_params(st):
+    """
+    绘制参数控件
+    :return: 回测参数字典
+    """
+    st.subheader("策略参数")
+    buy_threshold = st.slider("买入阈值（上涨概率）", 0.0, 1.0, 0.5, 0.01)
+    sell_threshold = st.slider("卖出阈值（上涨概率）", 0.0, 1.0, buy_threshold, 0.01)
+    initial_capital = st.number_input("每只股票初始资金", min_value=10000, value=100000, step=10000)
+    return {"buy_threshold": buy_threshold, "sell_threshold": sell_threshold,
+            "initial_capital": int(initial_capital), "price_col": "close"}
+
+
+def render(st, controller):
+    """
+    绘制策略面板并返回可展示的回测结果
+    :param st: streamlit模块
+    :param controller: GuiController
+    :return: (回测结果或None, 任务状态或None)
+    """
+    params = strategy_params(st)
+    result = controller.cached_backtest(params)
+    if result is not None:
+        st.session_state["last_result"] = result
+        return result, None
+
+    if st.session_state.get("cancelled_params") == params:
+        st.info("已取消当前参数的回测")
+        if not st.button("重新运行"):
+            return st.session_state.get("last_result"), None
+    st.session_state.pop("cancelled_params", None)
+
+    job_id = controller.submit_backtest(params)
+    status = controller.poll(job_id)
+    if status["status"] == "done":
+        result = controller.result(job_id)
+        st.session_state["last_result"] = result
+        return result, status
+    if status["status"] in ("failed", "cancelled"):
+        st.error(f"回测失败：{status['error'] or status['status']}")
+        return st.session_state.get("last_result"), status
+
+    # 任务运行中：展示进度，稍后重跑页面再次轮询
+    st.progress(status["progress"], text=f"{status['message']}（{status['elapsed']:.1f}秒）")
+    if st.button("取消"):
+        controller.cancel(job_id)
+        st.session_state["cancelled_params"] = params
+        st.rerun()
+    return st.session_state.get("last_result"), status
+
+
+def schedule_poll(st, status):
+    """任务未结束时，等待一个轮询间隔后重跑页面"""
+    if status is not None and status["status"] in ("pending", "running"):
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
@@ -1 +1,107 @@
 # 程序唯一入口点
+"""
+程序唯一入口点（命令行）
+
+启动时只导入标准库与配置，各子命令在执行时才导入自己需要的模块：
+查看信号只导入数据接口模块，运行流水线时各阶段再分别导入pandas、sklearn、xgboost等重型依赖。
+默认使用无界面的Agg绘图后端，只有传入--plots时才使用交互式后端。
+
+用法示例：
+    python main.py signals                      # 查看最新一个交易日的信号
+    python main.py signals --days 3 --top 50
+    python main.py run                          # 运行流水线（有效缓存的阶段跳过）
+    python main.py run --targets backtest --force backtest
+    python main.py run --profile train --profile-mode sample --log-level DEBUG
+    python main.py metrics                      # 最近一次运行各阶段、子步骤与上一次运行的对比
+    python main.py bench                        # 各模块导入耗时
+"""
+import argparse
+import os
+import sys
+
+from config import project_config as cfg
+
+
+def use_plot_backend(show_plots=False):
+    """
+    选择绘图后端：不需要弹出图形窗口时使用Agg（必须在导入matplotlib之前设置）
+    :param show_plots: 是否需要交互式显示图形
+    """
+    if not show_plots:
+        os.environ.setdefault("MPLBACKEND", "Agg")
+
+
+def show_signals(store_path=cfg.SIGNAL_STORE_PATH, days=1, top=20, only_active=True):
+    """
+    打印最近几个交易日的信号（按置信度降序）
+    :param days: 交易日数
+    :param top: 每个交易日最多打印的行数，0表示全部
+    :param only_active: 是否只打印买入/卖出信号（忽略0）
+    """
+    import numpy as np
+
+    from main_app.data_interface import SignalStore
+
+    store = SignalStore(store_path)
+    if len(store) == 0:
+        print(f"没有信号：{store_path}")
+        return
+    dates, codes, signals, confidence = store.latest(days)
+    for date in np.unique(dates):
+        rows = np.flatnonzero((dates == date) & ((signals != 0) if only_active else True))
+        rows = rows[np.argsort(-np.nan_to_num(confidence[rows], nan=-1.0), kind="stable")]
+        n_buy, n_sell = int((signals[dates == date] == 1).sum()), int((signals[dates == date] == -1).sum())
+        print(f"{date}  买入{n_buy}只  卖出{n_sell}只")
+        for i in rows[:top] if top else rows:
+            print(f"  {codes[i]}  {int(signals[i]):>2}  {confidence[i]:.4f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="量化选股项目入口")
+    parser.add_argument("--plots", action="store_true", help="使用交互式绘图后端（默认Agg，不弹出窗口）")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="运行流水线")
+    run.add_argument("--targets", nargs="+", default=None, help="目标阶段（连同其上游）")
+    run.add_argument("--force", nargs="+", default=(), help="强制重跑的阶段")
+    run.add_argument("--workers", type=int, default=4, help="并发执行的阶段数")
+    run.add_argument("--profile", nargs="+", default=(), help="需要剖析的阶段或子步骤（all表示全部阶段）")
+    run.add_argument("--profile-mode", default="cprofile", choices=["cprofile", "sample"], help="剖析方式")
+    run.add_argument("--log-level", default=None, help="日志级别（DEBUG/INFO/WARNING），默认取QUANT_LOG_LEVEL")
+
+    metrics = commands.add_parser("metrics", help="对比两次流水线运行的各步骤指标")
+    metrics.add_argument("--run", default=None, help="运行ID，默认为最后一次")
+    metrics.add_argument("--baseline", default=None, help="对比的运行ID，默认为前一次")
+
+    signals = commands.add_parser("signals", help="查看最新信号")
+    signals.add_argument("--store", default=cfg.SIGNAL_STORE_PATH, help="信号存储目录")
+    signals.add_argument("--days", type=int, default=1, help="交易日数")
+    signals.add_argument("--top", type=int, default=20, help="每日最多打印的行数，0表示全部")
+    signals.add_argument("--all", action="store_true", help="同时打印信号为0的股票")
+
+    bench = commands.add_parser("bench", help="统计各模块的导入耗时")
+    bench.add_argument("--modules", nargs="+", default=None, help="需要测量的模块")
+
+    args = parser.parse_args(argv)
+    use_plot_backend(args.plots)
+
+    if args.command == "run":
+        from main_app.main_pipeline import run_pipeline
+        from main_app.utils.logger import setup_logging
+        setup_logging(args.log_level)
+        run_pipeline(args.targets, args.force, max_workers=args.workers, profile=args.profile,
+                     profile_mode=args.profile_mode)
+    elif args.command == "metrics":
+        from main_app.utils.profiler import compare_runs, load_metrics
+        comparison = compare_runs(load_metrics(), args.run, args.baseline)
+        print(comparison.to_string() if len(comparison) else f"没有运行记录：{cfg.METRICS_FILE}")
+    elif args.command == "signals":
+        show_signals(args.store, args.days, args.top, not args.all)
+    elif args.command == "bench":
+        from scripts.import_benchmark import run_benchmark
+        run_benchmark(args.modules)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,607 @@
 # 模块间数据接口与通信
+"""
+模块间数据接口
+
+为其他模块提供统一的数据访问函数（如get_clean_data()），隐藏底层文件路径细节。
+
+底层使用列式行情存储（MarketDataStore）：
+- 按股票代码、年份分区：<root>/<stock_code>/<year>/<column>.npy
+- 开高低收（OHLC）统一存为float32，成交量存为int64，日期存为int32（距1970-01-01的天数）
+- 每列一个.npy文件，读取时用内存映射（mmap）打开，只拷贝需要的列、股票与日期区间
+这样因子计算、模型训练只用到三四列时，不必再把2GB的standard_data.parquet整个读进内存。
+
+各模块拿到的是同一种紧凑内存布局（compact_frame）：
+- 价格、因子等浮点列为float32，成交量为整数类型
+- stock_code为categorical（类别表即股票代码查找表）
+- date为int32交易日序号（在交易日历中的位置），日历保存在df.attrs["calendar"]，用expand_dates()还原
+
+策略组 → 回测组的信号使用二进制信号存储（SignalStore），signal.csv只作为给人看的导出格式：
+- 每个字段一个定长二进制文件：date(int32天数)、stock_id(int32)、signal(int8)、confidence(float32)
+- 按交易日只追加写入，stock_id对应的股票代码表也只追加，已有ID不会变化
+- 读取时内存映射，按日期二分截取，回测直接得到 日期 × 股票 的int8信号矩阵，不解析文本
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from main_app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 开高低收量列，价格存为float32，成交量存为整数
+OHLCV_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+# AKShare导出CSV的中文列名 → 项目统一英文列名
+CSV_COLUMN_MAP = {
+    "日期": "date",
+    "股票代码": "stock_code",
+    "开盘": "open",
+    "最高": "high",
+    "最低": "low",
+    "收盘": "close",
+    "成交量": "volume",
+    "成交额": "amount",
+}
+
+# 紧凑布局中保持整数类型的成交量列
+INTEGER_COLUMNS = ["volume"]
+
+# 不参与数值类型压缩的列
+KEY_COLUMNS = ["date", "stock_code"]
+
+# 二进制信号存储的字段与类型（每个字段一个.bin文件）
+SIGNAL_FIELDS = {"date": np.int32, "stock_id": np.int32, "signal": np.int8, "confidence": np.float32}
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def _to_day_number(dates):
+    """日期 → int32天数（距1970-01-01）"""
+    days = pd.to_datetime(dates).to_numpy().astype("datetime64[D]")
+    return (days - _EPOCH).astype(np.int32)
+
+
+def _from_day_number(days):
+    """int32天数 → datetime64"""
+    return pd.to_datetime(_EPOCH + np.asarray(days).astype("timedelta64[D]"))
+
+
+def _nullable_dtype(dtype):
+    """能存放缺失值的类型：整数、布尔列提升为float64，浮点列保持不变"""
+    return dtype if dtype.kind == "f" else np.dtype(np.float64)
+
+
+class MarketDataStore:
+    def __init__(self, root=cfg.MARKET_STORE_PATH):
+        """
+        初始化列式行情存储
+        :param root: 存储根目录，不存在时在第一次写入时创建
+        """
+        self.root = root
+        self.meta_path = os.path.join(root, "meta.json")
+        self.meta = self._load_meta()
+
+    def _load_meta(self):
+        """读取元数据：列名、列类型、每只股票拥有的年份分区"""
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"columns": {}, "partitions": {}, "calendar": []}
+
+    def _save_meta(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    @property
+    def columns(self):
+        """存储中可用的数据列（不含date、stock_code）"""
+        return list(self.meta["columns"])
+
+    @property
+    def stocks(self):
+        """存储中的全部股票代码"""
+        return sorted(self.meta["partitions"])
+
+    @property
+    def calendar(self):
+        """存储中出现过的全部交易日（DatetimeIndex），交易日序号即在其中的位置"""
+        if "calendar" not in self.meta:
+            # 旧版存储没有记录日历，扫描各分区的日期文件补建
+            days = [np.load(os.path.join(self._partition_dir(code, year), "date.npy"))
+                    for code, years in self.meta["partitions"].items() for year in years]
+            self.meta["calendar"] = np.unique(np.concatenate(days)).tolist() if days else []
+        return pd.DatetimeIndex(_from_day_number(self.meta["calendar"]))
+
+    def _partition_dir(self, stock_code, year):
+        return os.path.join(self.root, stock_code, str(year))
+
+    def _load_column(self, part_dir, col, length):
+        """读取分区中的一列；分区写入时还没有该列的，返回同长度的缺失值数组"""
+        path = os.path.join(part_dir, f"{col}.npy")
+        if os.path.exists(path):
+            return np.load(path, mmap_mode="r")
+        return np.full(length, np.nan, dtype=_nullable_dtype(np.dtype(self.meta["columns"][col])))
+
+    def write(self, df, date_col="date", code_col="stock_code"):
+        """
+        按股票、年份分区写入数据，与已存在的分区按日期合并：
+        同一日期以本次写入的列值为准，本次未提供的列保留原值；分区中没有值的列存为缺失值
+        :param df: 长表格式行情数据，每行一个(日期, 股票)
+        :param date_col: 日期列名
+        :param code_col: 股票代码列名
+        """
+        if df.empty:
+            return
+        value_cols = [c for c in df.columns if c not in (date_col, code_col)]
+        days = _to_day_number(df[date_col])
+        years = pd.DatetimeIndex(df[date_col]).year.to_numpy()
+        codes = df[code_col].astype(str).to_numpy()
+
+        # 1. 确定每列的存储类型：价格用float32，成交量用int64（含缺失值时用float64），其余数值列保持原类型
+        #    已登记的列与本次类型不一致时取两者的公共类型
+        for col in value_cols:
+            if col in INTEGER_COLUMNS:
+                dtype = np.dtype(np.float64 if df[col].isna().any() else np.int64)
+            elif col in OHLCV_COLUMNS:
+                dtype = np.dtype(np.float32)
+            else:
+                dtype = df[col].to_numpy().dtype
+                if dtype == np.float64:
+                    dtype = np.dtype(np.float32)
+                if dtype.kind not in "biuf":
+                    raise TypeError(f"列 {col} 不是数值类型，无法写入列式存储")
+            if col in self.meta["columns"]:
+                dtype = np.result_type(np.dtype(self.meta["columns"][col]), dtype)
+            self.meta["columns"][col] = dtype.str
+
+        # 2. 按(股票, 年份)排序后分组，每个分区与已有数据按日期合并，每列写一个.npy文件
+        order = np.lexsort((days, years, codes))
+        codes, years, days = codes[order], years[order], days[order]
+        values = {col: df[col].to_numpy()[order] for col in value_cols}
+        keys = np.char.add(codes.astype(str), years.astype(str))
+        bounds = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True])
+
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            stock_code, year = codes[start], int(years[start])
+            part_dir = self._partition_dir(stock_code, year)
+            new_days = days[start:end]
+            merged = {col: values[col][start:end] for col in value_cols}
+
+            if os.path.exists(os.path.join(part_dir, "date.npy")):
+                # 2.1 合并：日期取并集，先放入旧值，再用本次写入的列覆盖对应日期
+                old_days = np.load(os.path.join(part_dir, "date.npy"))
+                all_days = np.union1d(old_days, new_days)
+                old_pos = np.searchsorted(all_days, old_days)
+                new_pos = np.searchsorted(all_days, new_days)
+                for col in self.meta["columns"]:
+                    dtype = np.dtype(self.meta["columns"][col])
+                    old_values = self._load_column(part_dir, col, len(old_days))
+                    dtype = np.result_type(dtype, old_values.dtype)
+                    covered = np.zeros(len(all_days), dtype=bool)
+                    covered[old_pos] = True
+                    if col in merged:
+                        covered[new_pos] = True
+                    if not covered.all():
+                        dtype = _nullable_dtype(dtype)
+                    column = np.full(len(all_days), np.nan if dtype.kind == "f" else 0, dtype=dtype)
+                    column[old_pos] = old_values
+                    if col in merged:
+                        column[new_pos] = merged[col]
+                    merged[col] = column
+                new_days = all_days
+            os.makedirs(part_dir, exist_ok=True)
+
+            np.save(os.path.join(part_dir, "date.npy"), new_days)
+            for col in self.meta["columns"]:
+                dtype = np.dtype(self.meta["columns"][col])
+                if col not in merged:
+                    # 本次写入没有该列：整列存为缺失值
+                    column = np.full(len(new_days), np.nan, dtype=_nullable_dtype(dtype))
+                else:
+                    column = np.asarray(merged[col])
+                    if dtype.kind in "iub" and np.isnan(column.astype(np.float64)).any():
+                        dtype = _nullable_dtype(dtype)
+                    column = column.astype(dtype)
+                if column.dtype != np.dtype(self.meta["columns"][col]):
+                    # 整数列出现缺失值时，整列登记为浮点类型（旧分区读取时自动提升）
+                    self.meta["columns"][col] = np.result_type(
+                        np.dtype(self.meta["columns"][col]), column.dtype).str
+                np.save(os.path.join(part_dir, f"{col}.npy"), column)
+            part_years = set(self.meta["partitions"].get(stock_code, []))
+            part_years.add(year)
+            self.meta["partitions"][stock_code] = sorted(part_years)
+
+        self.meta["calendar"] = np.union1d(_to_day_number(self.calendar), days).tolist()
+        self._save_meta()
+
+    def is_stale(self, parquet_path=cfg.STANDARD_DATA_FILE):
+        """
+        判断存储是否早于parquet：流水线重新清洗后standard_data.parquet会更新，而列式存储不会自动重建
+        :param parquet_path: 清洗后的parquet文件
+        :return: parquet存在且修改时间晚于存储元数据时为True
+        """
+        return os.path.exists(parquet_path) and os.path.exists(self.meta_path) and \
+            os.path.getmtime(parquet_path) > os.path.getmtime(self.meta_path)
+
+    def read(self, columns=None, stocks=None, start_date=None, end_date=None):
+        """
+        按需读取数据：只打开所需的股票、年份分区和列，分区内按日期二分截取
+        :param columns: 需要的数据列，None表示全部列
+        :param stocks: 股票代码列表，None表示全部股票
+        :param start_date: 开始日期（含），None表示不限
+        :param end_date: 结束日期（含），None表示不限
+        :return: 长表DataFrame，包含date、stock_code及请求的列，按股票、日期排序
+        """
+        columns = self.columns if columns is None else list(columns)
+        missing = [c for c in columns if c not in self.meta["columns"]]
+        if missing:
+            raise KeyError(f"存储中不存在列：{missing}")
+        stocks = self.stocks if stocks is None else [str(s) for s in stocks]
+
+        start_day = _to_day_number([start_date])[0] if start_date is not None else None
+        end_day = _to_day_number([end_date])[0] if end_date is not None else None
+        start_year = pd.Timestamp(start_date).year if start_date is not None else None
+        end_year = pd.Timestamp(end_date).year if end_date is not None else None
+
+        date_parts, code_parts = [], []
+        value_parts = {col: [] for col in columns}
+        for stock_code in stocks:
+            for year in self.meta["partitions"].get(stock_code, []):
+                # 年份分区裁剪
+                if (start_year is not None and year < start_year) or \
+                        (end_year is not None and year > end_year):
+                    continue
+                part_dir = self._partition_dir(stock_code, year)
+                part_days = np.load(os.path.join(part_dir, "date.npy"), mmap_mode="r")
+                lo = 0 if start_day is None else np.searchsorted(part_days, start_day, side="left")
+                hi = len(part_days) if end_day is None else np.searchsorted(part_days, end_day, side="right")
+                if hi <= lo:
+                    continue
+                date_parts.append(np.array(part_days[lo:hi]))
+                code_parts.append(np.full(hi - lo, stock_code))
+                for col in columns:
+                    col_data = self._load_column(part_dir, col, len(part_days))
+                    value_parts[col].append(np.array(col_data[lo:hi]))
+
+        if not date_parts:
+            empty = {"date": pd.to_datetime([]), "stock_code": pd.Series([], dtype=str)}
+            empty.update({col: np.array([], dtype=np.dtype(self.meta["columns"][col])) for col in columns})
+            return pd.DataFrame(empty)
+
+        data = {
+            "date": _from_day_number(np.concatenate(date_parts)),
+            "stock_code": np.concatenate(code_parts),
+        }
+        for col in columns:
+            data[col] = np.concatenate(value_parts[col]).astype(np.dtype(self.meta["columns"][col]), copy=False)
+        return pd.DataFrame(data)
+
+
+class SignalStore:
+    def __init__(self, root=cfg.SIGNAL_STORE_PATH):
+        """
+        初始化二进制信号存储（一个目录对应一个策略的信号）
+        :param root: 存储目录，不存在时在第一次写入时创建
+        """
+        self.root = root
+        self.meta_path = os.path.join(root, "meta.json")
+        self.meta = self._load_meta()
+        self._code_index = {code: i for i, code in enumerate(self.meta["stock_codes"])}
+
+    def _load_meta(self):
+        """读取元数据：已提交的行数、最后一个交易日、股票代码表（下标即stock_id）"""
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"rows": 0, "last_day": None, "stock_codes": []}
+
+    def _field_path(self, field):
+        return os.path.join(self.root, f"{field}.bin")
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    @property
+    def stock_codes(self):
+        """股票代码表（Index），stock_id即在其中的位置"""
+        return pd.Index(self.meta["stock_codes"], dtype=object)
+
+    def clear(self):
+        """删除全部信号"""
+        if os.path.exists(self.root):
+            shutil.rmtree(self.root)
+        self.meta = self._load_meta()
+        self._code_index = {}
+
+    def append(self, signals, date_col="date", code_col="stock_code", confidence_col="confidence"):
+        """
+        追加一个或多个交易日的信号，日期必须晚于存储中最后一个交易日
+        :param signals: 信号长表（date, stock_code, signal[, confidence]），confidence缺失时记为NaN
+        :param confidence_col: 置信度列名（strategy_engine输出的proba列也可以直接传入）
+        :return: 追加的行数
+        """
+        if signals.empty:
+            return 0
+        days = _to_day_number(signals[date_col])
+        if self.meta["last_day"] is not None and days.min() <= self.meta["last_day"]:
+            raise ValueError(f"只能追加晚于{_from_day_number([self.meta['last_day']])[0].date()}的信号，"
+                             "重写历史信号请使用write()")
+
+        # 1. 股票代码 → stock_id，新出现的代码追加到代码表末尾
+        unique_codes, inverse = np.unique(np.asarray(signals[code_col]).astype(str), return_inverse=True)
+        for code in unique_codes.tolist():
+            if code not in self._code_index:
+                self._code_index[code] = len(self.meta["stock_codes"])
+                self.meta["stock_codes"].append(code)
+        stock_ids = np.array([self._code_index[c] for c in unique_codes.tolist()], dtype=np.int32)[inverse]
+
+        # 2. 按(日期, stock_id)排序，同一交易日的信号在文件中连续
+        order = np.lexsort((stock_ids, days))
+        columns = {
+            "date": days[order],
+            "stock_id": stock_ids[order],
+            "signal": np.asarray(signals["signal"])[order],
+            "confidence": (np.asarray(signals[confidence_col])[order] if confidence_col in signals.columns
+                           else np.full(len(order), np.nan)),
+        }
+
+        # 3. 先截掉上次中断时写了一半的数据，再追加；元数据最后写入，记录的行数即已提交的数据
+        os.makedirs(self.root, exist_ok=True)
+        for field, dtype in SIGNAL_FIELDS.items():
+            with open(self._field_path(field), "ab") as f:
+                f.truncate(self.meta["rows"] * np.dtype(dtype).itemsize)
+                np.ascontiguousarray(columns[field], dtype=dtype).tofile(f)
+        self.meta["rows"] += len(order)
+        self.meta["last_day"] = int(days.max())
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+        return len(order)
+
+    def write(self, signals, **kwargs):
+        """覆盖写入全部历史信号（参数同append）"""
+        self.clear()
+        return self.append(signals, **kwargs)
+
+    def arrays(self, start_date=None, end_date=None):
+        """
+        按日期区间取出各字段的内存映射数组（不拷贝数据）
+        :param start_date: 开始日期（含），None表示不限
+        :param end_date: 结束日期（含），None表示不限
+        :return: {字段名: 只读数组}，字段见SIGNAL_FIELDS
+        """
+        n_rows = self.meta["rows"]
+        if n_rows == 0:
+            return {field: np.empty(0, dtype=dtype) for field, dtype in SIGNAL_FIELDS.items()}
+        fields = {field: np.memmap(self._field_path(field), dtype=dtype, mode="r", shape=(n_rows,))
+                  for field, dtype in SIGNAL_FIELDS.items()}
+        # 日期列有序，二分定位区间
+        lo = 0 if start_date is None else np.searchsorted(fields["date"], _to_day_number([start_date])[0], "left")
+        hi = n_rows if end_date is None else np.searchsorted(fields["date"], _to_day_number([end_date])[0], "right")
+        return {field: values[lo:hi] for field, values in fields.items()}
+
+    def read(self, start_date=None, end_date=None):
+        """
+        读取信号长表
+        :return: DataFrame（date, stock_code, signal, confidence）
+        """
+        arrays = self.arrays(start_date, end_date)
+        return pd.DataFrame({
+            "date": _from_day_number(arrays["date"]),
+            "stock_code": self.stock_codes[arrays["stock_id"]],
+            "signal": np.asarray(arrays["signal"]),
+            "confidence": np.asarray(arrays["confidence"]),
+        })
+
+    def latest(self, n_days=1):
+        """
+        最近n_days个交易日的信号（只用numpy读取，供命令行快速查看）
+        :return: (日期字符串数组, 股票代码列表, signal数组, confidence数组)，按日期、stock_id排序
+        """
+        n_rows = self.meta["rows"]
+        if n_rows == 0:
+            return np.empty(0, dtype="<U10"), [], np.empty(0, dtype=np.int8), np.empty(0, dtype=np.float32)
+        # 日期有序：从最后一个交易日起向前二分，找到第n_days个交易日的起点
+        days = np.memmap(self._field_path("date"), dtype=SIGNAL_FIELDS["date"], mode="r", shape=(n_rows,))
+        first_day = self.meta["last_day"]
+        for _ in range(n_days - 1):
+            lo = np.searchsorted(days, first_day, "left")
+            if lo == 0:
+                break
+            first_day = int(days[lo - 1])
+        arrays = self.arrays(_EPOCH + first_day, None)
+        dates = (_EPOCH + arrays["date"].astype("timedelta64[D]")).astype(str)
+        codes = [self.meta["stock_codes"][i] for i in arrays["stock_id"]]
+        return dates, codes, np.asarray(arrays["signal"]), np.asarray(arrays["confidence"])
+
+    def matrix(self, start_date=None, end_date=None, field="signal"):
+        """
+        信号宽表（日期 × 股票代码），回测引擎直接使用；没有信号的位置为0（confidence为NaN）
+        :param field: "signal"（int8）或 "confidence"（float32）
+        :return: DataFrame，索引为交易日，列为股票代码表中的全部股票
+        """
+        arrays = self.arrays(start_date, end_date)
+        days = arrays["date"]
+        # 日期有序：相邻不同处即新交易日的开始
+        new_day = np.r_[True, days[1:] != days[:-1]] if len(days) else np.empty(0, dtype=bool)
+        day_pos, starts = np.cumsum(new_day) - 1, np.flatnonzero(new_day)
+        dtype = SIGNAL_FIELDS[field]
+        fill = 0 if field == "signal" else np.nan
+        values = np.full((len(starts), len(self.meta["stock_codes"])), fill, dtype=dtype)
+        values[day_pos, arrays["stock_id"]] = arrays[field]
+        return pd.DataFrame(values, index=_from_day_number(np.asarray(days)[starts]).rename("date"),
+                            columns=self.stock_codes.rename("stock_code"))
+
+    def export_csv(self, path=cfg.SIGNAL_FILE, start_date=None, end_date=None):
+        """
+        导出为signal.csv（date, stock_code, signal, confidence），供人查看或给只认CSV的脚本使用
+        :return: 导出路径
+        """
+        df = self.read(start_date, end_date)
+        df["date"] = df["date"].dt.strftime("%Y-%m-%d")
+        df.to_csv(path, index=False)
+        return path
+
+    @classmethod
+    def from_csv(cls, csv_path=cfg.SIGNAL_FILE, root=cfg.SIGNAL_STORE_PATH):
+        """
+        把已有的signal.csv导入二进制存储（覆盖写入）
+        :return: SignalStore对象
+        """
+        df = pd.read_csv(csv_path, dtype={"stock_code": str}, parse_dates=["date"])
+        confidence_col = "confidence" if "confidence" in df.columns else "proba"
+        store = cls(root)
+        store.write(df, confidence_col=confidence_col)
+        return store
+
+
+def compact_dtypes(df, key_columns=KEY_COLUMNS):
+    """
+    把数值列压缩为紧凑类型（不改变date、stock_code）：
+    浮点列 → float32；成交量 → 能容纳最大值的最小整数类型（含缺失值时保持float32）
+    :param df: 长表DataFrame
+    :return: 新的DataFrame
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col in key_columns or not pd.api.types.is_numeric_dtype(df[col]) or df[col].dtype == bool:
+            continue
+        if col in INTEGER_COLUMNS and not df[col].isna().any():
+            values = df[col].to_numpy()
+            max_value = np.abs(values).max() if len(values) else 0
+            df[col] = values.astype(np.int32 if max_value <= np.iinfo(np.int32).max else np.int64)
+        elif df[col].dtype.kind == "f" or col in INTEGER_COLUMNS:
+            df[col] = df[col].astype(np.float32)
+    return df
+
+
+def compact_frame(df, calendar=None, date_col="date", code_col="stock_code"):
+    """
+    转换为各模块共用的紧凑内存布局
+    :param df: 长表DataFrame（date为日期类型）
+    :param calendar: 交易日历（DatetimeIndex），None表示用数据自身出现过的日期
+    :return: 紧凑DataFrame：date为int32交易日序号，stock_code为categorical，数值列为float32/整数，
+             按股票、日期排序；交易日历保存在df.attrs["calendar"]
+    """
+    # 1. 日期 → 交易日序号
+    dates = pd.DatetimeIndex(pd.to_datetime(df[date_col]))
+    calendar = pd.DatetimeIndex(dates.unique().sort_values() if calendar is None else calendar)
+    day_index = calendar.get_indexer(dates)
+    if (day_index < 0).any():
+        raise ValueError(f"存在不在交易日历中的日期：{dates[day_index < 0][:5].tolist()}")
+
+    # 2. 股票代码 → categorical，数值列压缩
+    out = compact_dtypes(df, key_columns=[date_col, code_col])
+    out[date_col] = day_index.astype(np.int32)
+    out[code_col] = pd.Categorical(out[code_col].astype(str))
+    out = out.sort_values([code_col, date_col], kind="stable").reset_index(drop=True)
+    # attrs中存为元组：pandas合并DataFrame时会比较attrs，数组类型无法直接比较
+    out.attrs["calendar"] = tuple(calendar.to_numpy())
+    return out
+
+
+def expand_dates(days, calendar):
+    """
+    交易日序号 → 日期
+    :param days: 交易日序号（数组或Series）
+    :param calendar: 交易日历，通常取自df.attrs["calendar"]
+    :return: DatetimeIndex
+    """
+    return pd.DatetimeIndex(calendar)[np.asarray(days)]
+
+
+def build_store_from_parquet(parquet_path=cfg.STANDARD_DATA_FILE, store_root=cfg.MARKET_STORE_PATH,
+                             chunk_stocks=50, rebuild=False):
+    """
+    把standard_data.parquet转换成列式存储，按股票分批读取，内存占用与单批数据量成正比
+    :param parquet_path: 源parquet文件
+    :param store_root: 列式存储根目录
+    :param chunk_stocks: 每批读取的股票数量
+    :param rebuild: 是否先清空已有存储（parquet中已删除的行不会残留）
+    :return: MarketDataStore对象
+    """
+    if rebuild and os.path.exists(store_root):
+        shutil.rmtree(store_root)
+    store = MarketDataStore(store_root)
+    store.meta["source"] = os.path.abspath(parquet_path)
+    codes = pd.read_parquet(parquet_path, columns=["stock_code"])["stock_code"].astype(str).unique()
+    for i in range(0, len(codes), chunk_stocks):
+        batch = list(codes[i:i + chunk_stocks])
+        df = pd.read_parquet(parquet_path, filters=[("stock_code", "in", batch)])
+        df["date"] = pd.to_datetime(df["date"])
+        store.write(df)
+    return store
+
+
+def import_csv_files(csv_paths, store_root=cfg.MARKET_STORE_PATH, encoding="utf-8-sig"):
+    """
+    把逐只股票的清洗后CSV（如data/cleaned_data/000001_clean.csv）导入列式存储
+    文件名前6位视为股票代码；中文列名按CSV_COLUMN_MAP转换为英文列名
+    :param csv_paths: CSV文件路径列表
+    :param store_root: 列式存储根目录
+    :param encoding: CSV编码，AKShare导出文件默认utf-8-sig
+    :return: MarketDataStore对象
+    """
+    store = MarketDataStore(store_root)
+    for path in csv_paths:
+        df = pd.read_csv(path, encoding=encoding).rename(columns=CSV_COLUMN_MAP)
+        if "stock_code" not in df.columns:
+            df["stock_code"] = os.path.basename(path)[:6]
+        df["stock_code"] = df["stock_code"].astype(str).str.zfill(6)
+        df["date"] = pd.to_datetime(df["date"])
+        keep = ["date", "stock_code"] + [c for c in df.columns
+                                         if c not in ("date", "stock_code") and pd.api.types.is_numeric_dtype(df[c])]
+        store.write(df[keep])
+    return store
+
+
+def get_clean_data(columns=None, stocks=None, start_date=None, end_date=None,
+                   store_root=cfg.MARKET_STORE_PATH, parquet_path=cfg.STANDARD_DATA_FILE, compact=True):
+    """
+    获取清洗后的行情数据（其他模块统一从这里取数）
+    优先读取列式存储；尚未建立存储时退回读取parquet，并同样只读取所需列与股票。
+    存储早于parquet（流水线重新清洗过）时：由该parquet生成的存储自动重建，其他来源的存储改为读取parquet
+    :param columns: 需要的数据列（不含date、stock_code），None表示全部
+    :param stocks: 股票代码列表，None表示全部
+    :param start_date: 开始日期（含）
+    :param end_date: 结束日期（含）
+    :param compact: 是否返回紧凑布局（见compact_frame），False时date为日期类型、stock_code为字符串
+    :return: 长表DataFrame（date, stock_code, 请求的列）
+    """
+    if os.path.exists(os.path.join(store_root, "meta.json")):
+        store = MarketDataStore(store_root)
+        if store.is_stale(parquet_path):
+            if store.meta.get("source") == os.path.abspath(parquet_path):
+                logger.info(f"列式存储早于 {parquet_path}，重新生成")
+                store = build_store_from_parquet(parquet_path, store_root, rebuild=True)
+            else:
+                logger.warning(f"列式存储早于 {parquet_path}，本次改为读取parquet")
+                store = None
+        if store is not None:
+            df = store.read(columns, stocks, start_date, end_date)
+            return compact_frame(df, store.calendar) if compact else df
+
+    read_cols = None if columns is None else ["date", "stock_code"] + list(columns)
+    filters = []
+    if stocks is not None:
+        filters.append(("stock_code", "in", [str(s) for s in stocks]))
+    if start_date is not None:
+        filters.append(("date", ">=", pd.Timestamp(start_date)))
+    if end_date is not None:
+        filters.append(("date", "<=", pd.Timestamp(end_date)))
+    df = pd.read_parquet(parquet_path, columns=read_cols, filters=filters or None)
+    df["date"] = pd.to_datetime(df["date"])
+    if compact:
+        # 没有列式存储时，交易日历取parquet中全部出现过的日期，保证不同查询的序号一致
+        calendar = pd.read_parquet(parquet_path, columns=["date"])["date"].unique()
+        return compact_frame(df, pd.DatetimeIndex(pd.to_datetime(calendar)).sort_values())
+    df["stock_code"] = df["stock_code"].astype(str)
+    return df.sort_values(["stock_code", "date"]).reset_index(drop=True)
@@ -1 +1,394 @@
 # 图形界面逻辑控制
+"""
+图形界面逻辑控制：前端面板与后台计算之间的桥梁
+
+Streamlit每次控件交互都会从头重跑页面脚本，因此这里的对象都放在进程级单例（get_controller）中，
+页面重跑时不会丢失：
+- JobQueue：后台任务队列（线程池），提交后立即返回任务ID，页面通过poll()轮询进度，不阻塞请求线程；
+  已结束的任务只保留最近max_finished个，过早的任务记录连同结果一起释放
+- 结果缓存：回测结果以参数集合的哈希为键（LRU），同一组参数再次提交时直接返回缓存结果；
+  相同参数的任务正在运行时复用该任务，不重复提交。结果只保存在缓存中（任务对象不再另外持有），
+  内存占用由cache_size决定
+- 取消：任务在每次report()时检查取消请求；回测按股票分块执行，每块之间都可以中止
+- 面板缓存：价格矩阵、信号置信度矩阵按文件（路径、修改时间、大小）缓存在内存中，
+  文件不变时页面重跑、参数变化都不再读盘
+- 增量计算：拖动阈值滑块只需由缓存的置信度矩阵重新生成信号矩阵并跑一次面板回测（数组运算）
+"""
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import project_config as cfg
+
+# 任务状态
+PENDING, RUNNING, DONE, FAILED, CANCELLED = "pending", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# 回测任务每块的股票数：各股票账户相互独立，分块回测结果与一次回测相同，块之间检查取消请求
+BACKTEST_CHUNK_STOCKS = 500
+
+
+def params_key(params):
+    """参数集合 → 稳定的哈希键（键的顺序不影响结果）"""
+    return hashlib.md5(json.dumps(params, sort_keys=True, default=str, ensure_ascii=False).encode()).hexdigest()
+
+
+class Job:
+    def __init__(self, job_id, name, key):
+        """
+        一个后台任务的状态
+        :param job_id: 任务ID
+        :param name: 任务类型名（如"backtest"）
+        :param key: 参数哈希，用于结果缓存
+        """
+        self.job_id = job_id
+        self.name = name
+        self.key = key
+        self.status = PENDING
+        self.progress = 0.0  # 0~1
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+
+    def report(self, progress, message=""):
+        """
+        任务函数中调用，更新进度；用户请求取消时抛出异常中止任务
+        :param progress: 0~1
+        :param message: 当前步骤说明
+        """
+        if self.cancel_requested:
+            raise InterruptedError("任务已取消")
+        self.progress = float(progress)
+        self.message = message
+
+    def snapshot(self):
+        """供前端展示的状态字典"""
+        end = self.finished or time.time()
+        return {"job_id": self.job_id, "name": self.name, "status": self.status, "progress": self.progress,
+                "message": self.message, "error": self.error,
+                "elapsed": round(end - self.started, 2) if self.started else 0.0}
+
+
+class JobQueue:
+    def __init__(self, max_workers=2, cache_size=64, max_finished=256):
+        """
+        后台任务队列
+        :param max_workers: 同时执行的任务数
+        :param cache_size: 结果缓存的最大条目数（LRU）
+        :param max_finished: 保留的已结束任务数，更早的任务从jobs中删除
+        """
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-job")
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.jobs = OrderedDict()  # 任务ID → Job
+        self._running = {}  # 参数哈希 → 未结束的任务ID
+        self.cache_size = cache_size
+        self.max_finished = max_finished
+        self._results = OrderedDict()  # 参数哈希 → 结果
+
+    def cached(self, key):
+        """按参数哈希取缓存结果，不存在时返回None"""
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        return None
+
+    def _store(self, key, result):
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+
+    def _prune(self):
+        """删除最早结束的任务，只保留max_finished个已结束任务（调用方持有锁）"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def submit(self, name, func, params, cache=True):
+        """
+        提交任务：结果已缓存时直接返回一个已完成的任务；相同参数的任务未结束时返回该任务
+        :param name: 任务类型名
+        :param func: 任务函数 func(params, job) -> 结果，job.report()汇报进度
+        :param params: 参数字典（需可JSON序列化），与name一起决定缓存键
+        :param cache: 是否缓存结果（结果依赖外部文件状态的任务传False，只做运行中去重）
+        :return: 任务ID
+        """
+        key = params_key({"job": name, "params": params})
+        with self._lock:
+            # 已请求取消、尚未中止的同参数任务不复用，重新提交一个
+            if key in self._running and not self.jobs[self._running[key]].cancel_requested:
+                return self._running[key]
+            job = Job(next(self._ids), name, key)
+            self.jobs[job.job_id] = job
+            if cache and key in self._results:
+                self._results.move_to_end(key)
+                job.status, job.progress, job.message = DONE, 1.0, "缓存结果"
+                job.started = job.finished = time.time()
+                self._prune()
+                return job.job_id
+            self._running[key] = job.job_id
+        job.future = self._pool.submit(self._execute, job, func, params, cache)
+        return job.job_id
+
+    def _execute(self, job, func, params, cache):
+        job.status, job.started = RUNNING, time.time()
+        try:
+            job.report(0.0, "开始")
+            result = func(params, job)
+            if cache:
+                self._store(job.key, result)  # 结果只由缓存持有，随LRU淘汰释放
+            else:
+                job.result = result
+            job.status, job.progress, job.message = DONE, 1.0, "完成"
+        except InterruptedError:
+            job.status = CANCELLED
+        except Exception as e:
+            job.status, job.error = FAILED, f"{type(e).__name__}: {e}"
+            job.message = traceback.format_exc(limit=3)
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                if self._running.get(job.key) == job.job_id:
+                    del self._running[job.key]
+                self._prune()
+
+    def poll(self, job_id):
+        """任务状态（见Job.snapshot）；任务记录已被清理时抛出KeyError"""
+        return self.jobs[job_id].snapshot()
+
+    def result(self, job_id, timeout=None):
+        """
+        取任务结果；timeout为None时不等待，任务未完成或结果已被LRU淘汰时返回None
+        """
+        job = self.jobs[job_id]
+        if job.status not in FINISHED and timeout is not None and job.future is not None:
+            try:
+                job.future.result(timeout)
+            except Exception:
+                pass
+        if job.status != DONE:
+            return None
+        return job.result if job.result is not None else self.cached(job.key)
+
+    def cancel(self, job_id):
+        """请求取消：排队中的任务直接取消，运行中的任务在下一次report()时中止"""
+        job = self.jobs[job_id]
+        job.cancel_requested = True
+        if job.future is not None and job.future.cancel():
+            job.status, job.finished = CANCELLED, time.time()
+            with self._lock:
+                if self._running.get(job.key) == job.job_id:
+                    del self._running[job.key]
+                self._prune()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class PanelCache:
+    def __init__(self, max_items=8):
+        """
+        已加载面板的内存缓存，键为(加载函数名, 参数, 各文件的路径/修改时间/大小)，文件变化后自动重新加载
+        :param max_items: 最多缓存的面板数
+        """
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _file_state(path):
+        if not os.path.exists(path):
+            return (path, None)
+        if os.path.isdir(path):
+            meta = os.path.join(path, "meta.json")
+            stat = os.stat(meta) if os.path.exists(meta) else os.stat(path)
+        else:
+            stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, name, loader, paths, **kwargs):
+        """
+        取面板：缓存有效时直接返回，否则调用loader(**kwargs)加载
+        :param name: 面板名
+        :param loader: 加载函数
+        :param paths: 面板依赖的文件路径（用于判断缓存是否过期）
+        """
+        key = (name, json.dumps(kwargs, sort_keys=True, default=str), tuple(self._file_state(p) for p in paths))
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        value = loader(**kwargs)
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# ---------------------- 面板加载与回测任务 ----------------------
+def _load_price_matrix(price_path, price_col):
+    import pandas as pd
+
+    price_df = pd.read_parquet(price_path, columns=["date", "stock_code", price_col])
+    price_df["date"] = pd.to_datetime(price_df["date"])
+    price_df["stock_code"] = price_df["stock_code"].astype(str)
+    return price_df.pivot(index="date", columns="stock_code", values=price_col)
+
+
+def _load_confidence_matrix(store_path):
+    from main_app.data_interface import SignalStore
+    return SignalStore(store_path).matrix(field="confidence")
+
+
+class GuiController:
+    def __init__(self, max_workers=2, cache_size=64, store_path=cfg.SIGNAL_STORE_PATH,
+                 price_path=cfg.STANDARD_DATA_FILE):
+        """
+        初始化界面控制器（通常通过get_controller()取得进程级单例）
+        :param max_workers: 后台同时执行的任务数
+        :param cache_size: 结果缓存条目数
+        :param store_path: 二进制信号存储目录
+        :param price_path: 标准化行情文件
+        """
+        self.store_path = store_path
+        self.price_path = price_path
+        self.jobs = JobQueue(max_workers, cache_size)
+        self.panels = PanelCache()
+
+    # 1. 面板
+    def price_matrix(self, price_col="close"):
+        """价格宽表（日期 × 股票），文件不变时直接取缓存"""
+        return self.panels.get("price", _load_price_matrix, [self.price_path],
+                               price_path=self.price_path, price_col=price_col)
+
+    def confidence_matrix(self):
+        """模型置信度宽表（日期 × 股票），来自信号存储"""
+        return self.panels.get("confidence", _load_confidence_matrix, [self.store_path], store_path=self.store_path)
+
+    def signal_matrix(self, buy_threshold=0.5, sell_threshold=None, price_col="close"):
+        """
+        由缓存的置信度矩阵按阈值生成信号矩阵（与InferenceEngine的规则一致），并对齐到价格矩阵
+        阈值变化时只做一次数组比较，不重新推理、不读盘
+        """
+        import numpy as np
+        import pandas as pd
+
+        sell_threshold = buy_threshold if sell_threshold is None else sell_threshold
+        prices = self.price_matrix(price_col)
+        confidence = self.confidence_matrix().reindex(index=prices.index, columns=prices.columns)
+        values = confidence.to_numpy()
+        with np.errstate(invalid="ignore"):
+            signal = np.where(values >= buy_threshold, 1, np.where(values < sell_threshold, -1, 0))
+        return pd.DataFrame(signal.astype(np.int8), index=prices.index, columns=prices.columns)
+
+    # 2. 任务
+    def submit_backtest(self, params):
+        """
+        提交回测任务
+        :param params: {buy_threshold, sell_threshold, initial_capital, price_col, start_date, end_date, stocks}
+        :return: 任务ID（参数已缓存时为已完成的任务）
+        """
+        return self.jobs.submit("backtest", self._backtest_job, self._versioned(params))
+
+    def _versioned(self, params):
+        """参数 + 数据文件状态：信号或行情文件更新后，旧参数的缓存结果不再命中"""
+        data = [PanelCache._file_state(self.store_path), PanelCache._file_state(self.price_path)]
+        return dict(params, _data=data)
+
+    def _backtest_job(self, params, job):
+        import pandas as pd
+
+        from backtest_module.backtest_engine import PanelBacktestEngine
+
+        price_col = params.get("price_col", "close")
+        job.report(0.1, "加载面板")
+        prices = self.price_matrix(price_col)
+        job.report(0.3, "生成信号")
+        signals = self.signal_matrix(params.get("buy_threshold", 0.5), params.get("sell_threshold"), price_col)
+        start, end = params.get("start_date"), params.get("end_date")
+        if start or end:
+            prices, signals = prices.loc[start:end], signals.loc[start:end]
+        if params.get("stocks"):
+            stocks = [str(s) for s in params["stocks"]]
+            prices, signals = prices[stocks], signals[stocks]
+
+        # 按股票分块回测（各账户独立，结果与整体回测相同），每块之后汇报进度、检查取消
+        navs, performances, trades = [], [], []
+        n_stocks = prices.shape[1]
+        for start in range(0, n_stocks, BACKTEST_CHUNK_STOCKS):
+            job.report(0.5 + 0.4 * start / max(n_stocks, 1), f"回测 {start}/{n_stocks}")
+            cols = prices.columns[start:start + BACKTEST_CHUNK_STOCKS]
+            engine = PanelBacktestEngine(params.get("initial_capital", cfg.INITIAL_CAPITAL)).run(
+                signals[cols], prices[cols])
+            navs.append(engine.nav)
+            performances.append(engine.calculate_performance())
+            trades.append(engine.trades)
+        job.report(0.9, "汇总绩效")
+        nav = pd.concat(navs, axis=1)
+        return {"portfolio_nav": nav.mean(axis=1).rename("portfolio_nav"),
+                "performance": pd.concat(performances),
+                "trades": pd.concat(trades, ignore_index=True).sort_values("date", kind="stable", ignore_index=True)}
+
+    def submit_pipeline(self, targets=None, force=()):
+        """在后台运行主流程（main_pipeline），完成后清空面板缓存以读取新产物"""
+        return self.jobs.submit("pipeline", self._pipeline_job,
+                                {"targets": list(targets or []), "force": list(force)}, cache=False)
+
+    def _pipeline_job(self, params, job):
+        from main_app.main_pipeline import build_default_pipeline
+
+        pipeline = build_default_pipeline()
+        job.report(0.0, f"共{len(pipeline.cache_keys(params['targets'] or None))}个阶段")
+        report = pipeline.run(params["targets"] or None, params["force"])
+        self.panels.clear()
+        return report
+
+    def poll(self, job_id):
+        """任务进度（status、progress、message、error、elapsed）"""
+        return self.jobs.poll(job_id)
+
+    def result(self, job_id, timeout=None):
+        """任务结果，未完成时返回None"""
+        return self.jobs.result(job_id, timeout)
+
+    def cached_backtest(self, params):
+        """参数集合对应的缓存回测结果，没有时返回None（前端可先展示缓存结果）"""
+        return self.jobs.cached(params_key({"job": "backtest", "params": self._versioned(params)}))
+
+    def cancel(self, job_id):
+        self.jobs.cancel(job_id)
+
+
+_CONTROLLER = None
+_CONTROLLER_LOCK = threading.Lock()
+
+
+def get_controller(**kwargs):
+    """
+    进程级单例：Streamlit页面重跑时模块不会重新导入，控制器及其缓存、后台任务都保留
+    :param kwargs: 第一次创建时传给GuiController的参数
+    """
+    global _CONTROLLER
+    with _CONTROLLER_LOCK:
+        if _CONTROLLER is None:
+            _CONTROLLER = GuiController(**kwargs)
+    return _CONTROLLER
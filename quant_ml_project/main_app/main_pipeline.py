@@ -1 +1,542 @@
 # 主流程串联与调度
+"""
+主流程串联与调度：阶段级DAG + 按内容寻址的中间产物缓存
+
+- 每个阶段（Stage）声明：依赖的上游阶段、参与缓存键的配置、输出文件、代码版本所在的模块
+- 缓存键 = hash(阶段名, 配置, 代码版本, 各上游阶段的(缓存键, 输出内容摘要))。上游的键又包含了它自己的上游，
+  因此键链式地覆盖了整条上游链路：只修改回测参数时，取数、清洗、训练的键都不变，直接命中缓存；
+  上游重新运行（例如--force fetch重新取数）且输出内容变化时，下游的键随之变化，不会沿用旧数据算出的产物
+- 阶段成功后，输出文件复制到 缓存目录/阶段名/缓存键/ 并写入manifest.json；
+  命中缓存时若输出文件已被覆盖（例如切换回旧参数），从缓存目录恢复，不重新计算
+- 互不依赖的阶段由线程池并发执行（各阶段内部的重计算已经使用进程池或释放GIL的数组运算）
+- 每次运行用MetricsRecorder记录各阶段及其子步骤的耗时、CPU时间、内存峰值、行数，
+  追加到METRICS_FILE并与上一次运行对比；--profile可对指定阶段开启cProfile或采样剖析
+
+用法示例：
+    python -m main_app.main_pipeline                  # 运行全部阶段，有效缓存的阶段跳过
+    python -m main_app.main_pipeline --targets train  # 只运行train及其上游
+    python -m main_app.main_pipeline --force backtest # 强制重跑backtest
+    python -m main_app.main_pipeline --force train --profile train --profile-mode sample
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import math
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config import project_config as cfg
+from config.strategy_params import load_strategy_params
+from main_app.utils.logger import get_logger, setup_logging
+from main_app.utils.profiler import MetricsRecorder, compare_runs, load_metrics, set_recorder
+
+logger = get_logger(__name__)
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _content_digest(path):
+    """输出文件的内容摘要；目录按其中全部文件的相对路径与内容计算"""
+    if not os.path.isdir(path):
+        return _file_digest(path)
+    digest = hashlib.sha256()
+    for folder, _, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            file_path = os.path.join(folder, name)
+            digest.update(f"{os.path.relpath(file_path, path)}:{_file_digest(file_path)}".encode())
+    return digest.hexdigest()
+
+
+def _fingerprint(path):
+    """输出文件的快速指纹（大小 + 修改时间），用于判断文件是否在阶段运行之后被改动；目录按其中全部文件计算"""
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+    digest = hashlib.sha256()
+    for folder, _, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            file_path = os.path.join(folder, name)
+            stat = os.stat(file_path)
+            digest.update(f"{os.path.relpath(file_path, path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def _output_rows(paths):
+    """输出文件中parquet文件的总行数（只读文件元数据），没有parquet输出时返回None"""
+    files = [path for path in paths if str(path).endswith(".parquet") and os.path.isfile(path)]
+    if not files:
+        return None
+    import pyarrow.parquet as pq
+    return sum(pq.ParquetFile(path).metadata.num_rows for path in files)
+
+
+def _copy_output(src, dst):
+    """复制输出文件或目录（保留修改时间，复制后指纹不变）"""
+    if os.path.isdir(src):
+        shutil.rmtree(dst, ignore_errors=True)
+        shutil.copytree(src, dst)
+    else:
+        shutil.copy2(src, dst)
+
+
+class Stage:
+    def __init__(self, name, func, deps=(), config=None, outputs=(), modules=None):
+        """
+        流水线中的一个阶段
+        :param name: 阶段名
+        :param func: 阶段函数，以config为关键字参数调用：func(**config)
+        :param deps: 依赖的上游阶段名
+        :param config: 参与缓存键的配置字典（需可JSON序列化），None表示无配置
+        :param outputs: 阶段写出的文件或目录路径，缓存命中时据此判断/恢复产物
+        :param modules: 代码版本涉及的模块名，默认只有func所在的模块
+        """
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.config = dict(config or {})
+        self.outputs = tuple(outputs)
+        self.modules = tuple(modules or (func.__module__,))
+
+    def code_version(self):
+        """代码版本：func源码与所涉及模块源文件的哈希"""
+        digest = hashlib.sha256()
+        try:
+            digest.update(inspect.getsource(self.func).encode())
+        except (OSError, TypeError):
+            digest.update(self.func.__qualname__.encode())
+        for name in sorted(self.modules):
+            module = sys.modules.get(name) or __import__(name, fromlist=["_"])
+            path = getattr(module, "__file__", None)
+            if path and os.path.exists(path):
+                digest.update(_file_digest(path).encode())
+        return digest.hexdigest()
+
+
+class Pipeline:
+    def __init__(self, cache_root=cfg.PIPELINE_CACHE_PATH, max_workers=4, store_artifacts=True):
+        """
+        初始化流水线
+        :param cache_root: 缓存目录
+        :param max_workers: 并发执行的阶段数上限
+        :param store_artifacts: 是否把输出文件复制进缓存目录（切换参数后可直接恢复旧产物）
+        """
+        self.cache_root = cache_root
+        self.max_workers = max_workers
+        self.store_artifacts = store_artifacts
+        self.stages = {}
+        self.report = {}  # 阶段名 → {"status": cached/restored/ran/failed/skipped, "key", "elapsed"}
+        self._digests = {}  # 本次运行中已完成阶段的输出内容摘要
+        self.recorder = None  # 最近一次运行的MetricsRecorder
+
+    def add_stage(self, name, func, deps=(), config=None, outputs=(), modules=None):
+        """注册一个阶段，参数见Stage"""
+        if name in self.stages:
+            raise ValueError(f"阶段已存在：{name}")
+        self.stages[name] = Stage(name, func, deps, config, outputs, modules)
+        return self.stages[name]
+
+    def stage(self, name, deps=(), config=None, outputs=(), modules=None):
+        """注册阶段的装饰器"""
+        def decorator(func):
+            self.add_stage(name, func, deps, config, outputs, modules)
+            return func
+        return decorator
+
+    # ---------------------- 1. 拓扑与缓存键 ----------------------
+    def _order(self, targets=None):
+        """
+        目标阶段及其全部上游的拓扑序
+        :param targets: 目标阶段名列表，None表示全部阶段
+        """
+        order, state = [], {}
+
+        def visit(name):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"阶段依赖存在环：{name}")
+            if name not in self.stages:
+                raise KeyError(f"未注册的阶段：{name}，可选 {sorted(self.stages)}")
+            state[name] = "visiting"
+            for dep in self.stages[name].deps:
+                visit(dep)
+            state[name] = "done"
+            order.append(name)
+
+        for name in (targets or list(self.stages)):
+            visit(name)
+        return order
+
+    def stage_key(self, name, dep_states):
+        """
+        一个阶段的缓存键
+        :param dep_states: {上游阶段名: (上游缓存键, 上游输出内容摘要)}
+        :return: 缓存键
+        """
+        stage = self.stages[name]
+        payload = json.dumps({
+            "name": name,
+            "config": stage.config,
+            "code": stage.code_version(),
+            "deps": {dep: list(dep_states[dep]) for dep in stage.deps},
+        }, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+    def _current_digest(self, stage, key):
+        """
+        阶段当前输出文件的内容摘要：文件与manifest记录的指纹一致时直接取记录的摘要，否则读取文件计算
+        :return: 摘要；有输出文件不存在时为None
+        """
+        recorded = {}
+        manifest_path = os.path.join(self._entry_dir(stage.name, key), "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                recorded = json.load(f)["outputs"]
+        digests = []
+        for path in stage.outputs:
+            if not os.path.exists(path):
+                return None
+            info = recorded.get(path, {})
+            if info.get("digest") and _fingerprint(path) == info["fingerprint"]:
+                digests.append(info["digest"])
+            else:
+                digests.append(_content_digest(path))
+        return hashlib.sha256(json.dumps(digests).encode()).hexdigest()
+
+    def cache_keys(self, targets=None):
+        """
+        各阶段的缓存键（按拓扑序链式计算，不运行任何阶段；上游的输出内容摘要取自当前的输出文件）
+        :return: {阶段名: 缓存键}，上游输出文件缺失、无法确定键的阶段为None
+        """
+        keys, digests = {}, {}
+        for name in self._order(targets):
+            stage = self.stages[name]
+            if any(keys[dep] is None or digests[dep] is None for dep in stage.deps):
+                keys[name] = digests[name] = None
+                continue
+            keys[name] = self.stage_key(name, {dep: (keys[dep], digests[dep]) for dep in stage.deps})
+            digests[name] = self._current_digest(stage, keys[name])
+        return keys
+
+    def _entry_dir(self, name, key):
+        return os.path.join(self.cache_root, name, key)
+
+    # ---------------------- 2. 缓存命中、恢复与写入 ----------------------
+    def _check_cache(self, stage, key):
+        """
+        判断阶段缓存是否有效
+        :return: "cached"（输出文件未变）、"restored"（从缓存目录恢复了输出）或None（需要运行）
+        """
+        manifest_path = os.path.join(self._entry_dir(stage.name, key), "manifest.json")
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if "digest" not in manifest:
+            return None  # 旧版缓存没有记录输出内容摘要，下游无法据此计算缓存键
+
+        # 1. 输出文件与记录的指纹一致：直接命中
+        outputs = manifest["outputs"]
+        changed = [path for path, info in outputs.items()
+                   if not os.path.exists(path) or _fingerprint(path) != info["fingerprint"]]
+        if not changed:
+            self._digests[stage.name] = manifest["digest"]
+            return "cached"
+
+        # 2. 输出已被覆盖或删除：从缓存目录恢复（复制，不用硬链接，避免后续写入改坏缓存）
+        for path in changed:
+            artifact = outputs[path].get("artifact")
+            if not artifact or not os.path.exists(artifact):
+                return None
+        for path in changed:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            _copy_output(outputs[path]["artifact"], path)
+            outputs[path]["fingerprint"] = _fingerprint(path)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        self._digests[stage.name] = manifest["digest"]
+        return "restored"
+
+    def _save_cache(self, stage, key, elapsed):
+        """阶段运行成功后记录输出文件（manifest最后写入，存在即表示缓存完整）"""
+        entry = self._entry_dir(stage.name, key)
+        os.makedirs(entry, exist_ok=True)
+        outputs = {}
+        for i, path in enumerate(stage.outputs):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"阶段{stage.name}没有写出声明的输出文件：{path}")
+            info = {"fingerprint": _fingerprint(path), "digest": _content_digest(path)}
+            if self.store_artifacts:
+                artifact = os.path.join(entry, f"{i}_{os.path.basename(path)}")
+                _copy_output(path, artifact)
+                info["artifact"] = artifact
+            outputs[path] = info
+        digest = hashlib.sha256(json.dumps([info["digest"] for info in outputs.values()]).encode()).hexdigest()
+        self._digests[stage.name] = digest
+        manifest = {"stage": stage.name, "key": key, "config": stage.config, "outputs": outputs, "digest": digest,
+                    "elapsed": round(elapsed, 3), "created": time.strftime("%Y-%m-%d %H:%M:%S")}
+        with open(os.path.join(entry, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+
+    # ---------------------- 3. 调度执行 ----------------------
+    def _run_stage(self, stage, key):
+        """运行一个阶段并记录指标（输入行数为上游阶段parquet输出的行数）"""
+        rows_in = _output_rows([path for dep in stage.deps for path in self.stages[dep].outputs])
+        start = time.perf_counter()
+        with self.recorder.step(stage.name, rows_in) as record:
+            stage.func(**stage.config)
+            record["rows_out"] = _output_rows(stage.outputs)
+        elapsed = time.perf_counter() - start
+        self._save_cache(stage, key, elapsed)
+        return {"elapsed": elapsed, "cpu_seconds": record.get("cpu_seconds"), "rows_out": record.get("rows_out")}
+
+    def run(self, targets=None, force=(), recorder=None):
+        """
+        运行目标阶段及其上游：缓存有效的阶段跳过，互不依赖的阶段并发执行
+        :param targets: 目标阶段名列表，None表示全部阶段
+        :param force: 强制重跑的阶段名；重跑后输出内容变化时下游的缓存键随之变化并重新运行，
+                      输出内容相同时下游仍可命中缓存
+        :param recorder: 记录各阶段指标的MetricsRecorder，None表示新建一个；运行期间设为当前记录器，
+                         阶段内部的埋点（step、instrument）记录为该阶段的子步骤
+        :return: 各阶段运行报告 {阶段名: {"status", "key", "elapsed"}}，运行过的阶段另有cpu_seconds、rows_out
+        """
+        order = self._order(targets)
+        force = set(force)
+        self.report, self._digests = {}, {}
+        self.recorder = recorder or MetricsRecorder()
+        previous = set_recorder(self.recorder)
+        try:
+            self._execute(order, force)
+        finally:
+            set_recorder(previous)
+        return self.report
+
+    def _execute(self, order, force):
+        """按依赖关系调度执行，结果写入self.report"""
+        # 上游全部完成后才能算出一个阶段的缓存键（需要上游的输出内容摘要）：
+        # 键算出后先判断缓存，命中的阶段视为已完成，否则提交到线程池；上游失败时下游标记为skipped
+        pending, keys, errors = list(order), {}, {}
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+            running = {}
+            while pending or running:
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for name in list(pending):
+                        deps = self.stages[name].deps
+                        if any(self.report.get(dep, {}).get("status") in ("failed", "skipped") for dep in deps):
+                            self.report[name] = {"status": "skipped", "key": None, "elapsed": 0.0}
+                        elif all(dep in self.report for dep in deps):
+                            keys[name] = self.stage_key(name, {dep: (keys[dep], self._digests[dep]) for dep in deps})
+                            status = None if name in force else self._check_cache(self.stages[name], keys[name])
+                            if status:
+                                self.report[name] = {"status": status, "key": keys[name], "elapsed": 0.0}
+                            else:
+                                running[pool.submit(self._run_stage, self.stages[name], keys[name])] = name
+                        else:
+                            continue
+                        pending.remove(name)
+                        progressed = True
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.report[name] = {"status": "ran", "key": keys[name], **future.result()}
+                    except Exception as e:
+                        errors[name] = e
+                        self.report[name] = {"status": "failed", "key": keys[name], "elapsed": 0.0,
+                                             "error": f"{type(e).__name__}: {e}"}
+
+        if errors:
+            name, error = next(iter(errors.items()))
+            raise RuntimeError(f"阶段{name}执行失败：{error}") from error
+        self.report = {name: self.report[name] for name in order}
+
+    def clear_cache(self, names=None):
+        """
+        删除缓存目录（不影响当前输出文件）
+        :param names: 阶段名列表，None表示全部
+        """
+        for name in (names or list(self.stages)):
+            shutil.rmtree(os.path.join(self.cache_root, name), ignore_errors=True)
+
+
+# ---------------------- 4. 默认流水线 ----------------------
+def _fetch_stage(stock_list, start_date, end_date, source):
+    from data_module.data_fetcher import fetch_data
+    fetch_data(stock_list, start_date, end_date, source, output_path=cfg.RAW_DATA_FILE)
+
+
+def _clean_stage(max_fill_days):
+    from data_module.data_cleaner import clean_data
+    clean_data(cfg.RAW_DATA_FILE, cfg.STANDARD_DATA_FILE, max_fill_days=max_fill_days)
+
+
+def _factor_stage(names, standardize=True):
+    from data_module.factor_miner import run_factor_mining
+    run_factor_mining(cfg.STANDARD_DATA_FILE, cfg.FACTOR_DATA_FILE, names, standardize=standardize)
+
+
+def _factor_eval_stage(horizons, n_quantiles):
+    from strategy_module.factor_optimizer import run_factor_evaluation
+    evaluation = run_factor_evaluation(cfg.FACTOR_DATA_FILE, horizons=tuple(horizons), n_quantiles=n_quantiles)
+    evaluation.summary.to_csv(cfg.FACTOR_REPORT_FILE, encoding="utf-8-sig")
+
+
+def _train_stage(future_days, threshold, **trainer_kwargs):
+    from strategy_module.model_trainer import run_walk_forward
+    run_walk_forward(cfg.FACTOR_DATA_FILE, future_days=future_days, threshold=threshold, **trainer_kwargs)
+
+
+def _signal_stage(buy_threshold, sell_threshold, feature_cols, risk):
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    from data_module.factor_miner import FACTOR_REGISTRY
+    from main_app.risk_manager import build_risk_manager
+    from strategy_module.strategy_engine import InferenceEngine, generate_signal
+
+    # 特征列与run_walk_forward的默认规则一致：已注册且存在于数据中的因子，按注册顺序
+    columns = set(pq.read_schema(cfg.FACTOR_DATA_FILE).names)
+    feature_cols = feature_cols or [name for name in FACTOR_REGISTRY if name in columns]
+    engine = InferenceEngine(feature_cols, buy_threshold=buy_threshold, sell_threshold=sell_threshold)
+    engine.add_model(cfg.MODEL_FILE)
+    features = pd.read_parquet(cfg.FACTOR_DATA_FILE, columns=["date", "stock_code"] + engine.feature_cols)
+    risk_manager, price_df = build_risk_manager(risk), None
+    if risk_manager is not None:
+        price_df = pd.read_parquet(cfg.STANDARD_DATA_FILE, columns=["date", "stock_code", "close"])
+    generate_signal(features, signal_path=cfg.SIGNAL_FILE, engine=engine, store_path=cfg.SIGNAL_STORE_PATH,
+                    risk_manager=risk_manager, price_df=price_df)
+
+
+def _backtest_stage(initial_capital, price_col):
+    from backtest_module.backtest_engine import PanelBacktestEngine, load_panel
+
+    signal_matrix, price_matrix = load_panel(cfg.SIGNAL_STORE_PATH, cfg.STANDARD_DATA_FILE, price_col)
+    engine = PanelBacktestEngine(initial_capital).run(signal_matrix, price_matrix)
+    engine.calculate_performance().to_csv(cfg.BACKTEST_RESULT_FILE, encoding="utf-8-sig")
+
+
+def _portfolio_stage(exec_col, risk, **engine_kwargs):
+    from backtest_module.portfolio_engine import run_portfolio_backtest
+    from main_app.risk_manager import build_risk_manager, load_sectors
+
+    risk_manager = build_risk_manager(risk, load_sectors(cfg.STANDARD_DATA_FILE)) if risk else None
+    run_portfolio_backtest(cfg.SIGNAL_STORE_PATH, cfg.STANDARD_DATA_FILE, exec_col, cfg.PORTFOLIO_RESULT_FILE,
+                           risk_manager=risk_manager, **engine_kwargs)
+
+
+def build_default_pipeline(params=None, cache_root=cfg.PIPELINE_CACHE_PATH, max_workers=4):
+    """
+    默认流水线：fetch → clean → factors →（factor_eval ∥ train → signal）→（backtest ∥ portfolio）
+    各阶段只把与自己有关的参数放进缓存键：修改strategy_params.yaml的backtest一节只会重跑backtest
+    :param params: 策略参数字典，None表示读取strategy_params.yaml
+    :return: Pipeline对象
+    """
+    params = load_strategy_params() if params is None else params
+    data, factor = params.get("data", {}) or {}, params.get("factor", {}) or {}
+    model, signal = params.get("model", {}) or {}, params.get("signal", {}) or {}
+    backtest, portfolio = params.get("backtest", {}) or {}, params.get("portfolio", {}) or {}
+    risk = params.get("risk")
+
+    pipeline = Pipeline(cache_root, max_workers)
+    pipeline.add_stage("fetch", _fetch_stage, config={
+        "stock_list": list(data.get("stock_list", cfg.STOCK_POOL)),
+        "start_date": data.get("start_date", cfg.START_DATE),
+        "end_date": data.get("end_date", cfg.END_DATE),
+        "source": data.get("source", "akshare"),
+    }, outputs=[cfg.RAW_DATA_FILE], modules=["data_module.data_fetcher"])
+    pipeline.add_stage("clean", _clean_stage, deps=["fetch"], config={
+        "max_fill_days": data.get("max_fill_days", 5),
+    }, outputs=[cfg.STANDARD_DATA_FILE], modules=["data_module.data_cleaner", "main_app.data_interface"])
+    pipeline.add_stage("factors", _factor_stage, deps=["clean"], config={
+        "names": factor.get("names"),
+        "standardize": factor.get("standardize", True),
+    }, outputs=[cfg.FACTOR_DATA_FILE], modules=["data_module.factor_miner"])
+    pipeline.add_stage("factor_eval", _factor_eval_stage, deps=["factors"], config={
+        "horizons": list(factor.get("horizons", [1, 5, 10, 20])),
+        "n_quantiles": factor.get("n_quantiles", 5),
+    }, outputs=[cfg.FACTOR_REPORT_FILE], modules=["strategy_module.factor_optimizer"])
+    pipeline.add_stage("train", _train_stage, deps=["factors"], config=dict({
+        "future_days": 5, "threshold": 3.0}, **model),
+        outputs=[cfg.MODEL_FILE], modules=["strategy_module.model_trainer", "strategy_module.label_generator"])
+    pipeline.add_stage("signal", _signal_stage, deps=["train"], config={
+        "buy_threshold": signal.get("buy_threshold", 0.5),
+        "sell_threshold": signal.get("sell_threshold"),
+        "feature_cols": model.get("feature_cols"),
+        "risk": risk,
+    }, outputs=[cfg.SIGNAL_STORE_PATH, cfg.SIGNAL_FILE], modules=["strategy_module.strategy_engine",
+                                                                  "main_app.risk_manager"])
+    pipeline.add_stage("backtest", _backtest_stage, deps=["signal", "clean"], config={
+        "initial_capital": backtest.get("initial_capital", 100000),
+        "price_col": backtest.get("price_col", "close"),
+    }, outputs=[cfg.BACKTEST_RESULT_FILE], modules=["backtest_module.backtest_engine", "main_app.data_interface"])
+    pipeline.add_stage("portfolio", _portfolio_stage, deps=["signal", "clean"], config=dict({
+        "exec_col": "open", "initial_capital": cfg.INITIAL_CAPITAL, "risk": risk}, **portfolio),
+        outputs=[cfg.PORTFOLIO_RESULT_FILE], modules=["backtest_module.portfolio_engine", "main_app.data_interface",
+                                                      "main_app.risk_manager"])
+    return pipeline
+
+
+def run_pipeline(targets=None, force=(), params=None, max_workers=4, profile=(), profile_mode="cprofile",
+                 trace_memory=False, metrics_path=cfg.METRICS_FILE):
+    """
+    运行默认流水线，记录各阶段指标，并在日志中输出各阶段状态与相对上一次运行的耗时变化
+    :param profile: 需要剖析的阶段或子步骤名，"all"表示全部阶段
+    :param profile_mode: "cprofile" 或 "sample"（采样剖析）
+    :param trace_memory: 是否用tracemalloc统计每个步骤自身的内存分配峰值
+    :param metrics_path: 指标文件，None表示不写入、不对比
+    :return: 各阶段运行报告
+    """
+    recorder = MetricsRecorder(profile=profile, profile_mode=profile_mode, trace_memory=trace_memory)
+    pipeline = build_default_pipeline(params, max_workers=max_workers)
+    try:
+        report = pipeline.run(targets, force, recorder)
+    finally:
+        if metrics_path:
+            recorder.write(metrics_path, targets=targets)
+    for name, info in report.items():
+        logger.info("%-12s %-9s %8.2fs  %s", name, info["status"], info["elapsed"], info["key"])
+
+    if metrics_path and recorder.records:
+        comparison = compare_runs(load_metrics(metrics_path), recorder.run_id)
+        for step, row in comparison.iterrows():
+            baseline, change = row["wall_seconds_baseline"], row["change"]
+            logger.info("%-40s 本次%8.3fs  CPU%8.3fs  上次%9s  变化%8s", step, row["wall_seconds"], row["cpu_seconds"],
+                        "-" if math.isnan(baseline) else f"{baseline:.3f}s", "-" if math.isnan(change) else f"{change:+.1%}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量化流水线：阶段级DAG + 中间产物缓存")
+    parser.add_argument("--targets", nargs="+", default=None, help="目标阶段（连同其上游）")
+    parser.add_argument("--force", nargs="+", default=(), help="强制重跑的阶段")
+    parser.add_argument("--workers", type=int, default=4, help="并发执行的阶段数")
+    parser.add_argument("--clear-cache", action="store_true", help="运行前清空缓存")
+    parser.add_argument("--profile", nargs="+", default=(), help="需要剖析的阶段或子步骤（all表示全部阶段）")
+    parser.add_argument("--profile-mode", default="cprofile", choices=["cprofile", "sample"], help="剖析方式")
+    parser.add_argument("--trace-memory", action="store_true", help="用tracemalloc统计每个步骤的内存分配峰值")
+    parser.add_argument("--log-level", default=None, help="日志级别（DEBUG/INFO/WARNING），默认取QUANT_LOG_LEVEL")
+    args = parser.parse_args()
+
+    setup_logging(args.log_level)
+    if args.clear_cache:
+        build_default_pipeline().clear_cache()
+    run_pipeline(args.targets, args.force, max_workers=args.workers, profile=args.profile,
+                 profile_mode=args.profile_mode, trace_memory=args.trace_memory)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,320 @@
 # 风控规则执行器
+"""
+风控规则执行器
+
+所有规则都写成对（日期 × 股票）矩阵或一整行股票的数组运算，不在逐笔成交上做Python回调，
+开启风控后面板回测仍是一次性的数组计算：
+- 个股止损 / 移动止损：持仓期间价格跌破 入场价 × (1 - stop_loss) 或 持仓以来最高价 × (1 - trailing_stop) 时平仓，
+  本段持仓剩余的时间保持空仓（原信号重新开仓后才再次买入）。
+  持仓段用"段编号"表示，段内的入场价、最高价、是否已触发都用累计运算（加段偏移的maximum.accumulate）一次算出
+- 指数回撤熔断：市场指数（默认用全市场等权指数代替）相对近lookback日最高点的回撤 ≥ index_drawdown 时熔断：
+  面板回测（每只股票独立账户）暂停新开仓；组合回测把总仓位上限降到breaker_exposure
+- 波动率目标：按目标组合在近vol_lookback日的历史波动率缩放总仓位，使年化波动率不超过target_vol
+- 行业集中度：单个行业的权重之和不超过sector_cap，超出的行业等比例缩减（缩减部分留作现金）
+
+参数来自strategy_params.yaml的risk一节，值为null的规则不启用。
+"""
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from config.strategy_params import load_strategy_params
+
+# 各规则的默认参数（None表示不启用）
+DEFAULT_RISK_PARAMS = {
+    "stop_loss": 0.05,  # 个股止损：相对入场价的最大亏损
+    "trailing_stop": None,  # 移动止损：相对持仓以来最高价的最大回落
+    "index_drawdown": 0.08,  # 熔断阈值：指数相对近期高点的回撤
+    "index_lookback": 20,  # 熔断回看的交易日数
+    "breaker_exposure": 0.3,  # 熔断期间的总仓位上限（组合回测）
+    "target_vol": None,  # 目标年化波动率
+    "vol_lookback": 60,  # 估计波动率的交易日数
+    "sector_cap": 0.2,  # 单个行业的权重上限
+}
+
+
+def market_index(price_matrix):
+    """
+    全市场等权指数（没有指数行情时代替沪深300）：每日各股收益率的均值累乘
+    :param price_matrix: 价格宽表（日期 × 股票）
+    :return: Series，首日为1
+    """
+    prices = price_matrix.ffill()
+    returns = (prices / prices.shift(1) - 1).mean(axis=1).fillna(0.0)
+    return (1 + returns).cumprod().rename("market_index")
+
+
+def _segment_ids(holding):
+    """持仓段编号：每列从1开始递增，不持仓的位置为0"""
+    start = holding.copy()
+    start[1:] &= ~holding[:-1]
+    return np.cumsum(start, axis=0) * holding
+
+
+def _segment_cummax(values, ids):
+    """
+    段内累计最大值（values需为有限值）：给每段加上随段编号递增的偏移量后做一次maximum.accumulate，
+    偏移量大于取值范围，后一段不会受前一段的影响
+    """
+    offset = (np.nanmax(values) - np.nanmin(values) + 1.0) * ids if values.size else 0.0
+    shifted = np.where(ids > 0, values + offset, -np.inf)
+    return np.maximum.accumulate(shifted, axis=0) - offset
+
+
+class RiskManager:
+    def __init__(self, stop_loss=None, trailing_stop=None, index_drawdown=None, index_lookback=20,
+                 breaker_exposure=0.0, target_vol=None, vol_lookback=60, sector_cap=None,
+                 sectors=None, annual_days=cfg.ANNUAL_TRADING_DAYS):
+        """
+        初始化风控规则（参数为None的规则不启用）
+        :param stop_loss: 个股止损比例（如0.05）
+        :param trailing_stop: 移动止损比例
+        :param index_drawdown: 指数熔断的回撤阈值
+        :param index_lookback: 熔断回看的交易日数
+        :param breaker_exposure: 熔断期间的总仓位上限
+        :param target_vol: 目标年化波动率
+        :param vol_lookback: 估计波动率的交易日数
+        :param sector_cap: 单个行业的权重上限
+        :param sectors: 股票代码 → 行业的Series（行业集中度规则需要）
+        """
+        self.stop_loss = stop_loss
+        self.trailing_stop = trailing_stop
+        self.index_drawdown = index_drawdown
+        self.index_lookback = index_lookback
+        self.breaker_exposure = breaker_exposure
+        self.target_vol = target_vol
+        self.vol_lookback = vol_lookback
+        self.sector_cap = sector_cap
+        self.sectors = sectors
+        self.annual_days = annual_days
+
+    @classmethod
+    def from_params(cls, params=None, sectors=None):
+        """
+        按strategy_params.yaml的risk一节创建
+        :param params: risk一节的字典，省略的项使用DEFAULT_RISK_PARAMS
+        """
+        return cls(**{**DEFAULT_RISK_PARAMS, **(params or {})}, sectors=sectors)
+
+    @property
+    def has_stops(self):
+        return bool(self.stop_loss or self.trailing_stop)
+
+    # ---------------------- 1. 个股止损 ----------------------
+    def stop_triggered(self, price, entry, peak):
+        """
+        止损条件（矩阵或单行数组均可）
+        :param price: 当前价格
+        :param entry: 入场价
+        :param peak: 持仓以来最高价
+        :return: bool数组
+        """
+        triggered = np.zeros(np.shape(price), dtype=bool)
+        with np.errstate(invalid="ignore"):
+            if self.stop_loss:
+                triggered |= price <= entry * (1 - self.stop_loss)
+            if self.trailing_stop:
+                triggered |= price <= peak * (1 - self.trailing_stop)
+        return triggered
+
+    def stop_exits(self, holding, prices):
+        """
+        对全部股票、全部日期一次性计算止损后的持仓
+        :param holding: 原持仓（bool矩阵，日期 × 股票）
+        :param prices: 价格矩阵（NaN表示停牌，停牌日不触发止损）
+        :return: (新持仓, 止损卖出点) 两个bool矩阵
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        has_price = ~np.isnan(prices)
+        filled = pd.DataFrame(prices).ffill().to_numpy()
+        holding = holding & ~np.isnan(filled)
+        ids = _segment_ids(holding)
+        if not self.has_stops or not ids.any():
+            return holding, np.zeros_like(holding)
+
+        # 1. 段内入场价（段首日价格）与持仓以来最高价
+        starts = ids > 0
+        starts[1:] &= ids[1:] != ids[:-1]
+        first_row = np.maximum.accumulate(np.where(starts, np.arange(len(ids))[:, None], 0), axis=0)
+        entry = np.take_along_axis(filled, first_row, axis=0)
+        peak = np.exp(np.where(holding, _segment_cummax(np.log(np.where(holding, filled, 1.0)), ids), 0.0))
+
+        # 2. 段内第一次触发之后（含当日）都不再持仓；只有当日有价格才能触发（能成交）
+        triggered = holding & has_price & self.stop_triggered(filled, entry, peak)
+        fired = (_segment_cummax(triggered.astype(np.float64), ids) > 0) & holding
+        exits = fired.copy()
+        exits[1:] &= ~(fired[:-1] & (ids[1:] == ids[:-1]))
+        return holding & ~fired, exits
+
+    # ---------------------- 2. 指数熔断 ----------------------
+    def circuit_breaker(self, index_close):
+        """
+        熔断标记：指数相对近index_lookback日最高点的回撤 ≥ index_drawdown
+        :param index_close: 指数收盘价序列
+        :return: bool数组
+        """
+        index_close = pd.Series(index_close).ffill()
+        if not self.index_drawdown:
+            return np.zeros(len(index_close), dtype=bool)
+        peak = index_close.rolling(self.index_lookback, min_periods=1).max()
+        return (index_close / peak - 1 <= -self.index_drawdown).to_numpy()
+
+    def _breaker_for(self, price_matrix, index_close):
+        if index_close is None:
+            index_close = market_index(price_matrix)
+        else:
+            index_close = pd.Series(index_close).reindex(price_matrix.index).ffill()
+        return self.circuit_breaker(index_close)
+
+    # ---------------------- 3. 信号（面板回测、实盘信号） ----------------------
+    def apply_signals(self, signal_matrix, price_matrix, index_close=None):
+        """
+        对信号矩阵施加风控：熔断期间不开新仓，触发止损的持仓当日卖出并在本段剩余时间保持空仓
+        持仓状态的定义与PanelBacktestEngine一致（最近一个非0信号为1即持仓，无价格的日期信号视为0）
+        :param signal_matrix: 信号宽表（日期 × 股票代码）
+        :param price_matrix: 价格宽表，索引、列与signal_matrix一致
+        :param index_close: 指数收盘价（以日期为索引），None表示用全市场等权指数
+        :return: 调整后的信号宽表（int8）
+        """
+        signals = signal_matrix.to_numpy(dtype=np.int8).copy()
+        prices = price_matrix.to_numpy(dtype=np.float64)
+
+        # 1. 熔断：熔断日的买入信号改为0（已持仓的继续持有）
+        if self.index_drawdown:
+            breaker = self._breaker_for(price_matrix, index_close)
+            signals[breaker] = np.where(signals[breaker] == 1, 0, signals[breaker])
+
+        # 2. 止损：卖出点改为-1，本段之后的信号改为0
+        if self.has_stops:
+            effective = np.where(np.isnan(prices), 0, signals)
+            rows = np.maximum.accumulate(np.where(effective != 0, np.arange(len(signals))[:, None], 0), axis=0)
+            holding = np.take_along_axis(effective, rows, axis=0) == 1
+            new_holding, exits = self.stop_exits(holding, prices)
+            signals[holding & ~new_holding] = 0
+            signals[exits] = -1
+        return pd.DataFrame(signals, index=signal_matrix.index, columns=signal_matrix.columns)
+
+    def adjust_signal_frame(self, signals, price_df, index_close=None, price_col="close"):
+        """
+        对信号长表施加风控（实盘生成信号时使用）
+        :param signals: 信号长表（date, stock_code, signal, ...）
+        :param price_df: 价格长表（date, stock_code, price_col），需覆盖信号的全部历史以确定入场价
+        :return: signal列已调整的信号长表（新DataFrame）
+        """
+        price_matrix = price_df.pivot(index="date", columns="stock_code", values=price_col)
+        signal_matrix = signals.pivot(index="date", columns="stock_code", values="signal")
+        signal_matrix = signal_matrix.reindex(index=price_matrix.index, columns=price_matrix.columns).fillna(0)
+        adjusted = self.apply_signals(signal_matrix, price_matrix, index_close).to_numpy()
+
+        row = price_matrix.index.get_indexer(pd.to_datetime(signals["date"]))
+        col = price_matrix.columns.get_indexer(signals["stock_code"].astype(str))
+        found = (row >= 0) & (col >= 0)
+        values = signals["signal"].to_numpy(dtype=np.int8).copy()
+        values[found] = adjusted[row[found], col[found]]
+        return signals.assign(signal=values)
+
+    # ---------------------- 4. 目标权重（组合回测） ----------------------
+    def sector_scale(self, weights, columns):
+        """
+        行业集中度：每行各行业权重之和超过sector_cap时，该行业的股票等比例缩减
+        :param weights: 权重矩阵（行 × 股票）
+        :param columns: 股票代码
+        :return: 与weights同形状的缩放系数
+        """
+        if not self.sector_cap or self.sectors is None:
+            return np.ones_like(weights)
+        labels, _ = pd.factorize(pd.Series(self.sectors).reindex(pd.Index(columns).astype(str)))
+        has_sector = labels >= 0
+        if not has_sector.any():
+            return np.ones_like(weights)
+        onehot = np.zeros((len(labels), labels.max() + 1))
+        onehot[np.flatnonzero(has_sector), labels[has_sector]] = 1.0
+        sums = np.nan_to_num(weights) @ onehot
+        with np.errstate(invalid="ignore", divide="ignore"):
+            factor = np.where(sums > self.sector_cap, self.sector_cap / sums, 1.0)
+        return np.where(has_sector, factor[:, np.maximum(labels, 0)], 1.0)
+
+    def vol_scale(self, weights, rows, prices):
+        """
+        波动率目标：用目标权重在近vol_lookback日的历史收益估计组合年化波动率，超过target_vol时按比例降低总仓位
+        :param weights: 权重矩阵（日期 × 股票）
+        :param rows: 需要计算的行（调仓决策日）
+        :param prices: 价格矩阵
+        :return: 每个行的缩放系数（≤1）
+        """
+        scale = np.ones(len(rows))
+        if not self.target_vol:
+            return scale
+        filled = pd.DataFrame(prices).ffill().to_numpy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns = np.nan_to_num(filled[1:] / filled[:-1] - 1, nan=0.0, posinf=0.0, neginf=0.0)
+        for i, t in enumerate(rows):
+            window = returns[max(t - self.vol_lookback, 0):t]
+            if len(window) < 2:
+                continue
+            vol = (window @ np.nan_to_num(weights[t])).std(ddof=1) * np.sqrt(self.annual_days)
+            if vol > self.target_vol:
+                scale[i] = self.target_vol / vol
+        return scale
+
+    def apply_weights(self, target, price_matrix, index_close=None):
+        """
+        对组合回测的目标权重施加行业集中度、波动率目标与指数熔断
+        熔断开始、结束的交易日即使不是调仓日也会产生一行目标（沿用最近的目标权重并按仓位上限缩放），
+        使仓位能在月中及时降低与恢复
+        :param target: 目标权重矩阵（日期 × 股票，非调仓日整行为NaN）
+        :param price_matrix: 价格宽表（与target对齐）
+        :param index_close: 指数收盘价，None表示用全市场等权指数
+        :return: 调整后的目标权重矩阵
+        """
+        weights = np.array(target, dtype=np.float64)
+        prices = price_matrix.to_numpy(dtype=np.float64)
+        rows = np.flatnonzero(~np.isnan(weights).all(axis=1))
+
+        # 1. 行业集中度与波动率目标（只在调仓日计算）
+        if len(rows):
+            weights[rows] *= self.sector_scale(weights[rows], price_matrix.columns)
+            weights[rows] *= self.vol_scale(weights, rows, prices)[:, None]
+
+        # 2. 熔断：开始/结束日补一行目标，熔断期间的目标总仓位不超过breaker_exposure
+        if self.index_drawdown and len(rows):
+            breaker = self._breaker_for(price_matrix, index_close)
+            changed = breaker != np.r_[False, breaker[:-1]]
+            latest = pd.DataFrame(weights).ffill().to_numpy()
+            extra = changed & np.isnan(weights).all(axis=1) & ~np.isnan(latest).all(axis=1)
+            weights[extra] = latest[extra]
+            capped = breaker & ~np.isnan(weights).all(axis=1)
+            total = np.nansum(weights[capped], axis=1, keepdims=True)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                weights[capped] *= np.where(total > self.breaker_exposure, self.breaker_exposure / total, 1.0)
+        return weights
+
+
+def build_risk_manager(params, sectors=None):
+    """
+    按risk一节的参数创建RiskManager
+    :param params: risk一节的字典；为空或enabled为false时返回None
+    :return: RiskManager或None
+    """
+    params = dict(params or {})
+    if not params or not params.pop("enabled", True):
+        return None
+    return RiskManager.from_params(params, sectors)
+
+
+def load_risk_manager(path=cfg.STRATEGY_PARAMS_FILE, sectors=None):
+    """读取strategy_params.yaml的risk一节创建RiskManager（未配置或未启用时返回None）"""
+    return build_risk_manager(load_strategy_params(path).get("risk"), sectors)
+
+
+def load_sectors(price_path=cfg.STANDARD_DATA_FILE, industry_col="industry"):
+    """
+    从标准化行情读取每只股票的行业（最新一条记录），数据没有行业列时返回None
+    :return: 股票代码 → 行业的Series
+    """
+    import pyarrow.parquet as pq
+
+    if industry_col not in pq.read_schema(price_path).names:
+        return None
+    df = pd.read_parquet(price_path, columns=["stock_code", industry_col])
+    return df.dropna().groupby(df["stock_code"].astype(str))[industry_col].last()
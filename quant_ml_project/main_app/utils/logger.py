@@ -1 +1,52 @@
 # 日志记录
+"""
+日志记录
+
+各模块统一用 get_logger(__name__) 取得日志器，挂在"quant"命名空间下，不再直接print：
+- 热循环中的逐笔信息用DEBUG级别，默认不输出，需要排查时把级别调到DEBUG即可看到
+- 级别默认取环境变量QUANT_LOG_LEVEL（未设置时为INFO）
+- setup_logging只在程序入口（命令行main、GUI）调用一次；作为库被导入时不添加任何handler，
+  由调用方决定日志去向
+"""
+import logging
+import os
+
+ROOT_LOGGER = "quant"
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def get_logger(name=None):
+    """
+    取得模块的日志器
+    :param name: 模块名（通常传__name__），None表示根日志器"quant"
+    :return: logging.Logger，名称为 quant.<模块名>
+    """
+    return logging.getLogger(ROOT_LOGGER if not name else f"{ROOT_LOGGER}.{name}")
+
+
+def setup_logging(level=None, log_file=None):
+    """
+    配置"quant"日志器的输出（重复调用时替换之前添加的handler）
+    :param level: 日志级别（名称或数值），None表示取环境变量QUANT_LOG_LEVEL，默认INFO
+    :param log_file: 同时写入的日志文件，None表示只输出到终端
+    :return: 根日志器
+    """
+    level = level or os.environ.get("QUANT_LOG_LEVEL", "INFO")
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    for handler in [h for h in logger.handlers if getattr(h, "_quant_handler", False)]:
+        logger.removeHandler(handler)
+        handler.close()
+
+    formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler._quant_handler = True
+        logger.addHandler(handler)
+    logger.propagate = False
+    return logger
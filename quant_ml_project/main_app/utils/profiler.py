@@ -0,0 +1,365 @@
+# 阶段耗时、CPU、内存与行数的埋点记录
+"""
+阶段与子步骤的埋点记录
+
+- step(name)上下文管理器 / @instrument装饰器：记录墙钟耗时、CPU时间、内存峰值、输入输出行数。
+  嵌套使用时子步骤的名称带上父步骤前缀（如 train/run_walk_forward/fit），各线程各自维护嵌套关系
+- 记录写入当前的MetricsRecorder；默认的记录器处于关闭状态，埋点只是一次函数调用，
+  由流水线等入口在运行期间通过set_recorder换上启用的记录器
+- 按步骤名开启性能剖析：cProfile（确定性，开销较大）或采样剖析（后台线程定时抓取调用栈，开销很小，
+  输出collapsed stack格式，可直接用flamegraph.pl / speedscope画火焰图）
+- 每次运行的记录追加到METRICS_FILE（JSON Lines，含run_id与git提交号），compare_runs按步骤与上一次运行对比，
+  夜间批处理变慢时可以直接定位到具体阶段、具体子步骤
+
+说明：CPU时间为整个进程的CPU时间（并发执行的阶段之间会互相计入）；进程池子进程内的耗时只体现在父步骤的墙钟时间中。
+内存峰值默认为进程RSS的历史最高值（resource模块只在Unix上可用，Windows上改用psutil，两者都没有时不记录）；trace_memory=True时用tracemalloc统计每个步骤自身的分配峰值（有额外开销）。
+"""
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from config import project_config as cfg
+from main_app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_MODES = ("cprofile", "sample")
+MB = 1024 * 1024
+
+
+def peak_rss_mb():
+    """
+    当前进程（及已结束的子进程）的内存峰值
+    :return: MB（保留1位小数），无法取得时返回None
+    """
+    try:
+        import resource
+    except ImportError:  # Windows没有resource模块
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / MB, 1)
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(usage / 1024 if sys.platform != "darwin" else usage / MB, 1)
+
+
+def git_commit():
+    """当前代码的git提交号（有未提交的修改时带-dirty后缀），不在git仓库中时返回None"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cfg.PROJECT_ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cfg.PROJECT_ROOT,
+                               capture_output=True, text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return f"{commit}-dirty" if commit and dirty else commit or None
+
+
+def profile_text(profiler, top=15):
+    """cProfile结果中累计耗时最高的top个函数（文本）"""
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(top)
+    return stream.getvalue()
+
+
+def count_rows(obj):
+    """对象的行数：DataFrame、Series、数组取第一维长度，元组取第一个元素的行数，其余返回None"""
+    if isinstance(obj, tuple) and obj:
+        obj = obj[0]
+    shape = getattr(obj, "shape", None)
+    return int(shape[0]) if shape else None
+
+
+# ---------------------- 1. 采样剖析 ----------------------
+class SamplingProfiler:
+    def __init__(self, interval=0.005, thread_id=None):
+        """
+        采样剖析器：后台线程每隔interval秒抓取一次目标线程的调用栈，接口与cProfile.Profile相同（enable/disable/dump_stats）
+        :param interval: 采样间隔（秒）
+        :param thread_id: 目标线程，None表示调用enable的线程
+        """
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks = Counter()  # "外层函数;...;内层函数" → 采样次数
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enable(self):
+        self.thread_id = self.thread_id or threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def dump_stats(self, path):
+        """写出collapsed stack格式：每行"调用栈 采样次数" """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def text(self, top=15):
+        """出现在调用栈中次数最多（含子调用）的top个函数及其占比（每次采样都出现的外层调用如线程入口不列出）"""
+        total = sum(self.stacks.values())
+        inclusive = Counter()
+        for stack, count in self.stacks.items():
+            for name in set(stack.split(";")):
+                inclusive[name] += count
+        inclusive = Counter({name: count for name, count in inclusive.items() if count < total})
+        lines = [f"采样{total}次，间隔{self.interval * 1000:g}ms"]
+        lines += [f"{count / total:7.1%}  {name}" for name, count in inclusive.most_common(top)] if total else []
+        return "\n".join(lines)
+
+
+# ---------------------- 2. 记录器 ----------------------
+class MetricsRecorder:
+    def __init__(self, enabled=True, run_id=None, profile=(), profile_mode="cprofile",
+                 profile_dir=cfg.PROFILE_OUTPUT_PATH, top=15, trace_memory=False):
+        """
+        步骤指标记录器
+        :param enabled: False时step()不做任何记录
+        :param run_id: 本次运行的ID，默认取当前时间
+        :param profile: 需要剖析的步骤名（完整路径如"train/fit"或最后一级名称），"all"表示全部顶层步骤
+        :param profile_mode: "cprofile" 或 "sample"
+        :param profile_dir: 剖析结果目录，每次运行一个子目录
+        :param top: 日志中打印的热点函数个数
+        :param trace_memory: 是否用tracemalloc统计每个步骤自身的内存分配峰值
+        """
+        if profile_mode not in PROFILE_MODES:
+            raise ValueError(f"profile_mode只能是{PROFILE_MODES}之一，收到：{profile_mode}")
+        self.enabled = enabled
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S")
+        self.profile = {profile} if isinstance(profile, str) else set(profile or ())
+        self.profile_mode = profile_mode
+        self.profile_dir = profile_dir
+        self.top = top
+        self.trace_memory = trace_memory
+        self.records = []  # 每个步骤一条，按结束时间排列
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _state(self):
+        """当前线程的步骤栈与剖析状态"""
+        if not hasattr(self._local, "stack"):
+            self._local.stack, self._local.profiling = [], False
+        return self._local
+
+    def _wants_profile(self, path, name, depth):
+        return bool(self.profile) and (path in self.profile or name in self.profile
+                                       or ("all" in self.profile and depth == 0))
+
+    @contextlib.contextmanager
+    def step(self, name, rows_in=None):
+        """
+        记录一个步骤：with recorder.step("fit", rows_in=len(X)) as record: ...; record["rows_out"] = n
+        :param name: 步骤名（不含父步骤前缀）
+        :param rows_in: 输入行数
+        :return: 上下文中可修改的记录字典（可填写rows_in、rows_out或其他自定义字段）
+        """
+        if not self.enabled:
+            yield {}
+            return
+
+        # 1. 入栈：完整路径带上父步骤前缀
+        state = self._state()
+        parent = state.stack[-1] if state.stack else None
+        path = f"{parent['step']}/{name}" if parent else name
+        record = {"step": path, "depth": len(state.stack), "rows_in": rows_in, "rows_out": None, "status": "ok"}
+        state.stack.append(record)
+        profiler = None
+        if not state.profiling and self._wants_profile(path, name, record["depth"]):
+            profiler = cProfile.Profile() if self.profile_mode == "cprofile" else SamplingProfiler()
+            state.profiling = True
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent["_peak"] = max(parent.get("_peak", 0), peak)
+            tracemalloc.reset_peak()
+            record["_base"], record["_peak"] = current, current
+
+        # 2. 计时并执行
+        started = time.time()
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        except BaseException:
+            record["status"] = "failed"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                state.profiling = False
+            record.update({"wall_seconds": round(time.perf_counter() - wall, 4),
+                           "cpu_seconds": round(time.process_time() - cpu, 4),
+                           "peak_rss_mb": peak_rss_mb(),
+                           "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started))})
+            if self.trace_memory:
+                peak = max(record.pop("_peak"), tracemalloc.get_traced_memory()[1])
+                record["traced_peak_mb"] = round((peak - record.pop("_base")) / MB, 1)
+                if parent is not None:
+                    parent["_peak"] = max(parent.get("_peak", 0), peak)
+            state.stack.pop()
+            with self._lock:
+                self.records.append(record)
+            logger.debug("%s: %.3fs 墙钟, %.3fs CPU, 输入%s行, 输出%s行", path, record["wall_seconds"],
+                         record["cpu_seconds"], record["rows_in"], record["rows_out"])
+            if profiler is not None:
+                self._dump_profile(profiler, path)
+
+    def _dump_profile(self, profiler, path):
+        folder = os.path.join(self.profile_dir, self.run_id)
+        os.makedirs(folder, exist_ok=True)
+        suffix = ".prof" if isinstance(profiler, cProfile.Profile) else ".collapsed.txt"
+        file_path = os.path.join(folder, path.replace("/", ".") + suffix)
+        profiler.dump_stats(file_path)
+        text = profile_text(profiler, self.top) if isinstance(profiler, cProfile.Profile) else profiler.text(self.top)
+        logger.info("%s 的剖析结果已写入 %s\n%s", path, file_path, text)
+
+    def to_frame(self):
+        """本次运行的记录（DataFrame，按开始顺序）"""
+        import pandas as pd
+        frame = pd.DataFrame(self.records)
+        return frame.sort_values("started", kind="stable", ignore_index=True) if len(frame) else frame
+
+    def write(self, path=cfg.METRICS_FILE, **extra):
+        """
+        把本次运行的记录追加到指标文件
+        :param extra: 附加到每条记录的字段（如目标阶段、数据规模）
+        """
+        if not self.records:
+            return path
+        run_info = {"run_id": self.run_id, "commit": git_commit(), **extra}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps({**run_info, **record}, ensure_ascii=False, default=str) + "\n")
+        return path
+
+
+_RECORDER = MetricsRecorder(enabled=False)
+
+
+def get_recorder():
+    """当前的记录器（默认为关闭状态）"""
+    return _RECORDER
+
+
+def set_recorder(recorder):
+    """
+    替换当前的记录器
+    :param recorder: MetricsRecorder，None表示恢复为关闭状态的记录器
+    :return: 之前的记录器，便于运行结束后恢复
+    """
+    global _RECORDER
+    previous, _RECORDER = _RECORDER, recorder or MetricsRecorder(enabled=False)
+    return previous
+
+
+def step(name, rows_in=None):
+    """在当前记录器上记录一个步骤（见MetricsRecorder.step）"""
+    return _RECORDER.step(name, rows_in)
+
+
+def instrument(name=None):
+    """
+    记录函数调用的装饰器：输入行数取第一个带shape的参数，输出行数取返回值（见count_rows）
+    :param name: 步骤名，默认为函数名
+    """
+    def decorator(func):
+        step_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _RECORDER
+            if not recorder.enabled:
+                return func(*args, **kwargs)
+            rows_in = next((count_rows(arg) for arg in (*args, *kwargs.values()) if count_rows(arg)), None)
+            with recorder.step(step_name, rows_in) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+# ---------------------- 3. 跨运行对比 ----------------------
+def load_metrics(path=cfg.METRICS_FILE):
+    """读取指标文件（DataFrame，每行一次运行中的一个步骤），跳过中断时写了一半的行"""
+    import pandas as pd
+
+    records = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return pd.DataFrame(records)
+
+
+def compare_runs(metrics, run_id=None, baseline=None, columns=("wall_seconds", "cpu_seconds", "rows_out")):
+    """
+    按步骤对比两次运行
+    :param metrics: load_metrics的返回值
+    :param run_id: 本次运行，默认为最后一次
+    :param baseline: 对比的运行，默认为run_id之前的最后一次
+    :return: 以步骤为索引的DataFrame：各指标的本次值与 指标_baseline，
+             以及change（墙钟耗时变化比例，正数表示变慢），按change降序排列
+    """
+    import numpy as np
+    import pandas as pd
+
+    if metrics.empty:
+        return pd.DataFrame()
+    runs = list(dict.fromkeys(metrics["run_id"]))
+    run_id = run_id or runs[-1]
+    if baseline is None:
+        earlier = runs[:runs.index(run_id)]
+        baseline = earlier[-1] if earlier else None
+    columns = [c for c in columns if c in metrics.columns]
+
+    # 同一次运行中重复出现的步骤（如循环中的子步骤）按总和计算
+    def per_step(run):
+        return metrics[metrics["run_id"] == run].groupby("step", sort=False)[columns].sum(min_count=1)
+
+    current = per_step(run_id)
+    if baseline is None:
+        previous = pd.DataFrame(np.nan, index=current.index, columns=columns)
+    else:
+        previous = per_step(baseline)
+    result = current.join(previous.add_suffix("_baseline"), how="left")
+    result["change"] = result["wall_seconds"] / result["wall_seconds_baseline"] - 1
+    return result.sort_values("change", ascending=False, na_position="last")
@@ -1 +1,306 @@
 # 批量回测脚本
+"""
+批量回测脚本
+
+- 行情/因子面板只加载一次，写成内存映射文件（SharedPanel）：每个字段一个.npy，
+  形状为 股票 × 日期 的float32数组，按股票连续存放，按股票池取数时只触及对应的页
+- 回测任务为 (strategy, params, universe) 三元组，由进程池执行；
+  子进程启动时挂载同一份面板（内存映射，操作系统共享页缓存），不复制数据
+- 每个任务完成后立即把指标追加写入结果文件（JSON Lines），中断后重新运行会跳过已完成的任务
+- 指标定义与performance_analyzer.batch_performance一致（max_drawdown为非正数）；每行记录metrics_version，
+  指标定义变化后旧版本的结果视为未完成，重新运行时重算；读取时跳过的旧版本行数记入警告日志
+
+用法示例：
+    python -m scripts.batch_backtest --build-panel --fields close return_20d
+    python -m scripts.batch_backtest --jobs jobs.jsonl --workers 8
+jobs.jsonl每行一个任务，如 {"strategy": "ma_cross", "params": {"short": 5, "long": 20}, "universe": null}
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from main_app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 结果指标的定义版本：2起max_drawdown统一为非正数
+METRICS_VERSION = 2
+
+
+# ---------------------- 1. 共享面板 ----------------------
+def build_shared_panel(df, fields, root=cfg.PANEL_CACHE_PATH, date_col="date", code_col="stock_code"):
+    """
+    把长表转换为内存映射面板：每个字段一个 股票 × 日期 的float32数组
+    :param df: 长表（date, stock_code, 字段...）
+    :param fields: 需要写入面板的字段（价格列、因子列）
+    :param root: 面板目录
+    :return: SharedPanel对象
+    """
+    os.makedirs(root, exist_ok=True)
+    meta_path = os.path.join(root, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    dates = np.sort(pd.to_datetime(df[date_col]).unique())
+    codes = np.sort(df[code_col].astype(str).unique())
+    day_idx = np.searchsorted(dates, pd.to_datetime(df[date_col]).to_numpy())
+    stock_idx = np.searchsorted(codes, df[code_col].astype(str).to_numpy())
+    for field in fields:
+        values = np.full((len(codes), len(dates)), np.nan, dtype=np.float32)
+        values[stock_idx, day_idx] = df[field].to_numpy(dtype=np.float32)
+        np.save(os.path.join(root, f"{field}.npy"), values)
+    np.save(os.path.join(root, "date.npy"), dates.astype("datetime64[D]"))
+
+    # 元数据最后写入，存在即表示面板完整
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"fields": list(fields), "stock_codes": codes.tolist()}, f, ensure_ascii=False)
+    return SharedPanel(root)
+
+
+class SharedPanel:
+    def __init__(self, root=cfg.PANEL_CACHE_PATH):
+        """
+        挂载内存映射面板（只读），多个进程挂载同一目录时共享物理内存
+        :param root: build_shared_panel写入的目录
+        """
+        with open(os.path.join(root, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.root = root
+        self.fields = meta["fields"]
+        self.stock_codes = pd.Index(meta["stock_codes"])
+        self.dates = pd.DatetimeIndex(np.load(os.path.join(root, "date.npy")))
+        self._arrays = {}
+
+    def array(self, field):
+        """字段的内存映射数组（股票 × 日期）"""
+        if field not in self._arrays:
+            if field not in self.fields:
+                raise KeyError(f"面板中不存在字段：{field}，可用字段 {self.fields}")
+            self._arrays[field] = np.load(os.path.join(self.root, f"{field}.npy"), mmap_mode="r")
+        return self._arrays[field]
+
+    def frame(self, field, universe=None):
+        """
+        取出一个字段的宽表（日期 × 股票代码）
+        :param universe: 股票池，None表示全部股票
+        :return: DataFrame，只拷贝股票池对应的行
+        """
+        values = self.array(field)
+        if universe is None:
+            return pd.DataFrame(np.asarray(values).T, index=self.dates, columns=self.stock_codes)
+        idx = self.stock_codes.get_indexer([str(s) for s in universe])
+        if (idx < 0).any():
+            raise KeyError(f"面板中不存在股票：{[s for s, i in zip(universe, idx) if i < 0][:5]}")
+        return pd.DataFrame(values[idx].T, index=self.dates, columns=self.stock_codes[idx])
+
+
+# ---------------------- 2. 策略注册 ----------------------
+STRATEGIES = {}
+
+
+def register_strategy(name):
+    """
+    注册批量回测策略的装饰器
+    被装饰函数签名为 func(panel, params, universe) -> 指标字典
+    """
+    def decorator(func):
+        STRATEGIES[name] = func
+        return func
+    return decorator
+
+
+def _nav_metrics(nav):
+    """组合净值序列 → 总收益、年化收益、最大回撤（非正数）、夏普（不扣无风险利率，与param_sweep一致）"""
+    from backtest_module.performance_analyzer import batch_performance
+
+    metrics = batch_performance(nav.dropna().to_frame(), risk_free_rate=0.0).iloc[0]
+    return {
+        "total_return": metrics["total_return"],
+        "annual_return": metrics["annual_return"],
+        "max_drawdown": metrics["max_drawdown"],
+        "sharpe": 0.0 if np.isnan(metrics["sharpe"]) else metrics["sharpe"],
+    }
+
+
+@register_strategy("ma_cross")
+def run_ma_cross(panel, params, universe):
+    """
+    均线交叉策略：params = {short, long, cost, price_col}
+    返回股票池内各标的指标的平均值
+    """
+    from backtest_module.param_sweep import sweep_ma_cross
+
+    prices = panel.frame(params.get("price_col", "close"), universe)
+    result = sweep_ma_cross(prices, [params.get("short", 5)], [params.get("long", 20)], [params.get("cost", 0.001)])
+    metrics = result[["total_return", "annual_return", "max_drawdown", "sharpe", "trade_count"]].mean()
+    return metrics.to_dict()
+
+
+@register_strategy("factor_signal")
+def run_factor_signal(panel, params, universe):
+    """
+    因子阈值策略：因子值 > upper 买入，< lower 卖出，用面板回测引擎撮合
+    params = {factor, upper, lower, price_col}
+    返回等权组合净值的指标与各标的的平均胜率、交易次数
+    """
+    from backtest_module.backtest_engine import PanelBacktestEngine
+
+    factor = panel.frame(params["factor"], universe)
+    prices = panel.frame(params.get("price_col", "close"), universe)
+    signal = np.where(factor > params.get("upper", 0.0), 1, np.where(factor < params.get("lower", 0.0), -1, 0))
+    signal = pd.DataFrame(signal.astype(np.int8), index=factor.index, columns=factor.columns)
+
+    engine = PanelBacktestEngine(cfg.INITIAL_CAPITAL).run(signal, prices)
+    performance = engine.calculate_performance()
+    metrics = _nav_metrics(engine.portfolio_nav)
+    metrics.update({"win_rate": performance["win_rate"].mean(), "trade_count": performance["trade_count"].mean()})
+    return metrics
+
+
+# ---------------------- 3. 任务调度 ----------------------
+def job_id(job):
+    """任务的稳定ID：由策略、参数、股票池决定，用于断点续跑时识别已完成的任务"""
+    key = json.dumps([job["strategy"], job.get("params", {}), job.get("universe")], sort_keys=True)
+    return hashlib.md5(key.encode()).hexdigest()[:16]
+
+
+def expand_grid(strategy, grid, universe=None):
+    """
+    把参数网格展开为任务列表
+    :param grid: {参数名: 取值列表}
+    :return: [{"strategy", "params", "universe"}, ...]
+    """
+    names = list(grid)
+    return [{"strategy": strategy, "params": dict(zip(names, values)), "universe": universe}
+            for values in itertools.product(*(grid[n] for n in names))]
+
+
+_PANEL = None  # 子进程挂载的面板
+
+
+def _init_worker(panel_root):
+    """子进程初始化：挂载共享面板"""
+    global _PANEL
+    _PANEL = SharedPanel(panel_root)
+
+
+def _run_job(job):
+    """子进程中执行一个任务，异常记录在结果中而不是中断整批回测"""
+    start = time.perf_counter()
+    record = {"job_id": job_id(job), "metrics_version": METRICS_VERSION,
+              "strategy": job["strategy"], "params": job.get("params", {}),
+              "universe_size": len(job["universe"]) if job.get("universe") else len(_PANEL.stock_codes)}
+    try:
+        metrics = STRATEGIES[job["strategy"]](_PANEL, job.get("params", {}), job.get("universe"))
+        record.update({name: float(value) for name, value in metrics.items()})
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def _read_records(output_path):
+    """
+    读取结果文件中当前指标版本的记录，跳过中断时写了一半的行；旧指标版本的记录不返回，跳过的行数记入日志
+    :return: 记录列表（按写入顺序）
+    """
+    records, n_stale = [], 0
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 中断时写了一半的行
+            if record.get("metrics_version") == METRICS_VERSION:
+                records.append(record)
+            else:
+                n_stale += 1
+    if n_stale:
+        logger.warning("%s 中有%d行结果的指标版本不是当前版本(%d)，已跳过；重新运行这些任务即可得到当前版本的结果",
+                       output_path, n_stale, METRICS_VERSION)
+    return records
+
+
+def _completed_jobs(output_path):
+    """结果文件中已成功完成、且指标为当前版本的任务ID"""
+    if not os.path.exists(output_path):
+        return set()
+    return {record["job_id"] for record in _read_records(output_path) if "error" not in record}
+
+
+def run_batch(jobs, panel_root=cfg.PANEL_CACHE_PATH, output_path=cfg.BATCH_RESULT_FILE, n_workers=None,
+              resume=True):
+    """
+    用进程池执行一批回测任务，每完成一个任务就追加写入一行结果
+    :param jobs: 任务列表（见expand_grid）
+    :param panel_root: 共享面板目录
+    :param output_path: 结果文件（JSON Lines）
+    :param n_workers: 进程数，默认使用全部CPU核心；1表示在当前进程内执行
+    :param resume: 是否跳过结果文件中已完成的任务
+    :return: 本次完成的任务数
+    """
+    unknown = {job["strategy"] for job in jobs} - set(STRATEGIES)
+    if unknown:
+        raise ValueError(f"未注册的策略：{sorted(unknown)}，可选 {sorted(STRATEGIES)}")
+    done = _completed_jobs(output_path) if resume else set()
+    pending = [job for job in jobs if job_id(job) not in done]
+    n_workers = n_workers or os.cpu_count() or 1
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        def write(record):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+        if n_workers == 1:
+            _init_worker(panel_root)
+            for job in pending:
+                write(_run_job(job))
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(panel_root,)) as pool:
+                for future in as_completed([pool.submit(_run_job, job) for job in pending]):
+                    write(future.result())
+    return len(pending)
+
+
+def load_results(output_path=cfg.BATCH_RESULT_FILE):
+    """读取结果文件为DataFrame（参数展开为列），只保留当前指标版本、每个任务最后一次的结果"""
+    records = {record["job_id"]: record for record in _read_records(output_path)}
+    return pd.json_normalize(list(records.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量回测：共享内存面板 + 进程池")
+    parser.add_argument("--build-panel", action="store_true", help="从标准化数据构建共享面板")
+    parser.add_argument("--fields", nargs="+", default=["close"], help="写入面板的字段")
+    parser.add_argument("--jobs", help="任务文件（JSON Lines）")
+    parser.add_argument("--panel", default=cfg.PANEL_CACHE_PATH, help="共享面板目录")
+    parser.add_argument("--output", default=cfg.BATCH_RESULT_FILE, help="结果文件（JSON Lines）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数")
+    args = parser.parse_args()
+
+    if args.build_panel:
+        from main_app.data_interface import get_clean_data
+        df = get_clean_data(columns=args.fields, compact=False)
+        build_shared_panel(df, args.fields, args.panel)
+        print(f"共享面板已写入：{args.panel}")
+
+    if args.jobs:
+        with open(args.jobs, "r", encoding="utf-8") as f:
+            jobs = [json.loads(line) for line in f if line.strip()]
+        start = time.perf_counter()
+        n_done = run_batch(jobs, args.panel, args.output, args.workers)
+        print(f"完成{n_done}个任务，耗时{time.perf_counter() - start:.1f}秒，结果见：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# 流水线各阶段的基准测试
+"""
+流水线各阶段的基准测试
+
+在可复现的模拟行情（data_module.synthetic_market）上，按生产代码的调用方式依次执行：
+fetch（FetchScheduler + 模拟数据源）→ clean → factor → label → train → infer → backtest → analyze，
+记录每个阶段的耗时、处理行数与进程内存峰值；可选用cProfile记录每个阶段的热点函数。
+
+- 规模从3只股票×1年到5000只股票×10年（SIZES），同一规模每次生成完全相同的数据
+- 每次运行的结果追加到BENCHMARK_HISTORY_FILE（JSON Lines，含git提交号），
+  并与同一规模、同一阶段的上一次记录对比，打印耗时变化
+- 中间文件写在临时目录，不影响各模块outputs下的正式数据
+
+用法示例：
+    python -m scripts.benchmark_suite --sizes tiny small
+    python -m scripts.benchmark_suite --sizes medium --until train --profile
+    python -m scripts.benchmark_suite --sizes full --workers 8 --no-history
+"""
+import argparse
+import cProfile
+import json
+import os
+import platform
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from main_app.utils.profiler import git_commit, peak_rss_mb, profile_text
+
+# 规模名 → (股票数, 交易日数)
+SIZES = OrderedDict([
+    ("tiny", (3, 252)),
+    ("small", (50, 756)),
+    ("medium", (300, 1260)),
+    ("large", (1000, 2520)),
+    ("full", (5000, 2520)),
+])
+
+# 阶段名 → 函数，按执行顺序注册；每个阶段读取上游阶段放进ctx的结果，返回处理的行数
+BENCHMARK_STAGES = OrderedDict()
+
+LABEL_HORIZON = 5
+LABEL_THRESHOLD = 3.0
+
+
+def benchmark_stage(name):
+    """注册一个基准测试阶段"""
+    def decorator(func):
+        BENCHMARK_STAGES[name] = func
+        return func
+    return decorator
+
+
+# ---------------------- 1. 各阶段 ----------------------
+@benchmark_stage("fetch")
+def _fetch(ctx):
+    from data_module.data_fetcher import FetchScheduler
+    from data_module.synthetic_market import SyntheticSource
+
+    market = ctx["market"]
+    source = SyntheticSource(market)
+    scheduler = FetchScheduler(source, cache_dir=os.path.join(ctx["workdir"], "fetch_cache"), max_workers=8)
+    raw = scheduler.run(source.symbols, market["date"].min(), market["date"].max())
+    raw.to_parquet(ctx["raw_path"], index=False)
+    return len(raw)
+
+
+@benchmark_stage("clean")
+def _clean(ctx):
+    from data_module.data_cleaner import clean_data
+
+    return len(clean_data(ctx["raw_path"], ctx["standard_path"], n_workers=ctx["workers"]))
+
+
+@benchmark_stage("factor")
+def _factor(ctx):
+    from data_module.factor_miner import run_factor_mining
+
+    return len(run_factor_mining(ctx["standard_path"], ctx["factor_path"]))
+
+
+@benchmark_stage("label")
+def _label(ctx):
+    from data_module.factor_miner import FACTOR_REGISTRY
+    from strategy_module.label_generator import MISSING_LABEL, build_label_panel, label_column
+
+    factors = pd.read_parquet(ctx["factor_path"])
+    factors["stock_code"] = factors["stock_code"].astype(str)
+    labels = build_label_panel(factors, horizons=(LABEL_HORIZON,), thresholds=(LABEL_THRESHOLD,))
+    label_col = label_column(LABEL_HORIZON, LABEL_THRESHOLD)
+    labels = labels[labels[label_col] != MISSING_LABEL]
+
+    ctx["feature_cols"] = [name for name in FACTOR_REGISTRY if name in factors.columns]
+    ctx["features"] = factors[["date", "stock_code"] + ctx["feature_cols"]]
+    ctx["train_data"] = labels[["date", "stock_code", label_col]].rename(columns={label_col: "label"}).merge(
+        ctx["features"], on=["date", "stock_code"])
+    return len(labels)
+
+
+@benchmark_stage("train")
+def _train(ctx):
+    from strategy_module.model_trainer import WalkForwardTrainer
+
+    # 训练窗口随规模缩放，最多约4折，保证全量规模也能在合理时间内跑完
+    n_days = ctx["n_days"]
+    train_days = min(500, n_days // 2)
+    test_days = max(20, (n_days - train_days - LABEL_HORIZON) // 4)
+    trainer = WalkForwardTrainer(ctx["model_type"], {"n_estimators": 50}, train_days=train_days,
+                                 test_days=test_days, gap_days=LABEL_HORIZON, n_workers=ctx["workers"],
+                                 cache_root=os.path.join(ctx["workdir"], "feature_cache"))
+    trainer.run(ctx["train_data"], ctx["feature_cols"])
+    ctx["model"] = trainer.models[-1]
+    return len(ctx["train_data"])
+
+
+@benchmark_stage("infer")
+def _infer(ctx):
+    from strategy_module.strategy_engine import InferenceEngine, generate_signal
+
+    engine = InferenceEngine(ctx["feature_cols"])
+    engine.add_model(ctx["model"])
+    signals = generate_signal(ctx["features"], signal_path=None, engine=engine, store_path=ctx["signal_store"])
+    return len(signals)
+
+
+@benchmark_stage("backtest")
+def _backtest(ctx):
+    from backtest_module.backtest_engine import PanelBacktestEngine, load_panel
+
+    signal_matrix, price_matrix = load_panel(ctx["signal_store"], ctx["standard_path"])
+    ctx["engine"] = PanelBacktestEngine(cfg.INITIAL_CAPITAL).run(signal_matrix, price_matrix)
+    return price_matrix.size
+
+
+@benchmark_stage("analyze")
+def _analyze(ctx):
+    from backtest_module.report_generator import export_backtest
+
+    engine = ctx["engine"]
+    export_backtest(engine, os.path.join(ctx["workdir"], "summary.parquet"))
+    return engine.nav.size
+
+
+# ---------------------- 2. 计时与记录 ----------------------
+def run_size(size, stages=None, workers=None, model_type="xgboost", seed=0, profile_dir=None, top=15):
+    """
+    在一个规模上依次执行各阶段
+    :param size: SIZES中的规模名，或(股票数, 交易日数)
+    :param stages: 需要执行到的阶段（含全部上游阶段），None表示全部
+    :param workers: 清洗与训练的进程数，None表示全部CPU核心
+    :param model_type: 训练使用的模型
+    :param seed: 模拟行情的随机种子
+    :param profile_dir: 不为None时用cProfile记录每个阶段，并把.prof文件写到该目录
+    :param top: 打印的热点函数个数
+    :return: 每个阶段一条记录的列表
+    """
+    from data_module.synthetic_market import generate_market
+
+    name, (n_stocks, n_days) = (size, SIZES[size]) if isinstance(size, str) else (f"{size[0]}x{size[1]}", size)
+    names = list(BENCHMARK_STAGES)
+    if stages:
+        names = names[:max(names.index(stage) for stage in stages) + 1]
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as workdir:
+        # 1. 生成模拟行情（不计入各阶段耗时）
+        start = time.perf_counter()
+        market = generate_market(n_stocks, n_days, seed=seed)
+        print(f"[{name}] {n_stocks}只股票 × {n_days}个交易日，{len(market)}行，"
+              f"生成耗时 {time.perf_counter() - start:.2f}s")
+        ctx = {
+            "market": market, "n_stocks": n_stocks, "n_days": n_days, "workers": workers,
+            "model_type": model_type, "workdir": workdir,
+            "raw_path": os.path.join(workdir, "raw_data.parquet"),
+            "standard_path": os.path.join(workdir, "standard_data.parquet"),
+            "factor_path": os.path.join(workdir, "factor_data.parquet"),
+            "signal_store": os.path.join(workdir, "signal_store"),
+        }
+
+        # 2. 逐阶段计时
+        records = []
+        for stage in names:
+            profiler = cProfile.Profile() if profile_dir else None
+            start = time.perf_counter()
+            if profiler:
+                profiler.enable()
+            try:
+                rows = BENCHMARK_STAGES[stage](ctx)
+            finally:
+                if profiler:
+                    profiler.disable()
+            seconds = time.perf_counter() - start
+            records.append({"size": name, "n_stocks": n_stocks, "n_days": n_days, "stage": stage,
+                            "seconds": round(seconds, 4), "rows": int(rows), "peak_rss_mb": peak_rss_mb()})
+            print(f"  {stage:<10}{seconds:>10.3f}s{int(rows):>14,d}行")
+            if profiler:
+                os.makedirs(profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(profile_dir, f"{name}_{stage}.prof"))
+                print(profile_text(profiler, top))
+    return records
+
+
+def load_history(path=cfg.BENCHMARK_HISTORY_FILE):
+    """读取历史记录（DataFrame，每行一个阶段的一次测量）"""
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    with open(path, "r", encoding="utf-8") as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def append_history(records, path=cfg.BENCHMARK_HISTORY_FILE):
+    """把一次运行的记录追加到历史文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def compare_with_history(records, history):
+    """
+    与同一规模、同一阶段的上一次记录对比
+    :return: DataFrame：size, stage, seconds, previous, change（耗时变化比例，正数表示变慢）
+    """
+    current = pd.DataFrame(records)[["size", "stage", "seconds"]]
+    if history.empty:
+        current["previous"] = np.nan
+    else:
+        previous = history.groupby(["size", "stage"])["seconds"].last().rename("previous")
+        current = current.join(previous, on=["size", "stage"])
+    current["change"] = current["seconds"] / current["previous"] - 1
+    return current
+
+
+def run_benchmark(sizes=("tiny",), stages=None, workers=None, model_type="xgboost", seed=0, profile=False,
+                  top=15, history_path=cfg.BENCHMARK_HISTORY_FILE):
+    """
+    依次测量多个规模，打印与上一次记录的对比，并追加到历史文件
+    :param sizes: 规模名列表
+    :param history_path: 历史文件，None表示不读写历史
+    :return: 本次运行的记录列表
+    """
+    run_info = {
+        "run_id": time.strftime("%Y%m%d-%H%M%S"), "commit": git_commit(), "python": platform.python_version(),
+        "numpy": np.__version__, "pandas": pd.__version__, "cpu_count": os.cpu_count(), "seed": seed,
+        "model_type": model_type,
+    }
+    profile_dir = os.path.join(cfg.BENCHMARK_OUTPUT_PATH, "profiles", run_info["run_id"]) if profile else None
+    records = []
+    for size in sizes:
+        records += [{**run_info, **record}
+                    for record in run_size(size, stages, workers, model_type, seed, profile_dir, top)]
+
+    if history_path is not None:
+        comparison = compare_with_history(records, load_history(history_path))
+        print(f"\n{'规模':<8}{'阶段':<10}{'本次(s)':>10}{'上次(s)':>10}{'变化':>9}")
+        for row in comparison.itertuples():
+            change = "-" if np.isnan(row.change) else f"{row.change:+.1%}"
+            previous = "-" if np.isnan(row.previous) else f"{row.previous:.3f}"
+            print(f"{row.size:<8}{row.stage:<10}{row.seconds:>10.3f}{previous:>10}{change:>9}")
+        append_history(records, history_path)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流水线各阶段的基准测试")
+    parser.add_argument("--sizes", nargs="+", default=["tiny"], choices=list(SIZES), help="测试规模")
+    parser.add_argument("--until", default=None, choices=list(BENCHMARK_STAGES), help="执行到该阶段为止")
+    parser.add_argument("--workers", type=int, default=None, help="清洗与训练的进程数")
+    parser.add_argument("--model", default="xgboost", choices=["xgboost", "random_forest"], help="训练使用的模型")
+    parser.add_argument("--seed", type=int, default=0, help="模拟行情的随机种子")
+    parser.add_argument("--profile", action="store_true", help="用cProfile记录每个阶段的热点函数")
+    parser.add_argument("--top", type=int, default=15, help="打印的热点函数个数")
+    parser.add_argument("--no-history", action="store_true", help="不读写历史记录")
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, [args.until] if args.until else None, args.workers, args.model, args.seed,
+                  args.profile, args.top, None if args.no_history else cfg.BENCHMARK_HISTORY_FILE)
+
+
+if __name__ == "__main__":
+    main()
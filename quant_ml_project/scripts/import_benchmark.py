@@ -0,0 +1,151 @@
+# 启动耗时基准测试
+"""
+启动耗时基准测试：统计各模块的导入耗时
+
+每个模块在独立的子进程中用 python -X importtime 导入（不受当前进程已导入模块的影响），
+报告该模块的总导入耗时、子进程总耗时，以及它带进来的最重的第三方依赖。
+
+用法示例：
+    python -m scripts.import_benchmark
+    python -m scripts.import_benchmark --modules main pandas xgboost --top 5
+    python -m scripts.import_benchmark --command "main.py signals"   # 测量一条命令的完整启动耗时
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from config import project_config as cfg
+
+# 默认测量的模块：入口、各业务模块与常见的重型依赖
+DEFAULT_MODULES = [
+    "main",
+    "main_app.main_pipeline",
+    "main_app.data_interface",
+    "data_module.data_fetcher",
+    "data_module.data_cleaner",
+    "data_module.factor_miner",
+    "strategy_module.label_generator",
+    "strategy_module.model_trainer",
+    "strategy_module.strategy_engine",
+    "strategy_module.factor_optimizer",
+    "backtest_module.backtest_engine",
+    "backtest_module.performance_analyzer",
+    "backtest_module.report_generator",
+    "numpy",
+    "pandas",
+    "pyarrow.parquet",
+    "yaml",
+    "joblib",
+    "sklearn.ensemble",
+    "xgboost",
+    "matplotlib.pyplot",
+    "openpyxl",
+    "tushare",
+    "akshare",
+]
+
+
+def _parse_importtime(stderr):
+    """
+    解析-X importtime的输出
+    :return: [(模块名, 自身耗时us, 累计耗时us, 嵌套层级)]
+    """
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        level = (len(name) - len(name.lstrip()) + 1) // 2  # 顶层导入缩进1格，每深一层多2格
+        records.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return records
+
+
+def measure_module(module, python=sys.executable, cwd=cfg.PROJECT_ROOT):
+    """
+    在新进程中导入一个模块并计时
+    :return: {"module", "import_ms", "process_ms", "dependencies", "error"}，dependencies为直接导入的依赖及其累计耗时
+    """
+    env = dict(os.environ, MPLBACKEND="Agg")
+    start = time.perf_counter()
+    proc = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"], cwd=cwd, env=env,
+                          capture_output=True, text=True)
+    process_ms = (time.perf_counter() - start) * 1000
+    records = _parse_importtime(proc.stderr)
+    error = None
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ["导入失败"])[-1]
+
+    # 输出为后序：子模块的记录排在父模块之前。目标模块的直接依赖 = 紧挨在它之前、层级恰好深一层的记录
+    dependencies = {}
+    target = [i for i, (name, _, _, level) in enumerate(records) if name == module and level == 1]
+    import_ms = 0.0
+    if target:
+        import_ms = records[target[-1]][2] / 1000
+        for name, _, cumulative_us, level in reversed(records[:target[-1]]):
+            if level <= 1:
+                break
+            if level == 2 and not name.startswith(module + "."):  # 目标包自己的子模块不算依赖
+                root = name.split(".")[0]
+                dependencies[root] = dependencies.get(root, 0) + cumulative_us / 1000
+    return {
+        "module": module,
+        "import_ms": import_ms,
+        "process_ms": process_ms,
+        "dependencies": dependencies,
+        "error": error,
+    }
+
+
+def measure_command(command, python=sys.executable, cwd=cfg.PROJECT_ROOT, repeat=3):
+    """
+    测量一条命令（如"main.py signals"）从启动到退出的耗时，取多次运行的最小值
+    :return: 毫秒
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([python] + command.split(), cwd=cwd, capture_output=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def run_benchmark(modules=None, top=3):
+    """
+    逐个模块测量并打印报告
+    :param modules: 模块名列表，None表示DEFAULT_MODULES
+    :param top: 每个模块列出的最重依赖个数
+    :return: 测量结果列表
+    """
+    baseline = measure_module("sys")["process_ms"]  # 解释器自身的启动耗时
+    print(f"解释器启动：{baseline:.0f} ms")
+    print(f"{'模块':<38}{'导入(ms)':>10}{'进程(ms)':>10}  最重的依赖")
+    results = []
+    for module in modules or DEFAULT_MODULES:
+        result = measure_module(module)
+        results.append(result)
+        if result["error"]:
+            print(f"{module:<38}{'-':>10}{result['process_ms']:>10.0f}  {result['error']}")
+            continue
+        heavy = sorted(((ms, name) for name, ms in result["dependencies"].items()), reverse=True)[:top]
+        heavy_text = ", ".join(f"{name} {ms:.0f}" for ms, name in heavy)
+        print(f"{module:<38}{result['import_ms']:>10.0f}{result['process_ms']:>10.0f}  {heavy_text}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计各模块的导入耗时")
+    parser.add_argument("--modules", nargs="+", default=None, help="需要测量的模块")
+    parser.add_argument("--top", type=int, default=3, help="每个模块列出的最重依赖个数")
+    parser.add_argument("--command", default=None, help="测量一条命令的完整启动耗时，如\"main.py signals\"")
+    args = parser.parse_args()
+
+    if args.command:
+        print(f"{args.command}：{measure_command(args.command):.0f} ms")
+    else:
+        run_benchmark(args.modules, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,300 @@
 # 因子重要性分析与筛选
+"""
+因子有效性评估与筛选
+
+对每个因子在全部交易日上一次性计算（宽表：日期 × 股票，按日期的横截面运算都是按行的数组运算）：
+- IC / Rank IC：因子值与未来N日收益率的横截面Pearson / Spearman相关系数，多个预测周期
+- IC衰减：因子值与第k日之后的单日收益率的Rank IC（k = 0, 1, ...），看因子的预测力能维持多久
+- 分位数组合收益：每日按因子值分成n组，各组未来收益的均值，以及多空（最高组 - 最低组）收益
+- 因子换手：相邻两日因子排名的相关系数（rank_autocorr），以及最高分位组成分股的日换手率
+
+汇总表（summary）每行一个因子，可直接用select_factors()按IC_IR排序筛选，
+整个过程没有逐日期的Python循环，可以放在每次重新训练之前执行。
+"""
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from main_app.utils.profiler import instrument
+
+# 计算横截面相关系数时，当日至少需要的有效股票数
+MIN_STOCKS = 10
+
+
+# ---------------------- 1. 宽表工具 ----------------------
+def _to_wide(df, columns, date_col="date", code_col="stock_code"):
+    """长表 → {列名: 宽表数组(日期 × 股票)}，以及日期索引、股票代码"""
+    day_idx, dates = pd.factorize(df[date_col], sort=True)
+    stock_idx, codes = pd.factorize(df[code_col].astype(str), sort=True)
+    wide = {}
+    for col in columns:
+        values = np.full((len(dates), len(codes)), np.nan)
+        values[day_idx, stock_idx] = df[col].to_numpy(dtype=np.float64)
+        wide[col] = values
+    return wide, pd.Index(dates, name=date_col), pd.Index(codes, name=code_col)
+
+
+def forward_returns(close, horizon):
+    """未来horizon日收益率：close[t + horizon] / close[t] - 1（宽表）"""
+    result = np.full_like(close, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    return result
+
+
+def cross_section_rank(values):
+    """按日期（行）计算横截面排名，并列取平均名次，NaN不参与排名"""
+    return pd.DataFrame(values).rank(axis=1).to_numpy()
+
+
+def row_corr(x, y, min_count=MIN_STOCKS):
+    """
+    逐行Pearson相关系数（只用两者都有值的位置）
+    :return: 长度为行数的数组，有效样本不足min_count的行为NaN
+    """
+    mask = ~(np.isnan(x) | np.isnan(y))
+    count = mask.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x = np.where(mask, x, 0.0)
+        y = np.where(mask, y, 0.0)
+        x = np.where(mask, x - (x.sum(axis=1) / count)[:, None], 0.0)
+        y = np.where(mask, y - (y.sum(axis=1) / count)[:, None], 0.0)
+        corr = (x * y).sum(axis=1) / np.sqrt((x * x).sum(axis=1) * (y * y).sum(axis=1))
+    return np.where(count >= min_count, corr, np.nan)
+
+
+class _CrossSection:
+    def __init__(self, values, rank=None):
+        """
+        宽表的横截面标准化结果：按行z-score（总体标准差），无效位置为0
+        两张宽表的有效位置在某一行完全相同时，该行的Pearson相关系数 = Σ(z_x × z_y) / n，
+        只需一次乘加，不用每次重新去均值
+        :param values: 原始宽表（日期 × 股票）
+        :param rank: 已计算好的横截面排名，None表示现算
+        """
+        self.values = values
+        self.valid = ~np.isnan(values)
+        self.count = self.valid.sum(axis=1)
+        self.rank = cross_section_rank(values) if rank is None else rank
+        self.z = self._zscore(values)
+        self.rank_z = self._zscore(self.rank)
+
+    def _zscore(self, values):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(self.valid, values, 0.0).sum(axis=1, keepdims=True) / self.count[:, None]
+            centered = np.where(self.valid, values - mean, 0.0)
+            std = np.sqrt((centered ** 2).sum(axis=1, keepdims=True) / self.count[:, None])
+            return np.where(self.valid, centered / std, 0.0)
+
+
+def _fast_corr(a, b, rank=False, a_rows=slice(None), b_rows=slice(None)):
+    """
+    逐行相关系数（rank=True时为Spearman），行可错开（a的第t行对b的第t+k行）
+    有效位置一致的行走z-score快速路径，不一致的行只在两者都有值的位置上重新计算
+    """
+    a_valid, b_valid = a.valid[a_rows], b.valid[b_rows]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if rank:
+            corr = (a.rank_z[a_rows] * b.rank_z[b_rows]).sum(axis=1) / a.count[a_rows]
+        else:
+            corr = (a.z[a_rows] * b.z[b_rows]).sum(axis=1) / a.count[a_rows]
+    mixed = np.flatnonzero((a_valid != b_valid).any(axis=1) & (a_valid & b_valid).any(axis=1))
+    if len(mixed):
+        x, y = a.values[a_rows][mixed], b.values[b_rows][mixed]
+        if rank:
+            mask = np.isnan(x) | np.isnan(y)
+            x = cross_section_rank(np.where(mask, np.nan, x))
+            y = cross_section_rank(np.where(mask, np.nan, y))
+        corr[mixed] = row_corr(x, y)
+    corr[(a_valid & b_valid).sum(axis=1) < MIN_STOCKS] = np.nan
+    return corr
+
+
+def _ic_stats(ic):
+    """IC序列 → 均值、IC_IR（均值 / 标准差）、IC为正的比例"""
+    ic = ic[~np.isnan(ic)]
+    if len(ic) < 2:
+        return np.nan, np.nan, np.nan
+    std = ic.std(ddof=1)
+    return ic.mean(), ic.mean() / std if std > 0 else np.nan, (ic > 0).mean()
+
+
+# ---------------------- 2. 单项指标 ----------------------
+def quantile_buckets(factor_rank, count, n_quantiles=5):
+    """
+    按横截面排名分组：1为因子值最小组，n_quantiles为最大组，无效位置为0
+    :param factor_rank: 横截面排名宽表
+    :param count: 每行的有效股票数
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bucket = np.ceil(factor_rank / count[:, None] * n_quantiles)
+    return np.where(np.isnan(bucket), 0, bucket).astype(np.int8)
+
+
+def quantile_returns(bucket, returns, n_quantiles=5):
+    """
+    各分位组的收益均值（组内有收益数据的股票等权）
+    :param bucket: quantile_buckets的结果
+    :param returns: 未来收益率宽表
+    :return: 数组(日期 × 分组)，当日有效股票不足时为NaN
+    """
+    # 按(日期, 分组)编号后用bincount一次求出各组的收益之和与股票数
+    valid = ~np.isnan(returns)
+    index = (np.arange(len(bucket))[:, None] * (n_quantiles + 1) + bucket).ravel()
+    size = len(bucket) * (n_quantiles + 1)
+    sums = np.bincount(index, weights=np.where(valid, returns, 0.0).ravel(), minlength=size)
+    counts = np.bincount(index, weights=valid.ravel(), minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = (sums / counts).reshape(len(bucket), n_quantiles + 1)[:, 1:]
+    result[((bucket > 0) & valid).sum(axis=1) < MIN_STOCKS] = np.nan
+    return result
+
+
+def factor_turnover(section, bucket, n_quantiles=5):
+    """
+    因子换手
+    :param section: 因子的_CrossSection
+    :param bucket: quantile_buckets的结果
+    :return: (rank_autocorr, top_turnover) 两个按日期的数组：
+             相邻两日横截面排名的相关系数；最高分位组中当日新进入的股票占比
+    """
+    rank_section = _CrossSection(section.rank, rank=section.rank)
+    rank_autocorr = np.full(len(bucket), np.nan)
+    rank_autocorr[1:] = _fast_corr(rank_section, rank_section, a_rows=slice(1, None), b_rows=slice(None, -1))
+
+    top = bucket == n_quantiles
+    top_turnover = np.full(len(bucket), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        top_turnover[1:] = (top[1:] & ~top[:-1]).sum(axis=1) / top[1:].sum(axis=1)
+    return rank_autocorr, top_turnover
+
+
+def _nanmean(values):
+    """全为NaN时返回NaN且不告警"""
+    return np.nanmean(values) if np.isfinite(values).any() else np.nan
+
+
+# ---------------------- 3. 全因子评估 ----------------------
+class FactorEvaluation:
+    def __init__(self, summary, ic, rank_ic, decay, quantiles):
+        """
+        因子评估结果
+        :param summary: 汇总表（因子 × 指标）
+        :param ic: {周期: 每日IC DataFrame(日期 × 因子)}
+        :param rank_ic: {周期: 每日Rank IC DataFrame(日期 × 因子)}
+        :param decay: IC衰减表（因子 × 滞后天数），值为Rank IC均值
+        :param quantiles: {周期: 分位数组合平均收益表（因子 × 分组）}
+        """
+        self.summary = summary
+        self.ic = ic
+        self.rank_ic = rank_ic
+        self.decay = decay
+        self.quantiles = quantiles
+
+
+@instrument()
+def evaluate_factors(df, factor_cols=None, horizons=(1, 5, 10, 20), n_quantiles=5, decay_lags=10,
+                     price_col="close", date_col="date", code_col="stock_code"):
+    """
+    一次性评估全部因子
+    :param df: 长表，包含date、stock_code、价格列和因子列
+    :param factor_cols: 待评估的因子，默认全部已注册且存在于数据中的因子
+    :param horizons: 未来收益率的预测周期（交易日）
+    :param n_quantiles: 分位数组合的组数
+    :param decay_lags: IC衰减计算的滞后天数
+    :return: FactorEvaluation对象
+    """
+    if factor_cols is None:
+        from data_module.factor_miner import FACTOR_REGISTRY
+        factor_cols = [name for name in FACTOR_REGISTRY if name in df.columns]
+    factor_cols = list(factor_cols)
+    wide, dates, _ = _to_wide(df, [price_col] + factor_cols, date_col, code_col)
+    close = wide.pop(price_col)
+    horizons = list(horizons)
+
+    # 1. 收益率的横截面排名与标准化只算一次，所有因子共用；IC衰减用的是单日收益错开k行
+    returns = {h: _CrossSection(forward_returns(close, h)) for h in horizons}
+    one_day = returns[1] if 1 in horizons else _CrossSection(forward_returns(close, 1))
+    n_days = len(dates)
+
+    rows, decay_rows = [], []
+    ic = {h: {} for h in horizons}
+    rank_ic = {h: {} for h in horizons}
+    quantiles = {h: {} for h in horizons}
+    for name in factor_cols:
+        section = _CrossSection(wide.pop(name))
+        bucket = quantile_buckets(section.rank, section.count, n_quantiles)
+        row = {}
+        # 2. 各周期IC、Rank IC与分位数组合
+        for h in horizons:
+            ic[h][name] = _fast_corr(section, returns[h])
+            rank_ic[h][name] = _fast_corr(section, returns[h], rank=True)
+            row[f"ic_mean_{h}d"], row[f"ic_ir_{h}d"], _ = _ic_stats(ic[h][name])
+            row[f"rank_ic_mean_{h}d"], row[f"rank_ic_ir_{h}d"], row[f"rank_ic_win_{h}d"] = \
+                _ic_stats(rank_ic[h][name])
+            daily_quantiles = quantile_returns(bucket, returns[h].values, n_quantiles)
+            mean_quantile = np.array([_nanmean(daily_quantiles[:, q]) for q in range(n_quantiles)])
+            quantiles[h][name] = mean_quantile
+            row[f"long_short_{h}d"] = mean_quantile[-1] - mean_quantile[0]
+
+        # 3. IC衰减：第t日因子与第t+k日单日收益的Rank IC
+        decay_rows.append({lag: _nanmean(_fast_corr(section, one_day, rank=True, a_rows=slice(0, n_days - lag),
+                                                    b_rows=slice(lag, None)))
+                           for lag in range(decay_lags)})
+
+        # 4. 换手
+        rank_autocorr, top_turnover = factor_turnover(section, bucket, n_quantiles)
+        row["rank_autocorr"] = _nanmean(rank_autocorr)
+        row["top_turnover"] = _nanmean(top_turnover)
+        rows.append(row)
+
+    summary = pd.DataFrame(rows, index=pd.Index(factor_cols, name="factor"))
+    decay = pd.DataFrame(decay_rows, index=summary.index)
+    decay.columns.name = "lag"
+    quantile_index = pd.Index(range(1, n_quantiles + 1), name="quantile")
+    return FactorEvaluation(
+        summary=summary,
+        ic={h: pd.DataFrame(v, index=dates) for h, v in ic.items()},
+        rank_ic={h: pd.DataFrame(v, index=dates) for h, v in rank_ic.items()},
+        decay=decay,
+        quantiles={h: pd.DataFrame(v, index=quantile_index).T for h, v in quantiles.items()},
+    )
+
+
+def select_factors(summary, top_n=20, metric="rank_ic_ir_5d", max_corr=None, rank_ic=None):
+    """
+    按IC类指标的绝对值筛选因子
+    :param summary: evaluate_factors返回的summary
+    :param top_n: 保留的因子数
+    :param metric: 排序指标（取绝对值，负向因子同样有效）
+    :param max_corr: 可选的相关性上限：与已选因子的每日Rank IC序列相关系数超过该值的因子被跳过
+    :param rank_ic: max_corr不为None时需要，evaluate_factors返回的某一周期的每日Rank IC表
+    :return: 选中的因子名列表
+    """
+    order = summary[metric].abs().sort_values(ascending=False).dropna().index
+    if max_corr is None:
+        return list(order[:top_n])
+    corr = rank_ic[order].corr().abs()
+    selected = []
+    for name in order:
+        if all(corr.loc[name, other] <= max_corr for other in selected):
+            selected.append(name)
+        if len(selected) == top_n:
+            break
+    return selected
+
+
+def run_factor_evaluation(input_path=cfg.STANDARD_DATA_FILE, factor_cols=None, **kwargs):
+    """
+    读取含因子列的standard_data.parquet并评估全部因子
+    :return: FactorEvaluation对象
+    """
+    from main_app.data_interface import compact_dtypes
+
+    df = compact_dtypes(pd.read_parquet(input_path))
+    return evaluate_factors(df, factor_cols, **kwargs)
+
+
+if __name__ == "__main__":
+    evaluation = run_factor_evaluation()
+    print(evaluation.summary.sort_values("rank_ic_ir_5d", key=abs, ascending=False))
@@ -0,0 +1,150 @@
+# 预测标签生成（未来N日收益率）
+"""
+标签生成
+
+与quant_project/strategy/label_generator.py的定义一致：
+- future_return：未来N日收盘价相对当前收盘价的收益率（%）
+- label：future_return ≥ 阈值记为1，否则为0
+
+这里的版本面向多股票长表(date, stock_code)，按股票分组平移，不会跨股票取到别人的价格；
+另外支持增量更新：每天追加新行情时，只回填那些"现在才能算出"的前视标签。
+
+build_label_panel()一次排序后为多个预测周期 × 多个阈值同时生成标签：
+- future_return_{N}d：未来N日收益率（%，float32）
+- label_{N}d_{阈值}：二分类（1/0）或三分类（1/0/-1）标签，int8；无未来数据的行记为MISSING_LABEL
+"""
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from main_app.utils.profiler import instrument
+
+# int8标签中表示"尚无未来数据"的取值
+MISSING_LABEL = np.iinfo(np.int8).min
+
+
+def calculate_future_return(data, future_days=5, date_col="date", code_col="stock_code"):
+    """
+    计算未来N日收益率（按股票分组，不修改输入数据）
+    :param data: 行情长表，需包含date、stock_code、close
+    :param future_days: 预测未来天数
+    :return: 按股票、日期排序的新DataFrame，增加future_return列（%）
+    """
+    data = data.sort_values([code_col, date_col], kind="stable").reset_index(drop=True)
+    future_close = data.groupby(code_col, sort=False)["close"].shift(-future_days)
+    data["future_return"] = (future_close - data["close"]) / data["close"] * 100
+    return data
+
+
+def generate_label(data, threshold=3.0):
+    """
+    生成标签：未来N日收益率是否≥threshold（%），并删除尚无未来数据的行
+    :param data: 含future_return列的DataFrame
+    :param threshold: 收益率阈值（%）
+    :return: 增加label列（int8）后的DataFrame
+    """
+    data = data.dropna(subset=["future_return"]).copy()
+    data["label"] = (data["future_return"] >= threshold).astype(np.int8)
+    return data
+
+
+@instrument()
+def build_labels(data, future_days=5, threshold=3.0, date_col="date", code_col="stock_code"):
+    """
+    全量生成标签，并返回尚未能确定标签的"待定行"，供增量更新使用
+    :param data: 全部历史行情长表
+    :return: (labels, pending)
+             labels：已确定标签的行；pending：每只股票最后future_days行（date, stock_code, close）
+    """
+    data = calculate_future_return(data[[date_col, code_col, "close"]], future_days, date_col, code_col)
+    pending = data.groupby(code_col, sort=False).tail(future_days)[[date_col, code_col, "close"]]
+    return generate_label(data, threshold), pending.reset_index(drop=True)
+
+
+def update_labels(pending, new_data, future_days=5, threshold=3.0, date_col="date", code_col="stock_code"):
+    """
+    增量更新标签：只用 待定行 + 新增行 计算，计算量与新增行数成正比
+    :param pending: 上次返回的待定行
+    :param new_data: 新增行情长表（需包含date、stock_code、close）
+    :return: (resolved, pending)
+             resolved：本次新确定标签的行；pending：更新后的待定行
+    """
+    new_data = new_data[[date_col, code_col, "close"]]
+    combined = pd.concat([pending, new_data], ignore_index=True)
+    combined = combined.drop_duplicates([code_col, date_col], keep="first")
+    combined = calculate_future_return(combined, future_days, date_col, code_col)
+
+    # 每只股票最后future_days行还看不到未来价格，继续待定
+    is_tail = combined.groupby(code_col, sort=False).cumcount(ascending=False) < future_days
+    new_pending = combined.loc[is_tail, [date_col, code_col, "close"]].reset_index(drop=True)
+    resolved = generate_label(combined[~is_tail], threshold)
+    return resolved.reset_index(drop=True), new_pending
+
+
+def label_column(horizon, threshold):
+    """标签列名，如 label_5d_3、label_10d_1.5"""
+    return f"label_{horizon}d_{threshold:g}"
+
+
+@instrument()
+def build_label_panel(data, horizons=(1, 3, 5, 10), thresholds=(3.0,), ternary=False,
+                      date_col="date", code_col="stock_code"):
+    """
+    一次遍历生成多周期、多阈值的收益率与标签（按股票分组，不修改输入数据）
+    :param data: 行情长表，需包含date、stock_code、close
+    :param horizons: 预测周期列表（交易日）
+    :param thresholds: 收益率阈值列表（%）
+    :param ternary: False为二分类（≥阈值为1，否则为0）；True为三分类（≥阈值为1，≤-阈值为-1，否则为0）
+    :return: 按股票、日期排序的DataFrame：date、stock_code、future_return_{N}d（float32）、
+             label_{N}d_{阈值}（int8，无未来数据为MISSING_LABEL）
+    """
+    # 1. 只排序一次，得到每行在所属股票内的行号与该股票的行数
+    data = data[[date_col, code_col, "close"]].sort_values([code_col, date_col], kind="stable")
+    codes = data[code_col].astype(str).to_numpy()
+    close = data["close"].to_numpy(dtype=np.float64)
+    starts = np.r_[0, np.flatnonzero(codes[1:] != codes[:-1]) + 1]
+    sizes = np.diff(np.r_[starts, len(codes)])
+    remaining = np.repeat(starts + sizes, sizes) - np.arange(len(codes)) - 1  # 本股票之后还有几行
+
+    out = data[[date_col, code_col]].reset_index(drop=True)
+    for horizon in horizons:
+        # 2. 未来N日收益率：同一股票内向后取第N行，跨越股票边界的位置为NaN
+        future_return = np.full(len(close), np.nan)
+        has_future = remaining >= horizon
+        rows = np.flatnonzero(has_future)
+        future_return[rows] = (close[rows + horizon] - close[rows]) / close[rows] * 100
+        out[f"future_return_{horizon}d"] = future_return.astype(np.float32)
+
+        # 3. 每个阈值一列int8标签
+        for threshold in thresholds:
+            label = (future_return >= threshold).astype(np.int8)
+            if ternary:
+                label[future_return <= -threshold] = -1
+            label[~has_future | np.isnan(future_return)] = MISSING_LABEL
+            out[label_column(horizon, threshold)] = label
+    return out
+
+
+def run_label_generation(input_path=cfg.STANDARD_DATA_FILE, output_path=cfg.LABEL_FILE,
+                         horizons=(1, 3, 5, 10), thresholds=(3.0,), ternary=False):
+    """
+    读取标准化数据（只读date、stock_code、close三列），生成多周期标签并写入parquet
+    :return: 标签DataFrame
+    """
+    data = pd.read_parquet(input_path, columns=["date", "stock_code", "close"])
+    labels = build_label_panel(data, horizons, thresholds, ternary)
+    labels.to_parquet(output_path, index=False)
+    return labels
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="一次生成多个预测周期、多个阈值的标签")
+    parser.add_argument("--horizons", type=int, nargs="+", default=[1, 3, 5, 10], help="预测周期（交易日）")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[3.0], help="收益率阈值（%%）")
+    parser.add_argument("--ternary", action="store_true", help="生成三分类标签（1/0/-1）")
+    args = parser.parse_args()
+
+    result = run_label_generation(horizons=args.horizons, thresholds=args.thresholds, ternary=args.ternary)
+    print(f"标签生成完成：{len(result)}行，标签列 {[c for c in result.columns if c.startswith('label_')]}")
@@ -1 +1,656 @@
 # 机器学习/XGBoost模型训练与评估
+"""
+滚动前推（walk-forward）模型训练
+
+与quant_project/strategy/model_training.py只做一次80/20时间切分不同，这里把2018–2025的历史
+切成若干个"训练窗口 → 测试窗口"的折（fold），每一折只用测试窗口之前的数据训练：
+- rolling：训练窗口长度固定，随测试窗口一起向前滚动
+- expanding：训练窗口起点固定，逐折变长
+训练窗口与测试窗口之间留出gap_days个交易日，避免标签（未来N日收益）跨越切分点造成前视泄露。
+
+并行与共享：
+- 特征矩阵只构建一次，按日期排序后写成.npy（FeatureCache），每一折都是其中连续的一段行
+- 各进程用内存映射打开同一份文件，操作系统共享页缓存，不会把整张特征表复制进每个进程
+- XGBoost可以从上一折的模型热启动（warm_start），此时各折有先后依赖，按顺序训练，
+  并行度交给XGBoost自身的多线程
+- 各折并行时，每个进程中模型的线程数（n_jobs）取 CPU核心数 / 进程数，避免线程总数超过CPU核心数
+
+超参数搜索（HyperparameterSearch）：
+- 模型参数与标签的预测周期、阈值一起搜索；特征矩阵只缓存一份，标签由各周期的未来收益率按阈值现算
+- 每个(试验, 折)是进程池中的一个任务，结果逐行追加到JSON Lines文件，中断后重跑只补做未完成的折
+- 逐轮减半剪枝：先在少数几折上评估全部试验，只让得分靠前的试验继续评估更多的折
+"""
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from config.strategy_params import load_strategy_params
+from main_app.utils.profiler import instrument
+
+# 各模型的默认参数（与quant_project中随机森林、XGBoost的原始设置一致）
+DEFAULT_PARAMS = {
+    "random_forest": {"n_estimators": 100, "max_depth": 6, "random_state": 42},
+    "xgboost": {"n_estimators": 100, "max_depth": 5, "learning_rate": 0.1,
+                "objective": "binary:logistic", "random_state": 42},
+}
+
+
+def create_model(model_type="xgboost", params=None):
+    """
+    创建分类模型
+    :param model_type: "xgboost" 或 "random_forest"
+    :param params: 覆盖默认参数的字典
+    :return: 未训练的模型对象
+    """
+    if model_type not in DEFAULT_PARAMS:
+        raise ValueError(f"不支持的模型类型：{model_type}，可选 {list(DEFAULT_PARAMS)}")
+    model_params = {**DEFAULT_PARAMS[model_type], **(params or {})}
+    if model_type == "xgboost":
+        import xgboost as xgb
+        return xgb.XGBClassifier(**model_params)
+    from sklearn.ensemble import RandomForestClassifier
+    return RandomForestClassifier(**model_params)
+
+
+# ---------------------- 1. 特征缓存 ----------------------
+class FeatureCache:
+    def __init__(self, root=cfg.FEATURE_CACHE_PATH):
+        """
+        特征矩阵缓存：X（float32）、y（int8）、交易日序号（int32）、日期、股票代码各存一个.npy
+        :param root: 缓存目录
+        """
+        self.root = root
+        self.meta_path = os.path.join(root, "meta.json")
+
+    def _path(self, name):
+        return os.path.join(self.root, f"{name}.npy")
+
+    @instrument("feature_cache")
+    def build(self, df, feature_cols, label_col="label", date_col="date", code_col="stock_code", extra_cols=()):
+        """
+        按日期排序构建特征矩阵并写入缓存；数据与特征列都没变时直接复用已有缓存
+        :param df: 含特征列、标签列的长表
+        :param feature_cols: 特征列
+        :param label_col: 标签列（0/1）；None表示不存y（如超参数搜索在各试验中按阈值现算标签）
+        :param extra_cols: 额外按列名各存一个float32数组的列（如future_return_5d），允许NaN
+        :return: self
+        """
+        feature_cols, extra_cols = list(feature_cols), list(extra_cols)
+        label_cols = [label_col] if label_col is not None else []
+        data = df.dropna(subset=feature_cols + label_cols)
+        data = data.sort_values([date_col, code_col], kind="stable")
+
+        # 1. 用数据内容的哈希判断缓存是否可复用
+        stored = feature_cols + label_cols + extra_cols
+        digest = hashlib.md5(json.dumps([feature_cols, label_cols, extra_cols]).encode())
+        digest.update(pd.util.hash_pandas_object(data[[date_col, code_col] + stored],
+                                                 index=False).to_numpy().tobytes())
+        key = digest.hexdigest()
+        if os.path.exists(self.meta_path) and self.meta["key"] == key:
+            return self
+
+        # 2. 写入各数组，最后写元数据（元数据存在即表示缓存完整）
+        os.makedirs(self.root, exist_ok=True)
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+        dates = data[date_col].to_numpy()
+        _, day = np.unique(dates, return_inverse=True)
+        np.save(self._path("X"), data[feature_cols].to_numpy(dtype=np.float32))
+        if label_col is not None:
+            np.save(self._path("y"), data[label_col].to_numpy(dtype=np.int8))
+        for col in extra_cols:
+            np.save(self._path(col), data[col].to_numpy(dtype=np.float32))
+        np.save(self._path("day"), day.astype(np.int32))
+        np.save(self._path("date"), dates)
+        np.save(self._path("code"), data[code_col].astype(str).to_numpy().astype("U"))
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "feature_cols": feature_cols, "label_col": label_col, "extra_cols": extra_cols,
+                       "date_col": date_col, "code_col": code_col}, f, ensure_ascii=False, indent=2)
+        return self
+
+    @property
+    def meta(self):
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def load(self, name):
+        """以内存映射方式打开一个数组（只读，多进程共享页缓存）"""
+        return np.load(self._path(name), mmap_mode="r")
+
+
+# ---------------------- 2. 折的划分 ----------------------
+def walk_forward_splits(day, train_days=500, test_days=60, step_days=None, mode="rolling", gap_days=5):
+    """
+    按交易日划分滚动前推的折
+    :param day: 按日期排序的交易日序号数组（FeatureCache中的day）
+    :param train_days: 训练窗口的交易日数（expanding模式下为第一折的训练窗口）
+    :param test_days: 测试窗口的交易日数
+    :param step_days: 相邻两折向前推进的交易日数，默认等于test_days（测试窗口首尾相接）
+    :param mode: "rolling" 或 "expanding"
+    :param gap_days: 训练窗口末尾与测试窗口之间空出的交易日数，通常取标签的预测天数
+    :return: 折列表，每折为 (train_start, train_end, test_start, test_end) 行号区间（左闭右开）
+    """
+    if mode not in ("rolling", "expanding"):
+        raise ValueError(f"mode只能是rolling或expanding，收到：{mode}")
+    step_days = step_days or test_days
+    n_days = int(day[-1]) + 1 if len(day) else 0
+    bound = lambda d: int(np.searchsorted(day, d, side="left"))  # 交易日 → 起始行号
+
+    folds = []
+    test_start = train_days + gap_days
+    while test_start < n_days:
+        train_start = 0 if mode == "expanding" else test_start - gap_days - train_days
+        train_end = test_start - gap_days
+        test_end = min(test_start + test_days, n_days)
+        folds.append((bound(train_start), bound(train_end), bound(test_start), bound(test_end)))
+        test_start += step_days
+    return folds
+
+
+# ---------------------- 3. 单折训练 ----------------------
+def _fold_metrics(y_true, proba):
+    """测试集评估：准确率、AUC、正样本比例"""
+    from sklearn.metrics import accuracy_score, roc_auc_score
+    auc = roc_auc_score(y_true, proba) if len(np.unique(y_true)) == 2 else np.nan
+    return {"accuracy": accuracy_score(y_true, proba >= 0.5), "auc": auc, "positive_rate": float(np.mean(y_true))}
+
+
+@instrument()
+def train_fold(cache_root, fold, model_type="xgboost", params=None, init_model=None):
+    """
+    训练并评估一折（可在子进程中执行，特征通过内存映射读取）
+    :param cache_root: FeatureCache目录
+    :param fold: (train_start, train_end, test_start, test_end) 行号区间
+    :param init_model: 热启动的XGBoost模型（上一折训练结果），None表示从头训练
+    :return: (结果字典, 测试集预测概率, 模型)
+    """
+    cache = FeatureCache(cache_root)
+    X, y = cache.load("X"), cache.load("y")
+    train_start, train_end, test_start, test_end = fold
+    X_train, y_train = X[train_start:train_end], y[train_start:train_end]
+    X_test, y_test = X[test_start:test_end], y[test_start:test_end]
+
+    model = create_model(model_type, params)
+    if init_model is not None:
+        model.fit(X_train, y_train, xgb_model=init_model.get_booster())
+    else:
+        model.fit(X_train, y_train)
+    proba = model.predict_proba(X_test)[:, 1].astype(np.float32)
+
+    dates = cache.load("date")
+    result = {"train_start": dates[train_start], "train_end": dates[train_end - 1],
+              "test_start": dates[test_start], "test_end": dates[test_end - 1],
+              "train_rows": train_end - train_start, "test_rows": test_end - test_start}
+    result.update(_fold_metrics(np.asarray(y_test), proba))
+    return result, proba, model
+
+
+def _train_fold_task(args):
+    """进程池任务：训练一折"""
+    return train_fold(*args)
+
+
+# ---------------------- 4. 滚动前推训练 ----------------------
+class WalkForwardTrainer:
+    def __init__(self, model_type="xgboost", params=None, train_days=500, test_days=60, step_days=None,
+                 mode="rolling", gap_days=5, warm_start=False, warm_start_rounds=20, n_workers=None,
+                 cache_root=cfg.FEATURE_CACHE_PATH):
+        """
+        初始化滚动前推训练器
+        :param model_type: "xgboost" 或 "random_forest"
+        :param params: 模型参数，覆盖DEFAULT_PARAMS
+        :param train_days: 训练窗口交易日数
+        :param test_days: 测试窗口交易日数
+        :param step_days: 每折推进的交易日数，默认等于test_days
+        :param mode: "rolling"（固定长度窗口）或 "expanding"（扩展窗口）
+        :param gap_days: 训练与测试之间的间隔交易日数（≥标签预测天数）
+        :param warm_start: 是否从上一折的XGBoost模型继续训练（仅xgboost，折之间按顺序执行）
+        :param warm_start_rounds: 热启动时每折新增的树的数量
+        :param n_workers: 并行训练的进程数，默认使用全部CPU核心；1表示在当前进程内执行
+        :param cache_root: 特征缓存目录
+        """
+        if warm_start and model_type != "xgboost":
+            raise ValueError("热启动只支持xgboost模型")
+        self.model_type = model_type
+        self.params = params or {}
+        self.train_days = train_days
+        self.test_days = test_days
+        self.step_days = step_days
+        self.mode = mode
+        self.gap_days = gap_days
+        self.warm_start = warm_start
+        self.warm_start_rounds = warm_start_rounds
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.cache = FeatureCache(cache_root)
+        self.results = None  # 每折的评估结果
+        self.predictions = None  # 全部测试窗口的样本外预测：date, stock_code, fold, proba
+        self.models = []  # 每折训练好的模型
+
+    @instrument("walk_forward")
+    def run(self, df, feature_cols, label_col="label", date_col="date", code_col="stock_code"):
+        """
+        构建特征缓存并训练全部折
+        :param df: 含特征列、标签列的长表
+        :param feature_cols: 特征列
+        :param label_col: 标签列
+        :return: 每折评估结果DataFrame
+        """
+        # 1. 构建（或复用）特征缓存，划分折
+        self.cache.build(df, feature_cols, label_col, date_col, code_col)
+        folds = walk_forward_splits(self.cache.load("day"), self.train_days, self.test_days,
+                                    self.step_days, self.mode, self.gap_days)
+        if not folds:
+            raise ValueError("数据的交易日数不足以划分出一个训练窗口和测试窗口")
+
+        # 2. 训练：热启动时按顺序逐折训练，否则各折并行
+        if self.warm_start:
+            outputs, model = [], None
+            for fold in folds:
+                params = self.params if model is None else {**self.params, "n_estimators": self.warm_start_rounds}
+                outputs.append(train_fold(self.cache.root, fold, self.model_type, params, model))
+                model = outputs[-1][2]
+        else:
+            n_pool = min(self.n_workers, len(folds))
+            if n_pool == 1:
+                tasks = [(self.cache.root, fold, self.model_type, self.params) for fold in folds]
+                outputs = [_train_fold_task(task) for task in tasks]
+            else:
+                n_threads = max(1, (os.cpu_count() or 1) // n_pool)
+                params = {**self.params, "n_jobs": n_threads}
+                tasks = [(self.cache.root, fold, self.model_type, params) for fold in folds]
+                with ProcessPoolExecutor(max_workers=n_pool) as pool:
+                    outputs = list(pool.map(_train_fold_task, tasks))
+                # 保存下来的模型用于推理，线程数恢复为用户设置（未设置时为模型默认值）
+                for _, _, model in outputs:
+                    model.set_params(n_jobs=self.params.get("n_jobs"))
+
+        # 3. 汇总各折结果与样本外预测
+        dates, codes = self.cache.load("date"), self.cache.load("code")
+        self.models = [model for _, _, model in outputs]
+        self.results = pd.DataFrame([result for result, _, _ in outputs])
+        self.results.index.name = "fold"
+        self.predictions = pd.concat([
+            pd.DataFrame({date_col: dates[test_start:test_end], code_col: codes[test_start:test_end],
+                          "fold": i, "proba": proba})
+            for i, ((_, _, test_start, test_end), (_, proba, _)) in enumerate(zip(folds, outputs))
+        ], ignore_index=True)
+        return self.results
+
+    def save_model(self, path=cfg.MODEL_FILE):
+        """保存最后一折的模型（训练数据最新），供策略引擎生成信号"""
+        if not self.models:
+            raise RuntimeError("请先调用run()完成训练")
+        import joblib
+        joblib.dump(self.models[-1], path)
+        return path
+
+
+def run_walk_forward(input_path=cfg.STANDARD_DATA_FILE, feature_cols=None, future_days=5, threshold=3.0,
+                     **trainer_kwargs):
+    """
+    从standard_data.parquet读取因子，生成标签后执行滚动前推训练，并保存最新模型
+    :param input_path: 含因子列的标准化数据文件
+    :param feature_cols: 特征列，默认全部已注册且存在于数据中的因子
+    :param future_days: 标签的预测天数（同时作为训练/测试间隔的下限）
+    :param threshold: 标签的收益率阈值（%）
+    :param trainer_kwargs: 传给WalkForwardTrainer的参数
+    :return: WalkForwardTrainer对象
+    """
+    from data_module.factor_miner import FACTOR_REGISTRY
+    from main_app.data_interface import compact_dtypes
+    from strategy_module.label_generator import build_labels
+
+    df = compact_dtypes(pd.read_parquet(input_path))
+    df["stock_code"] = df["stock_code"].astype(str)
+    feature_cols = feature_cols or [name for name in FACTOR_REGISTRY if name in df.columns]
+    labels, _ = build_labels(df, future_days, threshold)
+    data = labels[["date", "stock_code", "label"]].merge(df[["date", "stock_code"] + feature_cols],
+                                                          on=["date", "stock_code"])
+
+    trainer_kwargs.setdefault("gap_days", future_days)
+    trainer = WalkForwardTrainer(**trainer_kwargs)
+    trainer.run(data, feature_cols)
+    trainer.save_model()
+    return trainer
+
+
+# ---------------------- 5. 超参数搜索 ----------------------
+# 各模型的默认搜索空间（未列出的参数取DEFAULT_PARAMS中的值）
+DEFAULT_SEARCH_SPACE = {
+    "xgboost": {"n_estimators": [100, 200, 400], "max_depth": [3, 5, 7], "learning_rate": [0.03, 0.1, 0.3],
+                "subsample": [0.7, 1.0], "colsample_bytree": [0.6, 1.0]},
+    "random_forest": {"n_estimators": [100, 300], "max_depth": [4, 6, 10], "min_samples_leaf": [1, 20, 100]},
+}
+SEARCH_METRICS = ("rank_ic", "auc")
+
+
+def search_configs(space=None, horizons=(5,), thresholds=(3.0,), n_trials=None, seed=0):
+    """
+    展开搜索空间：模型参数网格 × 标签预测周期 × 标签阈值
+    :param space: {模型类型: {参数名: 取值列表}}，默认DEFAULT_SEARCH_SPACE
+    :param horizons: 标签预测周期列表（交易日）
+    :param thresholds: 标签收益率阈值列表（%）
+    :param n_trials: 从完整网格中随机抽取的组合数，None表示完整网格
+    :param seed: 随机抽样的种子
+    :return: 试验配置列表，每个为 {"model_type", "params", "horizon", "threshold"}
+    """
+    space = DEFAULT_SEARCH_SPACE if space is None else space
+    unknown = set(space) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"不支持的模型类型：{sorted(unknown)}，可选 {list(DEFAULT_PARAMS)}")
+    configs = []
+    for model_type, grid in space.items():
+        names = list(grid)
+        for values in itertools.product(*(grid[n] for n in names)):
+            for horizon in horizons:
+                for threshold in thresholds:
+                    configs.append({"model_type": model_type, "params": dict(zip(names, values)),
+                                    "horizon": int(horizon), "threshold": float(threshold)})
+    if n_trials is not None and n_trials < len(configs):
+        picked = np.random.default_rng(seed).choice(len(configs), n_trials, replace=False)
+        configs = [configs[i] for i in sorted(picked)]
+    return configs
+
+
+def trial_id(config):
+    """试验的稳定ID：由模型、参数、标签设置决定，用于断点续跑时识别已完成的折"""
+    return hashlib.md5(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def fold_order(n_folds):
+    """
+    剪枝时各折的评估顺序：最近一折优先，之后按van der Corput序列在时间轴上逐次二分取点，
+    任意前k折都大致均匀地覆盖整个样本期，部分折上的得分不会只反映某一段行情
+    :return: 折序号的排列
+    """
+    order, seen, i = [], set(), 0
+    while len(order) < n_folds:
+        position, base, k = 0.0, 0.5, i
+        while k:
+            position += base * (k & 1)
+            base, k = base / 2, k >> 1
+        fold = n_folds - 1 - int(position * n_folds)
+        if fold not in seen:
+            seen.add(fold)
+            order.append(fold)
+        i += 1
+    return order
+
+
+def _rank_ic(day, proba, future_return):
+    """测试窗口内逐日横截面Rank IC（预测概率 vs 未来收益率）的均值，股票数不足的交易日不计入"""
+    from strategy_module.factor_optimizer import MIN_STOCKS
+
+    frame = pd.DataFrame({"proba": proba, "future_return": future_return})
+    groups = frame.groupby(day)
+    ranks = groups.rank()
+    centered = ranks - ranks.groupby(day).transform("mean")
+    cross = (centered["proba"] * centered["future_return"]).groupby(day).sum()
+    square = (centered ** 2).groupby(day).sum()
+    ic = cross / np.sqrt(square["proba"] * square["future_return"])
+    ic = ic[(groups.size() >= MIN_STOCKS) & np.isfinite(ic)]
+    return float(ic.mean()) if len(ic) else np.nan
+
+
+def evaluate_trial_fold(cache_root, config, fold, n_threads=None):
+    """
+    训练并评估一个(试验, 折)（可在子进程中执行，特征通过内存映射读取）
+    标签由缓存中该预测周期的未来收益率按试验的阈值现算，无未来数据的行不参与训练与评估
+    :param cache_root: 搜索用的FeatureCache目录
+    :param config: 试验配置（见search_configs）
+    :param fold: (train_start, train_end, test_start, test_end) 行号区间
+    :param n_threads: 模型的线程数（多进程搜索时取1，避免线程数超过CPU核心数），None表示使用模型默认值
+    :return: 结果字典：accuracy、auc、positive_rate、rank_ic、train_rows、test_rows
+    """
+    cache = FeatureCache(cache_root)
+    X, day = cache.load("X"), cache.load("day")
+    future = cache.load(f"future_return_{config['horizon']}d")
+
+    def rows(start, end):
+        future_return = np.asarray(future[start:end])
+        keep = ~np.isnan(future_return)
+        return X[start:end][keep], future_return[keep], np.asarray(day[start:end])[keep]
+
+    train_start, train_end, test_start, test_end = fold
+    X_train, return_train, _ = rows(train_start, train_end)
+    X_test, return_test, day_test = rows(test_start, test_end)
+    y_train = (return_train >= config["threshold"]).astype(np.int8)
+    y_test = (return_test >= config["threshold"]).astype(np.int8)
+    result = {"train_rows": len(y_train), "test_rows": len(y_test)}
+    if len(np.unique(y_train)) < 2 or not len(y_test):
+        result.update({"accuracy": np.nan, "auc": np.nan, "positive_rate": np.nan, "rank_ic": np.nan})
+        return result
+
+    params = config["params"] if n_threads is None else {**config["params"], "n_jobs": n_threads}
+    model = create_model(config["model_type"], params)
+    model.fit(X_train, y_train)
+    proba = model.predict_proba(X_test)[:, 1].astype(np.float32)
+    result.update(_fold_metrics(y_test, proba))
+    result["rank_ic"] = _rank_ic(day_test, proba, return_test)
+    return result
+
+
+def _search_task(args):
+    """进程池任务：评估一个(试验, 折)，异常记录在结果中而不是中断整个搜索"""
+    cache_root, cache_key, config, fold_index, fold, n_threads = args
+    start = time.perf_counter()
+    record = {"trial_id": trial_id(config), "cache_key": cache_key, "fold": fold_index,
+              "rows": [int(v) for v in fold], **config}
+    try:
+        record.update({name: float(value) for name, value in
+                       evaluate_trial_fold(cache_root, config, fold, n_threads).items()})
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def _load_search_records(output_path):
+    """读取结果文件中的(试验, 折)记录，跳过中断时写了一半的行"""
+    records = []
+    if os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return records
+
+
+class HyperparameterSearch:
+    def __init__(self, space=None, horizons=(5,), thresholds=(3.0,), n_trials=None, metric="rank_ic", eta=3,
+                 min_folds=1, train_days=500, test_days=60, step_days=None, mode="rolling", n_workers=None,
+                 seed=0, cache_root=cfg.SEARCH_CACHE_PATH, output_path=cfg.SEARCH_RESULT_FILE, resume=True):
+        """
+        初始化超参数搜索：模型参数与标签设置（预测周期、阈值）一起搜索，按滚动前推的折评估
+
+        剪枝采用逐轮减半（successive halving）：第一轮所有试验只评估min_folds折，
+        按已评估折上的平均得分保留前1/eta，下一轮保留下来的试验评估的折数乘以eta，直到评估全部折。
+        例如300个试验、10折、eta=3时，各轮评估1、3、9、10折，共训练约700次，而完整评估需要3000次。
+
+        :param space: {模型类型: {参数名: 取值列表}}，默认DEFAULT_SEARCH_SPACE
+        :param horizons: 标签预测周期列表（交易日）
+        :param thresholds: 标签收益率阈值列表（%）
+        :param n_trials: 随机抽取的试验数，None表示完整网格
+        :param metric: 排序与剪枝使用的指标："rank_ic"（逐日Rank IC，不同标签设置之间可比）或 "auc"
+        :param eta: 每轮保留的比例为1/eta
+        :param min_folds: 第一轮评估的折数
+        :param train_days: 训练窗口交易日数
+        :param test_days: 测试窗口交易日数
+        :param step_days: 每折推进的交易日数，默认等于test_days
+        :param mode: "rolling" 或 "expanding"
+        :param n_workers: 并行的进程数，默认使用全部CPU核心；1表示在当前进程内执行
+        :param seed: 随机抽样的种子
+        :param cache_root: 搜索用的特征缓存目录（特征矩阵 + 各预测周期的未来收益率，所有试验共享）
+        :param output_path: 每个(试验, 折)一行的结果文件（JSON Lines），中断后重跑时复用已完成的折
+        :param resume: 是否复用结果文件中已完成的折
+        """
+        if metric not in SEARCH_METRICS:
+            raise ValueError(f"metric只能是{SEARCH_METRICS}之一，收到：{metric}")
+        if eta < 2:
+            raise ValueError("eta至少为2")
+        self.configs = search_configs(space, horizons, thresholds, n_trials, seed)
+        if not self.configs:
+            raise ValueError("搜索空间为空")
+        self.horizons = sorted({config["horizon"] for config in self.configs})
+        self.metric = metric
+        self.eta = eta
+        self.min_folds = max(int(min_folds), 1)
+        self.train_days = train_days
+        self.test_days = test_days
+        self.step_days = step_days
+        self.mode = mode
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.cache = FeatureCache(cache_root)
+        self.output_path = output_path
+        self.resume = resume
+        self.fold_results = None  # 每个(试验, 折)一行的评估结果
+        self.results = None  # 每个试验一行：平均指标、评估的折数、被剪枝的轮次
+
+    def prepare(self, df, feature_cols, date_col="date", code_col="stock_code"):
+        """
+        构建（或复用）搜索用的特征缓存：特征矩阵只存一份，标签相关的只有各预测周期的未来收益率
+        :param df: 含特征列与close的长表
+        :return: self
+        """
+        from strategy_module.label_generator import build_label_panel
+
+        labels = build_label_panel(df, self.horizons, thresholds=(), date_col=date_col, code_col=code_col)
+        data = df[[date_col, code_col] + list(feature_cols)].merge(labels, on=[date_col, code_col])
+        self.cache.build(data, feature_cols, None, date_col, code_col,
+                         extra_cols=[f"future_return_{h}d" for h in self.horizons])
+        return self
+
+    def _rungs(self, n_folds):
+        """各轮评估的折数：min_folds、min_folds × eta、……，最后一轮为全部折"""
+        rungs, n = [], self.min_folds
+        while n < n_folds:
+            rungs.append(n)
+            n *= self.eta
+        return rungs + [n_folds]
+
+    def _score(self, records, folds):
+        """试验在给定折上的平均得分；任一折出错记为-inf，保证被剪枝"""
+        if any("error" in records[i] for i in folds):
+            return -np.inf
+        values = [records[i][self.metric] for i in folds]
+        return float(np.nanmean(values)) if not np.all(np.isnan(values)) else -np.inf
+
+    @instrument("hyperparameter_search")
+    def run(self, df, feature_cols, date_col="date", code_col="stock_code"):
+        """
+        构建特征缓存并逐轮评估、剪枝
+        :param df: 含特征列与close的长表
+        :param feature_cols: 特征列
+        :return: 每个试验一行的结果DataFrame，按是否评估完全部折、得分降序排列
+        """
+        # 1. 缓存与折：训练/测试间隔取最长的预测周期，所有试验使用同一组折，得分可比
+        self.prepare(df, feature_cols, date_col, code_col)
+        folds = walk_forward_splits(self.cache.load("day"), self.train_days, self.test_days,
+                                    self.step_days, self.mode, max(self.horizons))
+        if not folds:
+            raise ValueError("数据的交易日数不足以划分出一个训练窗口和测试窗口")
+        cache_key = self.cache.meta["key"]
+        order = fold_order(len(folds))
+
+        # 2. 已完成的(试验, 折)：数据与折都没变时直接复用
+        records = {}
+        if self.resume:
+            for record in _load_search_records(self.output_path):
+                if record.get("cache_key") == cache_key and "error" not in record and \
+                        0 <= record["fold"] < len(folds) and tuple(record["rows"]) == folds[record["fold"]]:
+                    records.setdefault(record["trial_id"], {})[record["fold"]] = record
+
+        # 3. 逐轮评估：只训练本轮新增的折，轮末按得分保留前1/eta
+        trials = {trial_id(config): config for config in self.configs}
+        alive, pruned_at = list(trials), {}
+        n_threads = 1 if self.n_workers > 1 else None
+        os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+        pool = ProcessPoolExecutor(max_workers=self.n_workers) if self.n_workers > 1 else None
+        try:
+            with open(self.output_path, "a", encoding="utf-8") as out:
+                for n in self._rungs(len(folds)):
+                    tasks = [(self.cache.root, cache_key, trials[tid], i, folds[i], n_threads)
+                             for tid in alive for i in order[:n] if i not in records.get(tid, {})]
+                    if pool is None:
+                        outputs = map(_search_task, tasks)
+                    else:
+                        outputs = (future.result() for future in as_completed([pool.submit(_search_task, task)
+                                                                                 for task in tasks]))
+                    for record in outputs:
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        out.flush()
+                        records.setdefault(record["trial_id"], {})[record["fold"]] = record
+                    if n < len(folds):
+                        ranked = sorted(alive, key=lambda tid: self._score(records[tid], order[:n]), reverse=True)
+                        keep = max(1, -(-len(ranked) // self.eta))
+                        pruned_at.update({tid: n for tid in ranked[keep:]})
+                        alive = ranked[:keep]
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        # 4. 汇总：每个试验在已评估折上的平均指标
+        self.fold_results = pd.json_normalize([records[tid][i] for tid in trials
+                                               for i in sorted(records.get(tid, {}))])
+        rows = []
+        for tid, config in trials.items():
+            evaluated = [i for i in order if i in records.get(tid, {})][:pruned_at.get(tid, len(folds))]
+            fold_records = [records[tid][i] for i in evaluated]
+            row = {"trial_id": tid, "model_type": config["model_type"], "horizon": config["horizon"],
+                   "threshold": config["threshold"], **{f"params.{k}": v for k, v in config["params"].items()},
+                   "folds": len(evaluated), "pruned_at": pruned_at.get(tid),
+                   "score": self._score(records[tid], evaluated)}
+            for name in ("rank_ic", "auc", "accuracy", "positive_rate"):
+                values = [r.get(name, np.nan) for r in fold_records]
+                row[name] = float(np.nanmean(values)) if not np.all(np.isnan(values)) else np.nan
+            rows.append(row)
+        self.results = pd.DataFrame(rows)
+        self.results["completed"] = self.results["pruned_at"].isna()
+        self.results = self.results.sort_values(["completed", "score"], ascending=False, ignore_index=True)
+        return self.results
+
+    @property
+    def best_config(self):
+        """评估完全部折的试验中得分最高的配置"""
+        if self.results is None:
+            raise RuntimeError("请先调用run()完成搜索")
+        return dict(next(config for config in self.configs if trial_id(config) == self.results["trial_id"].iloc[0]))
+
+
+def run_search(input_path=cfg.FACTOR_DATA_FILE, feature_cols=None, params_path=cfg.STRATEGY_PARAMS_FILE,
+               summary_path=cfg.SEARCH_SUMMARY_FILE, **search_kwargs):
+    """
+    从含因子列的数据执行超参数搜索（参数取strategy_params.yaml的search一节，search_kwargs优先）
+    :param input_path: 含因子列与close的数据文件（流水线factors阶段的输出）
+    :param feature_cols: 特征列，默认全部已注册且存在于数据中的因子
+    :param params_path: 策略参数文件
+    :param summary_path: 每个试验一行的汇总表（csv），None表示不写
+    :param search_kwargs: 传给HyperparameterSearch的参数
+    :return: HyperparameterSearch对象
+    """
+    from data_module.factor_miner import FACTOR_REGISTRY
+    from main_app.data_interface import compact_dtypes
+
+    df = compact_dtypes(pd.read_parquet(input_path))
+    df["stock_code"] = df["stock_code"].astype(str)
+    feature_cols = feature_cols or [name for name in FACTOR_REGISTRY if name in df.columns]
+
+    search = HyperparameterSearch(**{**(load_strategy_params(params_path).get("search") or {}), **search_kwargs})
+    search.run(df, feature_cols)
+    if summary_path:
+        search.results.to_csv(summary_path, index=False, encoding="utf-8-sig")
+    return search
+
+
+if __name__ == "__main__":
+    wf = run_walk_forward()
+    print(wf.results)
@@ -1 +1,269 @@
 # 策略逻辑核心（信号生成）
+"""
+策略引擎：批量模型推理与信号生成
+
+- ModelCache：已加载的模型常驻内存，以模型文件内容的哈希为键；同一文件只在修改后才重新读盘。
+  缓存按LRU淘汰，被淘汰的模型即被释放。InferenceEngine对模型文件只记录路径，打分时从缓存取出（已淘汰的重新加载），
+  集成模型数超过max_models也能打分；直接传入的模型对象不放入缓存，由InferenceEngine自己持有
+- InferenceEngine：把特征整理成按日期排序、连续的float32矩阵，按大批次一次性对全部截面打分；
+  每个模型只调用一次predict_proba，概率与信号都由它得到（不再另外调用predict）；
+  多个模型（集成）共用同一份特征矩阵
+- 信号约定与signal.csv一致：1=买入，-1=卖出，0=不操作；信号写入二进制信号存储（SignalStore），CSV只是导出格式
+"""
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from config import project_config as cfg
+from main_app.utils.profiler import instrument
+
+
+class ModelCache:
+    def __init__(self, max_models=16):
+        """
+        模型缓存（LRU）
+        :param max_models: 最多常驻内存的模型数
+        """
+        self.max_models = max_models
+        self._models = OrderedDict()  # 模型哈希 → 模型对象
+        self._files = {}  # (路径, 修改时间, 文件大小) → 模型哈希
+
+    @staticmethod
+    def _file_hash(path):
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def model_hash(model):
+        """按模型序列化后的内容计算哈希"""
+        import pickle
+        return hashlib.sha1(pickle.dumps(model)).hexdigest()
+
+    def _put(self, key, model):
+        self._models[key] = model
+        self._models.move_to_end(key)
+        while len(self._models) > self.max_models:
+            evicted, _ = self._models.popitem(last=False)
+            # 文件记录随模型一起淘汰，_files的大小不超过常驻模型对应的文件数
+            self._files = {file_key: k for file_key, k in self._files.items() if k != evicted}
+
+    def load(self, path=cfg.MODEL_FILE):
+        """
+        加载模型文件：文件未变化时直接返回内存中的模型，不读盘
+        :return: (模型哈希, 模型对象)
+        """
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        key = self._files.get(file_key)
+        if key is None:
+            key = self._file_hash(path)
+            # 同一路径只保留最新版本的记录
+            self._files = {k: v for k, v in self._files.items() if k[0] != file_key[0]}
+            self._files[file_key] = key
+        if key not in self._models:
+            import joblib
+            self._put(key, joblib.load(path))
+        self._models.move_to_end(key)
+        return key, self._models[key]
+
+    def add(self, model, key=None):
+        """
+        放入一个已在内存中的模型
+        :param key: 模型哈希，None表示按模型序列化后的内容计算
+        :return: 模型哈希
+        """
+        if key is None:
+            key = self.model_hash(model)
+        self._put(key, model)
+        return key
+
+    def get(self, key):
+        """按哈希取模型"""
+        self._models.move_to_end(key)
+        return self._models[key]
+
+    def __contains__(self, key):
+        return key in self._models
+
+    def __len__(self):
+        return len(self._models)
+
+
+class InferenceEngine:
+    def __init__(self, feature_cols, cache=None, buy_threshold=0.5, sell_threshold=None, batch_size=262144):
+        """
+        初始化推理引擎
+        :param feature_cols: 特征列（顺序需与训练时一致）
+        :param cache: 共享的ModelCache，None表示新建
+        :param buy_threshold: 上涨概率 ≥ 该值时信号为1
+        :param sell_threshold: 上涨概率 < 该值时信号为-1，默认等于buy_threshold（两者之间为0）
+        :param batch_size: 每批打分的行数
+        """
+        self.feature_cols = list(feature_cols)
+        self.cache = cache if cache is not None else ModelCache()
+        self.buy_threshold = buy_threshold
+        self.sell_threshold = buy_threshold if sell_threshold is None else sell_threshold
+        self.batch_size = batch_size
+        self.models = OrderedDict()  # 模型名 → (模型哈希, 集成权重)
+        self._paths = {}  # 模型哈希 → 模型文件路径（模型由缓存持有）
+        self._instances = {}  # 模型哈希 → 直接传入的模型对象（不放入缓存）
+
+    def add_model(self, model, name=None, weight=1.0):
+        """
+        加入一个参与打分的模型
+        :param model: 模型对象或模型文件路径
+        :param name: 模型名，默认用模型哈希
+        :param weight: 集成时的权重
+        :return: 模型哈希
+        """
+        if isinstance(model, (str, os.PathLike)):
+            key, _ = self.cache.load(model)
+            self._paths[key] = model
+        else:
+            key = ModelCache.model_hash(model)
+            self._instances[key] = model
+        self.models[name or key] = (key, weight)
+        return key
+
+    def _model(self, key):
+        """按哈希取模型：直接传入的对象由引擎持有，模型文件从缓存取出（已被淘汰时重新加载）"""
+        if key in self._instances:
+            return self._instances[key]
+        if key in self.cache:
+            return self.cache.get(key)
+        path = self._paths[key]
+        loaded_key, model = self.cache.load(path)
+        if loaded_key != key:
+            raise RuntimeError(f"模型文件加入后已被修改：{path}，请重新调用add_model()")
+        return model
+
+    def feature_matrix(self, features, date_col="date", code_col="stock_code"):
+        """
+        把特征长表整理成按日期、股票排序的连续float32矩阵（每个日期的截面在矩阵中连续）
+        :return: (X, index) index为对应的date、stock_code
+        """
+        features = features.sort_values([date_col, code_col], kind="stable")
+        X = np.ascontiguousarray(features[self.feature_cols].to_numpy(dtype=np.float32))
+        return X, features[[date_col, code_col]].reset_index(drop=True)
+
+    def predict_proba(self, X, names=None):
+        """
+        各模型对同一特征矩阵的上涨概率，每个模型每批只调用一次predict_proba
+        :param X: float32特征矩阵
+        :param names: 参与打分的模型名，None表示全部
+        :return: 数组(行数 × 模型数)，float32
+        """
+        names = list(self.models) if names is None else list(names)
+        if not names:
+            raise RuntimeError("请先用add_model()加入模型")
+        proba = np.empty((len(X), len(names)), dtype=np.float32)
+        for j, name in enumerate(names):
+            model = self._model(self.models[name][0])
+            for start in range(0, len(X), self.batch_size):
+                batch = X[start:start + self.batch_size]
+                proba[start:start + len(batch), j] = model.predict_proba(batch)[:, 1]
+        return proba
+
+    @instrument("predict")
+    def predict(self, features, names=None, date_col="date", code_col="stock_code"):
+        """
+        对全部日期的截面打分，输出集成概率与交易信号
+        :param features: 特征长表（date, stock_code, 特征列）
+        :param names: 参与集成的模型名，None表示全部
+        :return: DataFrame：date、stock_code、各模型概率（proba_模型名）、proba（加权平均）、signal（int8）
+        """
+        names = list(self.models) if names is None else list(names)
+        X, result = self.feature_matrix(features, date_col, code_col)
+        proba = self.predict_proba(X, names)
+        weights = np.array([self.models[name][1] for name in names], dtype=np.float32)
+
+        for j, name in enumerate(names):
+            result[f"proba_{name}"] = proba[:, j]
+        result["proba"] = proba @ (weights / weights.sum())
+        result["signal"] = self.to_signal(result["proba"])
+        return result
+
+    def to_signal(self, proba):
+        """
+        上涨概率 → 交易信号（≥buy_threshold为1，<sell_threshold为-1，其余为0）
+        :param proba: 概率数组
+        :return: int8数组
+        """
+        proba = np.asarray(proba)
+        return np.where(proba >= self.buy_threshold, 1, np.where(proba < self.sell_threshold, -1, 0)).astype(np.int8)
+
+    def predict_latest(self, features, names=None, date_col="date", code_col="stock_code"):
+        """只对最新一个交易日的截面打分（每日盘后生成信号用）"""
+        latest = features[features[date_col] == features[date_col].max()]
+        return self.predict(latest, names, date_col, code_col)
+
+
+def generate_signal(features, model_paths=(cfg.MODEL_FILE,), feature_cols=None, signal_path=cfg.SIGNAL_FILE,
+                    engine=None, store_path=cfg.SIGNAL_STORE_PATH, append=False, risk_manager=None, price_df=None):
+    """
+    用一个或多个模型生成信号，写入二进制信号存储（回测读取），并可导出signal.csv
+    :param features: 特征长表
+    :param model_paths: 模型文件路径列表（多个时做等权集成）
+    :param feature_cols: 特征列，默认为模型记录的特征名（feature_names_in_）
+    :param signal_path: 导出的signal.csv路径（date, stock_code, signal, confidence），None表示不导出
+    :param engine: 复用的InferenceEngine（模型已在内存中时传入，避免重复加载）
+    :param store_path: 二进制信号存储目录，None表示不写入
+    :param append: True时只追加新交易日的信号（每日盘后），False时覆盖全部历史信号
+    :param risk_manager: 可选的RiskManager，写入前对信号施加止损与熔断规则（需同时传入price_df）；
+        追加时连同存储中的历史信号一起计算，持仓的入场价、最高价与止损状态延续到新交易日
+    :param price_df: 价格长表（date, stock_code, close），覆盖信号的全部历史
+    :return: 信号DataFrame
+    """
+    if engine is None:
+        cache = ModelCache()
+        if feature_cols is None:
+            _, first_model = cache.load(model_paths[0])
+            feature_cols = list(getattr(first_model, "feature_names_in_"))
+        engine = InferenceEngine(feature_cols, cache)
+        for path in model_paths:
+            engine.add_model(path)
+    signals = engine.predict(features)
+    store = None
+    if store_path is not None:
+        from main_app.data_interface import SignalStore
+
+        store = SignalStore(store_path)
+    if risk_manager is not None:
+        if price_df is None:
+            raise ValueError("施加风控规则需要传入price_df")
+        signals = _apply_risk(signals, price_df, risk_manager, engine, store if append else None)
+    if store is not None:
+        (store.append if append else store.write)(signals, confidence_col="proba")
+    if signal_path is not None:
+        signals[["date", "stock_code", "signal", "proba"]].rename(columns={"proba": "confidence"}).to_csv(
+            signal_path, index=False)
+    return signals
+
+
+def _apply_risk(signals, price_df, risk_manager, engine, store=None):
+    """
+    对新生成的信号施加风控
+    追加模式下止损依赖整段持仓的入场价与最高价，只看新交易日无法判断，因此先把存储中的历史信号接在前面一起计算，
+    再只取出新交易日的结果。历史信号用存储的置信度按当前阈值还原为风控前的原始信号（置信度缺失时沿用存储的信号），
+    与一次性对全部历史生成信号的结果一致
+    :param signals: 新交易日的信号长表（engine.predict的输出）
+    :param price_df: 价格长表，需覆盖历史信号与新信号的全部日期
+    :param store: 追加写入的SignalStore，None或为空时只对signals本身计算
+    :return: signal列已调整的信号长表
+    """
+    if store is None or len(store) == 0:
+        return risk_manager.adjust_signal_frame(signals, price_df)
+
+    history = store.read()
+    confidence = history["confidence"].to_numpy()
+    raw = np.where(np.isnan(confidence), history["signal"].to_numpy(), engine.to_signal(confidence))
+    combined = pd.concat([history[["date", "stock_code"]].assign(signal=raw.astype(np.int8)),
+                          signals[["date", "stock_code", "signal"]]], ignore_index=True)
+    adjusted = risk_manager.adjust_signal_frame(combined, price_df)
+    return signals.assign(signal=adjusted["signal"].to_numpy()[len(history):])
@@ -0,0 +1,21 @@
+# 测试公共配置
+"""
+测试公共配置：把项目根目录加入sys.path（各模块使用 from config import ... 的绝对导入），
+并提供小规模的合成行情供各测试共用
+"""
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+
+@pytest.fixture(scope="session")
+def market():
+    """30只股票、120个交易日的合成行情（含停牌与缺失值）"""
+    from data_module.synthetic_market import generate_market
+
+    return generate_market(30, 120, seed=7)
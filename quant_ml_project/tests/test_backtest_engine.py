@@ -0,0 +1,42 @@
+# 回测引擎测试
+import numpy as np
+import pandas as pd
+
+from backtest_module.backtest_engine import BacktestEngine, PanelBacktestEngine
+
+
+def random_panel(n_days=150, n_stocks=12, seed=3):
+    """随机信号（含重复买入、空仓卖出）与无缺失的价格宽表"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2023-01-02", periods=n_days, name="date")
+    columns = pd.Index([f"{i:06d}" for i in range(n_stocks)], name="stock_code")
+    signals = pd.DataFrame(rng.choice([-1, 0, 1], size=(n_days, n_stocks), p=[0.1, 0.8, 0.1]).astype(np.int8),
+                           index=index, columns=columns)
+    prices = pd.DataFrame(10 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_stocks)), axis=0)),
+                          index=index, columns=columns)
+    return signals, prices
+
+
+def test_panel_engine_matches_loop_engine():
+    signals, prices = random_panel()
+    panel = PanelBacktestEngine(initial_capital=100000).run(signals, prices)
+    performance = panel.calculate_performance()
+    for code in signals.columns:
+        loop = BacktestEngine(initial_capital=100000)
+        loop.run(signals[code].tolist(), prices[code].tolist())
+        np.testing.assert_allclose(panel.capital[code].to_numpy(), loop.daily_capital, rtol=1e-12)
+        expected = loop.calculate_performance()
+        for metric in ("total_return", "max_drawdown", "win_rate"):
+            assert np.isclose(performance.loc[code, metric], expected[metric], rtol=1e-12, atol=1e-12)
+        loop_profits = [profit for _, _, profit in loop.trades]
+        panel_profits = panel.trades.loc[(panel.trades["stock_code"] == code)
+                                         & (panel.trades["side"] == "sell"), "profit"]
+        np.testing.assert_allclose(panel_profits.to_numpy(), loop_profits, rtol=1e-12)
+
+
+def test_panel_engine_ignores_signals_without_price():
+    signals, prices = random_panel(n_days=40, n_stocks=3)
+    prices.iloc[5:10, 0] = np.nan
+    signals.iloc[5:10, 0] = 1
+    panel = PanelBacktestEngine().run(signals, prices)
+    assert not panel.trades["price"].isna().any()
@@ -0,0 +1,45 @@
+# 批量回测测试
+import json
+import logging
+import os
+
+import numpy as np
+import pytest
+
+from backtest_module.param_sweep import sweep_ma_cross
+from scripts.batch_backtest import build_shared_panel, expand_grid, job_id, load_results, run_batch
+
+
+@pytest.fixture
+def panel_root(tmp_path, market):
+    root = os.fspath(tmp_path / "panel")
+    build_shared_panel(market, ["close"], root)
+    return root
+
+
+def test_results_match_direct_sweep_and_resume(tmp_path, panel_root, market):
+    jobs = expand_grid("ma_cross", {"short": [5, 10], "long": [20, 30]})
+    output = os.fspath(tmp_path / "results.jsonl")
+    assert run_batch(jobs, panel_root, output, n_workers=2) == len(jobs)
+    assert run_batch(jobs, panel_root, output, n_workers=2) == 0
+
+    results = load_results(output).set_index("job_id")
+    prices = market.pivot(index="date", columns="stock_code", values="close").astype(np.float32)
+    for job in jobs:
+        params = job["params"]
+        expected = sweep_ma_cross(prices, [params["short"]], [params["long"]], [0.001])
+        for metric in ("total_return", "max_drawdown", "sharpe"):
+            assert np.isclose(results.loc[job_id(job), metric], expected[metric].mean(), rtol=1e-9)
+        assert results.loc[job_id(job), "max_drawdown"] <= 0
+
+
+def test_stale_rows_are_skipped_and_logged(tmp_path, panel_root, caplog):
+    jobs = expand_grid("ma_cross", {"short": [5], "long": [20]})
+    output = tmp_path / "results.jsonl"
+    stale = {"job_id": job_id(jobs[0]), "strategy": "ma_cross", "max_drawdown": 0.1}
+    output.write_text(json.dumps(stale) + "\n", encoding="utf-8")
+    with caplog.at_level(logging.WARNING, logger="quant"):
+        assert load_results(os.fspath(output)).empty
+        assert run_batch(jobs, panel_root, os.fspath(output), n_workers=1) == 1
+    assert "1行" in caplog.text
+    assert len(load_results(os.fspath(output))) == 1
@@ -0,0 +1,40 @@
+# 数据清洗测试
+import numpy as np
+import pandas as pd
+
+from data_module.data_cleaner import clean_data, clean_per_stock
+from data_module.synthetic_market import write_market
+
+
+def test_parquet_input_matches_frame_input(tmp_path):
+    """子进程按股票分批读取parquet的结果与传入整张表一致"""
+    path = tmp_path / "raw_data.parquet"
+    raw = write_market(path, n_stocks=12, n_days=120, seed=5)
+    expected = clean_per_stock(raw, n_workers=1)
+    pd.testing.assert_frame_equal(clean_per_stock(path, n_workers=2), expected)
+    pd.testing.assert_frame_equal(clean_per_stock(path, n_workers=1), expected)
+
+
+def test_suspension_fill_rules():
+    dates = pd.bdate_range("2024-01-01", periods=20)
+    full = pd.DataFrame({"date": dates, "stock_code": "000002", "close": 1.0, "volume": 100.0})
+    stock = pd.DataFrame({"date": dates, "stock_code": "000001", "close": np.arange(20.0) + 1,
+                          "volume": 100.0})
+    stock.loc[5, "close"] = np.nan  # 原始数据中只缺价格：填充价格，成交量保留，不算停牌
+    stock = stock.drop(index=[8, 9] + list(range(11, 18)))  # 2天停牌（可填充）+ 7天停牌（超过上限）
+    cleaned = clean_per_stock(pd.concat([stock, full]), max_fill_days=5, n_workers=1)
+    result = cleaned[cleaned["stock_code"] == "000001"].set_index("date")
+
+    assert result.loc[dates[5], "close"] == 5.0
+    assert result.loc[dates[5], "volume"] == 100 and result.loc[dates[5], "suspended"] == 0
+    assert (result.loc[dates[8:10], "close"] == 8.0).all()
+    assert (result.loc[dates[8:10], "volume"] == 0).all() and (result.loc[dates[8:10], "suspended"] == 1).all()
+    assert (result.loc[dates[11:16], "suspended"] == 1).all()
+    assert not result.index.isin(dates[16:18]).any()
+
+
+def test_clean_data_writes_output(tmp_path):
+    raw_path, out_path = tmp_path / "raw_data.parquet", tmp_path / "standard_data.parquet"
+    write_market(raw_path, n_stocks=5, n_days=60, seed=2)
+    cleaned = clean_data(raw_path, out_path, n_workers=1)
+    assert len(pd.read_parquet(out_path)) == len(cleaned)
@@ -0,0 +1,58 @@
+# 数据抓取调度器测试
+import os
+
+import pandas as pd
+
+from data_module.data_fetcher import FetchCheckpoint, FetchScheduler, LocalStubSource
+
+
+class UnpublishedTodaySource(LocalStubSource):
+    """当天的日线尚未发布：只返回到昨天为止的数据"""
+
+    def fetch(self, symbol, start_date, end_date):
+        df = super().fetch(symbol, start_date, end_date)
+        return df[df["date"] < pd.Timestamp.today().normalize()]
+
+
+def test_checkpoint_merges_ranges_and_reports_gaps(tmp_path):
+    checkpoint = FetchCheckpoint(os.fspath(tmp_path / "checkpoint.json"))
+    checkpoint.mark_done("stub", "000001", "2024-01-01", "2024-01-10")
+    checkpoint.mark_done("stub", "000001", "2024-01-11", "2024-01-20")
+    checkpoint.mark_done("stub", "000001", "2024-02-01", "2024-02-10")
+    reloaded = FetchCheckpoint(os.fspath(tmp_path / "checkpoint.json"))
+    gaps = reloaded.missing_ranges("stub", "000001", "2023-12-25", "2024-02-15")
+    assert gaps == [(pd.Timestamp("2023-12-25"), pd.Timestamp("2023-12-31")),
+                    (pd.Timestamp("2024-01-21"), pd.Timestamp("2024-01-31")),
+                    (pd.Timestamp("2024-02-11"), pd.Timestamp("2024-02-15"))]
+
+
+def test_resume_fetches_only_missing_ranges(tmp_path):
+    symbols = ["000001", "000002", "000003"]
+    source = LocalStubSource()
+    scheduler = FetchScheduler(source, os.fspath(tmp_path), max_workers=3)
+    scheduler.run(symbols, "2023-01-01", "2023-06-30")
+    assert source.calls == len(symbols)
+    scheduler.run(symbols, "2023-01-01", "2023-06-30")
+    assert source.calls == len(symbols)
+
+    extended = scheduler.run(symbols, "2023-01-01", "2023-12-31")
+    assert source.calls == 2 * len(symbols)
+    fresh = FetchScheduler(LocalStubSource(), os.fspath(tmp_path / "fresh")).run(symbols, "2023-01-01", "2023-12-31")
+    sort = lambda df: df.sort_values(["stock_code", "date"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(sort(extended), sort(fresh))
+
+
+def test_failed_requests_are_retried(tmp_path):
+    source = LocalStubSource(failure_rate=0.5, seed=3)
+    scheduler = FetchScheduler(source, os.fspath(tmp_path), max_workers=2, max_retries=10, backoff_base=0.0)
+    result = scheduler.run(["000001", "000002", "000003", "000004"], "2023-01-01", "2023-03-31")
+    assert not scheduler.failures
+    assert result["stock_code"].nunique() == 4 and source.calls > 4
+
+
+def test_unpublished_today_is_requested_again(tmp_path):
+    today = pd.Timestamp.today().normalize()
+    scheduler = FetchScheduler(UnpublishedTodaySource(), os.fspath(tmp_path))
+    scheduler.run(["000001"], today - pd.Timedelta(days=30), today)
+    gaps = scheduler.checkpoint.missing_ranges("stub", "000001", today - pd.Timedelta(days=30), today)
+    assert gaps == [(today, today)]
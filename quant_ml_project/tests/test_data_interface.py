@@ -0,0 +1,61 @@
+# 列式行情存储测试
+import os
+
+import numpy as np
+import pandas as pd
+
+from main_app.data_interface import MarketDataStore, build_store_from_parquet, get_clean_data
+
+DATES = pd.bdate_range("2015-12-01", "2016-02-29")
+
+
+def frame(dates, codes, columns=("open", "close", "volume")):
+    df = pd.MultiIndex.from_product([codes, dates], names=["stock_code", "date"]).to_frame(index=False)
+    df = df[["date", "stock_code"]]
+    for k, col in enumerate(columns):
+        df[col] = np.arange(len(df), dtype=np.float64) + k
+    if "volume" in columns:
+        df["volume"] = df["volume"].astype(np.int64)
+    return df
+
+
+def test_round_trip(tmp_path, market):
+    store = MarketDataStore(os.fspath(tmp_path / "store"))
+    store.write(market)
+    result = MarketDataStore(os.fspath(tmp_path / "store")).read()
+    expected = market.assign(stock_code=market["stock_code"].astype(str))
+    expected = expected.sort_values(["stock_code", "date"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False)
+
+
+def test_overlapping_write_keeps_other_dates_and_columns(tmp_path):
+    store = MarketDataStore(os.fspath(tmp_path / "store"))
+    store.write(frame(DATES[:40], ["000001"]))
+    store.write(frame(DATES[30:], ["000001"], columns=("close",)).assign(close=-1.0))
+    result = store.read(stocks=["000001"])
+    assert len(result) == len(DATES)
+    assert (result["close"].iloc[30:] == -1).all()
+    assert (result["close"].iloc[:30] >= 0).all()
+    # 本次未提供的列：已有日期保留原值，新日期为缺失值
+    assert result["open"].iloc[:40].notna().all() and result["open"].iloc[40:].isna().all()
+    assert result["volume"].iloc[:40].notna().all() and result["volume"].iloc[40:].isna().all()
+
+
+def test_column_missing_in_some_partitions_reads_as_nan(tmp_path):
+    store = MarketDataStore(os.fspath(tmp_path / "store"))
+    store.write(frame(DATES, ["000001"]))
+    store.write(frame(DATES[:10], ["000002"], columns=("open", "close", "volume", "amount")))
+    result = store.read(columns=["amount"])
+    assert result.loc[result["stock_code"] == "000001", "amount"].isna().all()
+    assert result.loc[result["stock_code"] == "000002", "amount"].notna().all()
+
+
+def test_stale_store_is_rebuilt_from_its_parquet(tmp_path):
+    parquet_path = os.fspath(tmp_path / "standard_data.parquet")
+    store_root = os.fspath(tmp_path / "store")
+    frame(DATES[:20], ["000001"]).to_parquet(parquet_path)
+    build_store_from_parquet(parquet_path, store_root)
+    frame(DATES[:30], ["000001"]).to_parquet(parquet_path)
+    newer = os.path.getmtime(os.path.join(store_root, "meta.json")) + 10
+    os.utime(parquet_path, (newer, newer))
+    assert len(get_clean_data(store_root=store_root, parquet_path=parquet_path, compact=False)) == 30
@@ -0,0 +1,50 @@
+# 因子评估测试
+import numpy as np
+from scipy import stats
+
+from strategy_module.factor_optimizer import MIN_STOCKS, _CrossSection, _fast_corr
+
+
+def random_wide(n_days=60, n_stocks=25, seed=5):
+    """
+    两张宽表：前一半的行有效位置相同（走z-score快速路径），后一半各自随机缺失；
+    含并列值，另有几行有效股票数不足MIN_STOCKS
+    """
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(n_days, n_stocks)).round(1)
+    y = 0.3 * x + rng.normal(size=(n_days, n_stocks))
+    x[:, :3] = np.nan
+    y[:, :3] = np.nan
+    half = n_days // 2
+    x[half:][rng.random((n_days - half, n_stocks)) < 0.2] = np.nan
+    y[half:][rng.random((n_days - half, n_stocks)) < 0.2] = np.nan
+    x[5, 3 + MIN_STOCKS - 1:] = np.nan
+    y[5, 3 + MIN_STOCKS - 1:] = np.nan
+    return x, y
+
+
+def reference(x, y, rank):
+    """逐行在两者都有值的位置上用scipy计算相关系数"""
+    out = np.full(len(x), np.nan)
+    for t in range(len(x)):
+        mask = ~(np.isnan(x[t]) | np.isnan(y[t]))
+        if mask.sum() >= MIN_STOCKS:
+            func = stats.spearmanr if rank else stats.pearsonr
+            out[t] = func(x[t][mask], y[t][mask])[0]
+    return out
+
+
+def test_fast_corr_matches_scipy():
+    x, y = random_wide()
+    a, b = _CrossSection(x), _CrossSection(y)
+    for rank in (False, True):
+        np.testing.assert_allclose(_fast_corr(a, b, rank=rank), reference(x, y, rank), rtol=1e-10, atol=1e-12)
+    assert np.isnan(_fast_corr(a, b, rank=True)[5])
+
+
+def test_fast_corr_with_row_offset_matches_scipy():
+    x, y = random_wide()
+    a, b = _CrossSection(x), _CrossSection(y)
+    lag = 3
+    corr = _fast_corr(a, b, rank=True, a_rows=slice(0, len(x) - lag), b_rows=slice(lag, None))
+    np.testing.assert_allclose(corr, reference(x[:-lag], y[lag:], rank=True), rtol=1e-10, atol=1e-12)
@@ -0,0 +1,30 @@
+# 标签生成测试
+import numpy as np
+import pandas as pd
+
+from strategy_module.label_generator import (MISSING_LABEL, build_label_panel, calculate_future_return,
+                                             generate_label, label_column)
+
+
+def test_label_panel_matches_single_horizon_labels(market):
+    data = market.sample(frac=1.0, random_state=0)  # 打乱顺序，验证按股票、日期排序
+    horizons, thresholds = (1, 5, 10), (0.0, 3.0)
+    panel = build_label_panel(data, horizons, thresholds)
+    assert len(panel) == len(data)
+    for horizon in horizons:
+        for threshold in thresholds:
+            expected = generate_label(calculate_future_return(data, horizon), threshold)
+            column = label_column(horizon, threshold)
+            got = panel[panel[column] != MISSING_LABEL]
+            pd.testing.assert_frame_equal(got[["date", "stock_code"]].reset_index(drop=True),
+                                          expected[["date", "stock_code"]].reset_index(drop=True))
+            np.testing.assert_array_equal(got[column].to_numpy(), expected["label"].to_numpy())
+            np.testing.assert_allclose(got[f"future_return_{horizon}d"].to_numpy(),
+                                       expected["future_return"].to_numpy(), rtol=1e-6)
+
+
+def test_ternary_labels():
+    data = pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=4),
+                         "stock_code": "000001", "close": [10.0, 10.5, 10.1, 10.0]})
+    panel = build_label_panel(data, horizons=(1,), thresholds=(3.0,), ternary=True)
+    assert panel["label_1d_3"].tolist() == [1, -1, 0, MISSING_LABEL]
@@ -0,0 +1,56 @@
+# 流水线缓存测试
+import itertools
+import os
+
+from main_app.main_pipeline import Pipeline
+
+
+def build_pipeline(tmp_path, produce_a, config=None):
+    """两阶段流水线：a写出a.txt，b把a.txt转成大写写入b.txt"""
+    a_path, b_path = tmp_path / "a.txt", tmp_path / "b.txt"
+
+    def stage_a(**kwargs):
+        a_path.write_text(produce_a())
+
+    def stage_b():
+        b_path.write_text(a_path.read_text().upper())
+
+    pipeline = Pipeline(os.fspath(tmp_path / "cache"), max_workers=1)
+    pipeline.add_stage("a", stage_a, config=config, outputs=[os.fspath(a_path)])
+    pipeline.add_stage("b", stage_b, deps=["a"], outputs=[os.fspath(b_path)])
+    return pipeline
+
+
+def statuses(report):
+    return {name: item["status"] for name, item in report.items()}
+
+
+def test_second_run_is_cached(tmp_path):
+    produce = lambda: "same"
+    assert statuses(build_pipeline(tmp_path, produce).run()) == {"a": "ran", "b": "ran"}
+    assert statuses(build_pipeline(tmp_path, produce).run()) == {"a": "cached", "b": "cached"}
+
+
+def test_changed_upstream_output_invalidates_downstream(tmp_path):
+    counter = itertools.count()
+    produce = lambda: f"a{next(counter)}"
+    build_pipeline(tmp_path, produce).run()
+    report = build_pipeline(tmp_path, produce).run(force=["a"])
+    assert statuses(report) == {"a": "ran", "b": "ran"}
+    assert (tmp_path / "b.txt").read_text() == "A1"
+
+
+def test_unchanged_upstream_output_keeps_downstream_cache(tmp_path):
+    produce = lambda: "same"
+    build_pipeline(tmp_path, produce).run()
+    report = build_pipeline(tmp_path, produce).run(force=["a"])
+    assert statuses(report) == {"a": "ran", "b": "cached"}
+
+
+def test_config_change_reruns_and_old_artifacts_are_restored(tmp_path):
+    build_pipeline(tmp_path, lambda: "one", config={"x": 1}).run()
+    build_pipeline(tmp_path, lambda: "two", config={"x": 2}).run()
+    assert (tmp_path / "b.txt").read_text() == "TWO"
+    report = build_pipeline(tmp_path, lambda: "unused", config={"x": 1}).run()
+    assert statuses(report) == {"a": "restored", "b": "restored"}
+    assert (tmp_path / "b.txt").read_text() == "ONE"
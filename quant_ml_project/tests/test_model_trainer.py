@@ -0,0 +1,105 @@
+# 模型训练测试
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from strategy_module.model_trainer import (FeatureCache, HyperparameterSearch, WalkForwardTrainer, fold_order,
+                                          trial_id, walk_forward_splits)
+
+
+@pytest.fixture(scope="module")
+def training_frame():
+    """120个交易日 × 20只股票，标签与第一个特征相关"""
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2023-01-02", periods=120)
+    frame = pd.MultiIndex.from_product([dates, [f"{i:06d}" for i in range(20)]],
+                                       names=["date", "stock_code"]).to_frame(index=False)
+    features = rng.normal(size=(len(frame), 3)).astype(np.float32)
+    frame[["f1", "f2", "f3"]] = features
+    frame["label"] = (features[:, 0] + rng.normal(0, 1, len(frame)) > 0).astype(np.int8)
+    return frame
+
+
+def test_walk_forward_splits_leave_gap_and_do_not_overlap():
+    day = np.repeat(np.arange(100), 3)
+    folds = walk_forward_splits(day, train_days=30, test_days=20, gap_days=5)
+    assert len(folds) == 4
+    for train_start, train_end, test_start, test_end in folds:
+        assert day[train_end - 1] + 5 < day[test_start]
+        assert train_end - train_start == 30 * 3
+    assert all(prev[3] == nxt[2] for prev, nxt in zip(folds, folds[1:]))
+    expanding = walk_forward_splits(day, train_days=30, test_days=20, gap_days=5, mode="expanding")
+    assert all(fold[0] == 0 for fold in expanding)
+
+
+def test_feature_cache_is_reused(tmp_path, training_frame):
+    cache = FeatureCache(os.fspath(tmp_path / "cache"))
+    cache.build(training_frame, ["f1", "f2"])
+    written = os.path.getmtime(cache._path("X"))
+    os.utime(cache._path("X"), (written - 100, written - 100))
+    cache.build(training_frame.sample(frac=1.0, random_state=0), ["f1", "f2"])
+    assert os.path.getmtime(cache._path("X")) == written - 100
+    cache.build(training_frame, ["f1", "f3"])
+    assert os.path.getmtime(cache._path("X")) != written - 100
+
+
+def test_parallel_folds_match_serial(tmp_path, training_frame):
+    kwargs = dict(model_type="xgboost", params={"n_estimators": 10}, train_days=40, test_days=20, gap_days=5)
+    serial = WalkForwardTrainer(n_workers=1, cache_root=os.fspath(tmp_path / "serial"), **kwargs)
+    parallel = WalkForwardTrainer(n_workers=2, cache_root=os.fspath(tmp_path / "parallel"), **kwargs)
+    serial.run(training_frame, ["f1", "f2", "f3"])
+    parallel.run(training_frame, ["f1", "f2", "f3"])
+    assert len(serial.results) == 4
+    pd.testing.assert_frame_equal(parallel.results, serial.results)
+    pd.testing.assert_frame_equal(parallel.predictions, serial.predictions)
+    assert all(model.get_params()["n_jobs"] is None for model in parallel.models)
+
+
+@pytest.fixture(scope="module")
+def factor_frame(market):
+    """在合成行情上加几个简单的价量特征，供超参数搜索使用"""
+    frame = market.sort_values(["stock_code", "date"], ignore_index=True)
+    close = frame.groupby("stock_code")["close"]
+    frame["ret_1"] = close.pct_change(fill_method=None)
+    frame["ret_5"] = close.pct_change(5, fill_method=None)
+    frame["volume_change"] = frame.groupby("stock_code")["volume"].pct_change(fill_method=None)
+    features = ["ret_1", "ret_5", "volume_change"]
+    frame[features] = frame[features].replace([np.inf, -np.inf], np.nan).fillna(0.0).astype(np.float32)
+    return frame, features
+
+
+def test_fold_order_is_a_permutation_starting_from_latest():
+    for n in (1, 2, 5, 10):
+        order = fold_order(n)
+        assert sorted(order) == list(range(n))
+        assert order[0] == n - 1
+
+
+def test_search_prunes_by_rung_and_resumes(tmp_path, factor_frame):
+    frame, features = factor_frame
+    kwargs = dict(space={"random_forest": {"n_estimators": [5], "max_depth": [1, 2, 3, 4, 5, 6]}},
+                  horizons=(5,), thresholds=(0.0,), eta=3, train_days=30, test_days=10, n_workers=1,
+                  cache_root=os.fspath(tmp_path / "cache"), output_path=os.fspath(tmp_path / "search.jsonl"))
+    search = HyperparameterSearch(**kwargs)
+    results = search.run(frame, features)
+    n_folds = len(walk_forward_splits(search.cache.load("day"), 30, 10, gap_days=5))
+    rungs = search._rungs(n_folds)
+    assert rungs[0] == 1 and rungs[-1] == n_folds and len(rungs) == 3
+
+    # 每轮保留前1/eta：6个试验 → 2个 → 1个评估完全部折
+    assert results["completed"].sum() == 1
+    assert (results.loc[~results["completed"], "folds"] == results.loc[~results["completed"], "pruned_at"]).all()
+    assert results["pruned_at"].value_counts().to_dict() == {rungs[0]: 4, rungs[1]: 1}
+    assert results.loc[0, "folds"] == n_folds
+    assert trial_id(search.best_config) == results.loc[0, "trial_id"]
+
+    # 断点续跑：数据与折都没变时不再训练
+    with open(kwargs["output_path"], encoding="utf-8") as f:
+        n_records = sum(1 for _ in f)
+    assert n_records == 4 * rungs[0] + rungs[1] + n_folds
+    resumed = HyperparameterSearch(**kwargs).run(frame, features)
+    with open(kwargs["output_path"], encoding="utf-8") as f:
+        assert sum(1 for _ in f) == n_records
+    pd.testing.assert_frame_equal(resumed, results)
@@ -0,0 +1,44 @@
+# 均线交叉参数扫描测试
+import numpy as np
+import pandas as pd
+
+from backtest_module.param_sweep import sweep_ma_cross
+
+
+def ma_cross_reference(close, short, long, cost):
+    """逐参数对、逐标的按 均线趋势法.backtest_ma_cross 的写法回测（不画图），回撤取非正数"""
+    df = pd.DataFrame({"收盘价": close.ffill().dropna()})
+    ma_short = df["收盘价"].rolling(short, min_periods=1).mean()
+    ma_long = df["收盘价"].rolling(long, min_periods=1).mean()
+    golden = (ma_short > ma_long) & (ma_short.shift(1) <= ma_long.shift(1))
+    death = (ma_short < ma_long) & (ma_short.shift(1) >= ma_long.shift(1))
+    signal = pd.Series(0, index=df.index)
+    signal[golden] = 1
+    signal[death] = -1
+    position = pd.Series(np.where(signal == 1, 1, np.where(signal == -1, 0, np.nan)), index=df.index).ffill().fillna(0)
+    daily = position.shift(1) * df["收盘价"].pct_change()
+    daily -= signal.shift(1).apply(lambda x: cost if x == 1 else 0)
+    daily = daily.dropna()
+    nav = (1 + daily).cumprod()
+    return {
+        "total_return": nav.iloc[-1] - 1,
+        "annual_return": nav.iloc[-1] ** (252 / len(daily)) - 1,
+        "max_drawdown": (nav / nav.cummax()).min() - 1,
+        "sharpe": np.sqrt(252) * daily.mean() / (daily.std() + 1e-6),
+        "trade_count": int(golden.sum() + death.sum()),
+    }
+
+
+def test_batched_sweep_matches_single_backtest(market):
+    price_matrix = market.pivot(index="date", columns="stock_code", values="close").astype(np.float64)
+    price_matrix = price_matrix.iloc[:, :8]
+    # 最小批量使每个参数对单独成批，验证分批与一次堆叠的结果相同
+    results = sweep_ma_cross(price_matrix, short_windows=(3, 5, 10), long_windows=(10, 20), costs=(0.0, 0.001),
+                             max_cells=1)
+    batched = sweep_ma_cross(price_matrix, short_windows=(3, 5, 10), long_windows=(10, 20), costs=(0.0, 0.001))
+    pd.testing.assert_frame_equal(results, batched)
+    assert len(results) == 5 * 2 * price_matrix.shape[1]
+    for row in results.itertuples(index=False):
+        expected = ma_cross_reference(price_matrix[row.stock_code], row.short, row.long, row.cost)
+        for metric, value in expected.items():
+            assert np.isclose(getattr(row, metric), value, rtol=1e-9, atol=1e-12), (row, metric)
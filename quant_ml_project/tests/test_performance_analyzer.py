@@ -0,0 +1,109 @@
+# 绩效指标测试
+import numpy as np
+import pandas as pd
+
+from backtest_module.performance_analyzer import (METRIC_NAMES, ROBUST_METRICS, PerformanceAccumulator, _simulate,
+                                                  batch_performance, bootstrap_analysis, path_metrics,
+                                                  trade_shuffle_analysis)
+
+
+def random_nav(n_days=200, n_cols=5, seed=1):
+    """随机游走净值宽表，后几列晚开始（开始前为NaN）"""
+    rng = np.random.default_rng(seed)
+    nav = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_cols)), axis=0)),
+                       columns=[f"{i:06d}" for i in range(n_cols)])
+    for i in range(1, n_cols):
+        nav.iloc[:i * 20, i] = np.nan
+    return nav
+
+
+def random_trades(columns, seed=2):
+    """随机成交：开仓的profit为NaN"""
+    rng = np.random.default_rng(seed)
+    n = 60
+    return pd.DataFrame({"stock_code": rng.choice(columns, n), "amount": rng.uniform(-5e4, 5e4, n),
+                         "profit": np.where(rng.random(n) < 0.5, np.nan, rng.normal(0, 100, n))})
+
+
+def full_pass(values, annual_days=252, risk_free_rate=0.0):
+    """一次完整回扫的指标（pandas写法），作为两种形式的参照"""
+    values = values.dropna()
+    returns = values.pct_change().dropna()
+    total_return = values.iloc[-1] / values.iloc[0] - 1
+    std = returns.std(ddof=1)
+    return {
+        "total_return": total_return,
+        "annual_return": (1 + total_return) ** (annual_days / len(returns)) - 1,
+        "volatility": std * np.sqrt(annual_days),
+        "sharpe": (returns.mean() - risk_free_rate / annual_days) / std * np.sqrt(annual_days),
+        "max_drawdown": (values / values.cummax() - 1).min(),
+        "current_drawdown": values.iloc[-1] / values.max() - 1,
+        "bars": len(values),
+    }
+
+
+def test_accumulator_matches_full_pass_and_batch():
+    nav = random_nav()
+    trades = random_trades(nav.columns)
+    batch = batch_performance(nav, trades, risk_free_rate=0.0)
+    for code in nav.columns:
+        acc = PerformanceAccumulator(risk_free_rate=0.0)
+        for value in nav[code].dropna():
+            acc.update(value)
+        for trade in trades[trades["stock_code"] == code].itertuples():
+            acc.record_fill(trade.amount, None if np.isnan(trade.profit) else trade.profit)
+        snapshot = acc.snapshot()
+        for metric, value in full_pass(nav[code]).items():
+            assert np.isclose(snapshot[metric], value, rtol=1e-10), (code, metric)
+        for metric in METRIC_NAMES:
+            assert np.isclose(snapshot[metric], batch.loc[code, metric], rtol=1e-10), (code, metric)
+
+
+def test_snapshot_midway_matches_prefix():
+    nav = random_nav(n_cols=1)["000000"]
+    acc = PerformanceAccumulator(initial_value=nav.iloc[0], risk_free_rate=0.03)
+    for i, value in enumerate(nav.iloc[1:], start=2):
+        acc.update(value)
+        if i in (2, 50, len(nav)):
+            expected = full_pass(nav.iloc[:i], risk_free_rate=0.03)
+            snapshot = acc.snapshot()
+            for metric, value in expected.items():
+                assert np.isclose(snapshot[metric], value, rtol=1e-10, equal_nan=True), (i, metric)
+
+
+def test_chunked_simulation_matches_single_batch():
+    rng = np.random.default_rng(3)
+    paths = rng.normal(0.0005, 0.01, (1000, 60))
+    observed = paths[0]
+
+    def simulate(max_cells):
+        position = [0]  # 已取出的路径数，make_returns按顺序逐批返回
+
+        def make_returns(size):
+            start = position[0]
+            position[0] += size
+            return paths[start:start + size]
+
+        return _simulate("test", observed, make_returns, len(paths), max_cells, 252, 0.0, {})
+
+    single = simulate(len(paths) * 60)
+    for max_cells in (1, 60 * 7, 60 * 333 + 5):
+        chunked = simulate(max_cells)
+        pd.testing.assert_frame_equal(chunked.samples, single.samples)
+        pd.testing.assert_series_equal(chunked.observed, single.observed)
+    expected = path_metrics(paths, 252, 0.0)
+    for metric in ROBUST_METRICS:
+        np.testing.assert_allclose(single.samples[metric], expected[metric], rtol=1e-12)
+
+
+def test_resampling_is_reproducible_and_shuffle_keeps_total_return():
+    rng = np.random.default_rng(4)
+    returns = rng.normal(0.0005, 0.01, 250)
+    first = bootstrap_analysis(returns, n_paths=500, seed=1, max_cells=10_000)
+    second = bootstrap_analysis(returns, n_paths=500, seed=1, max_cells=10_000)
+    pd.testing.assert_frame_equal(first.samples, second.samples)
+
+    position = np.repeat(rng.integers(0, 2, 25), 10)
+    report = trade_shuffle_analysis(returns, position, n_paths=200, seed=2, max_cells=5_000)
+    np.testing.assert_allclose(report.samples["total_return"], report.observed["total_return"], rtol=1e-10)
+    assert (report.samples["max_drawdown"] <= 0).all()
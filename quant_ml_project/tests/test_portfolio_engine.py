@@ -0,0 +1,78 @@
+# 组合回测测试
+import numpy as np
+import pandas as pd
+
+from backtest_module.portfolio_engine import PortfolioBacktestEngine, rebalance_mask, target_weights
+
+
+def random_prices(n_days=80, n_stocks=12, seed=4):
+    """随机收盘价、开盘价、置信度宽表"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2024-01-02", periods=n_days, name="date")
+    columns = pd.Index([f"{i + 1:06d}" for i in range(n_stocks)], name="stock_code")
+    close = pd.DataFrame(10 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_stocks)), axis=0)),
+                         index=index, columns=columns)
+    exec_price = close.shift(1).fillna(close) * np.exp(rng.normal(0, 0.005, close.shape))
+    scores = pd.DataFrame(rng.random(close.shape), index=index, columns=columns)
+    return scores, close, exec_price
+
+
+def test_rebalance_mask_marks_period_ends():
+    index = pd.bdate_range("2024-01-29", "2024-03-05")
+    monthly = rebalance_mask(index, "monthly")
+    assert list(index[monthly].strftime("%Y-%m-%d")) == ["2024-01-31", "2024-02-29", "2024-03-05"]
+    assert rebalance_mask(index, 5).sum() == len(index) // 5
+    assert rebalance_mask(index, "daily").all()
+
+
+def test_target_weights_pick_top_k_with_cap():
+    scores = np.array([[0.9, 0.1, 0.5, 0.7, np.nan], [0.2, 0.3, 0.4, 0.5, 0.6]])
+    eligible = np.array([[True, True, True, False, True], [True] * 5])
+    weights = target_weights(scores, eligible, np.array([True, False]), top_k=2, max_weight=0.4)
+    np.testing.assert_allclose(weights[0], [0.4, 0.0, 0.4, 0.0, 0.0])
+    assert np.isnan(weights[1]).all()
+    weights = target_weights(scores, eligible, np.array([True, True]), top_k=3, weighting="score", max_weight=1.0,
+                             min_score=0.4)
+    np.testing.assert_allclose(weights[0], [0.9 / 1.4, 0.0, 0.5 / 1.4, 0.0, 0.0])
+    np.testing.assert_allclose(weights[1], [0.0, 0.0, 0.4 / 1.5, 0.5 / 1.5, 0.6 / 1.5])
+
+
+def test_engine_keeps_lots_cash_and_value_consistent():
+    scores, close, exec_price = random_prices()
+    engine = PortfolioBacktestEngine(initial_capital=1_000_000, top_k=5, max_weight=0.25, rebalance=10)
+    engine.run(scores, close, exec_price)
+    assert (engine.shares.to_numpy() % 100 == 0).all()
+    assert (engine.daily["cash"] >= 0).all()
+    np.testing.assert_allclose(engine.daily["value"], engine.daily["cash"] + (engine.shares * close).sum(axis=1))
+    assert (engine.daily["n_holdings"] <= 5).all()
+
+    # 现金变动与成交记录一致
+    trades = engine.trades
+    buys, sells = trades[trades["side"] == "buy"], trades[trades["side"] == "sell"]
+    cash = (1_000_000 - (buys["amount"] + buys["commission"]).sum()
+            + (sells["amount"] - sells["commission"] - sells["stamp_duty"]).sum())
+    assert np.isclose(engine.daily["cash"].iloc[-1], cash)
+    # 成交只发生在调仓决策日的下一个交易日
+    execute_dates = close.index[1:][rebalance_mask(close.index, 10)[:-1]]
+    assert trades["date"].isin(execute_dates).all()
+    assert (trades["commission"] >= 5.0).all()
+
+
+def test_blocked_buy_is_filled_on_next_tradable_day():
+    index = pd.bdate_range("2024-01-02", periods=6, name="date")
+    columns = pd.Index(["000001", "000002"], name="stock_code")
+    close = pd.DataFrame(10.0, index=index, columns=columns)
+    exec_price = close.copy()
+    exec_price.iloc[3, 0] = 11.0  # 执行日开盘涨停，不能买入
+    tradable = pd.DataFrame(True, index=index, columns=columns)
+    tradable.iloc[3:5, 1] = False  # 执行日起停牌两天
+    scores = pd.DataFrame(1.0, index=index, columns=columns)
+    engine = PortfolioBacktestEngine(initial_capital=100_000, top_k=2, max_weight=0.5, rebalance=3,
+                                     costs={"slippage": 0.0, "impact": 0.0})
+    engine.run(scores, close, exec_price, tradable)
+    buys = engine.trades.set_index("stock_code")["date"]
+    assert buys["000001"] == index[4]
+    assert buys["000002"] == index[5]
+    assert (engine.trades["side"] == "buy").all()
+    # 目标股数在执行日按当日估值价换算：涨停股按开盘价11元，停牌股按前收盘10元
+    assert engine.shares.iloc[-1].tolist() == [4500, 5000]
@@ -0,0 +1,52 @@
+# 报告导出测试
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from backtest_module.report_generator import ReportExporter, write_excel, write_table
+
+
+def sample_frame():
+    return pd.DataFrame({"date": pd.bdate_range("2024-01-01", periods=4), "stock_code": ["000001"] * 4,
+                         "total_return": [0.1, np.inf, np.nan, -np.inf], "trade_count": [1, 2, 3, 4]})
+
+
+@pytest.mark.parametrize("engine", ["xlsxwriter", "openpyxl"])
+def test_excel_round_trip(tmp_path, engine):
+    path = write_excel({"summary": sample_frame()}, str(tmp_path / "report.xlsx"), engine=engine)
+    sheet = load_workbook(path)["summary"]
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[0] == ("date", "stock_code", "total_return", "trade_count")
+    assert [row[0] for row in rows[1:]] == list(pd.bdate_range("2024-01-01", periods=4).to_pydatetime())
+    # Excel没有inf：缺失值与±inf都写为空单元格
+    assert [row[2] for row in rows[1:]] == [0.1, None, None, None]
+    assert [row[3] for row in rows[1:]] == [1, 2, 3, 4]
+    assert sheet["A2"].number_format == "yyyy-mm-dd"
+    assert sheet["C2"].number_format == "0.00%"
+
+
+def test_write_table_by_extension(tmp_path):
+    df = sample_frame()
+    pd.testing.assert_frame_equal(pd.read_parquet(write_table(df, str(tmp_path / "summary.parquet"))), df,
+                                  check_dtype=False)
+    with pytest.raises(ValueError):
+        write_table(df, str(tmp_path / "summary.txt"))
+
+
+def test_exporter_snapshots_data_at_submit(tmp_path):
+    df = sample_frame()
+    release = threading.Event()
+    path = str(tmp_path / "snapshot.parquet")
+    with ReportExporter() as exporter:
+        exporter.submit(release.wait, description="block")  # 占住唯一的工作线程，保证修改发生在写文件之前
+        exporter.table(df, path)
+        df.loc[0, "total_return"] = 99.0
+        df["trade_count"] = 0
+        release.set()
+        assert exporter.wait() == []
+    written = pd.read_parquet(path)
+    assert written.loc[0, "total_return"] == 0.1
+    assert written["trade_count"].tolist() == [1, 2, 3, 4]
@@ -0,0 +1,85 @@
+# 风控规则测试
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from main_app.risk_manager import RiskManager
+from main_app.data_interface import SignalStore
+from strategy_module.strategy_engine import InferenceEngine, generate_signal
+
+
+class FirstFeatureModel:
+    """上涨概率只取决于第一个特征的简单模型"""
+
+    def predict_proba(self, X):
+        p = 1 / (1 + np.exp(-X[:, 0]))
+        return np.c_[1 - p, p]
+
+
+@pytest.fixture
+def signal_inputs():
+    """20只股票、80个交易日的特征与价格；每只股票的特征带固定偏置，信号会连续多日为1"""
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2024-01-01", periods=80)
+    codes = [f"{i:06d}" for i in range(20)]
+    frame = pd.MultiIndex.from_product([dates, codes], names=["date", "stock_code"]).to_frame(index=False)
+    bias = np.tile(rng.normal(0, 2, 20), len(dates))
+    features = frame.assign(f=bias + rng.normal(0, 0.3, len(frame)))
+    close = np.exp(np.cumsum(rng.normal(0, 0.03, (len(dates), len(codes))), axis=0)).ravel()
+    prices = frame.assign(close=close)
+    engine = InferenceEngine(["f"])
+    engine.add_model(FirstFeatureModel(), "m")
+    return dates, features, prices, engine
+
+
+def reference_stop_exits(holding, prices, stop_loss):
+    """逐日逐股票的参考实现：持仓段内价格跌破入场价×(1-stop_loss)时卖出，本段剩余时间空仓"""
+    new_holding = np.zeros_like(holding)
+    exits = np.zeros_like(holding)
+    for j in range(holding.shape[1]):
+        entry, fired, last = np.nan, False, np.nan
+        for t in range(holding.shape[0]):
+            price = prices[t, j]
+            last = last if np.isnan(price) else price
+            if not holding[t, j] or np.isnan(last):
+                entry, fired = np.nan, False
+                continue
+            if np.isnan(entry):
+                entry = last
+            if not fired and not np.isnan(price) and price <= entry * (1 - stop_loss):
+                fired = exits[t, j] = True
+            new_holding[t, j] = not fired
+    return new_holding, exits
+
+
+def test_stop_exits_matches_reference_loop():
+    rng = np.random.default_rng(1)
+    prices = np.exp(np.cumsum(rng.normal(0, 0.03, (200, 15)), axis=0))
+    prices[rng.random(prices.shape) < 0.05] = np.nan
+    holding = rng.random(prices.shape) < 0.5
+    holding = np.repeat(holding[::10], 10, axis=0)  # 连续10天的持仓段
+    new_holding, exits = RiskManager(stop_loss=0.05).stop_exits(holding, prices)
+    ref_holding, ref_exits = reference_stop_exits(holding, prices, 0.05)
+    assert exits.any()
+    np.testing.assert_array_equal(new_holding, ref_holding)
+    np.testing.assert_array_equal(exits, ref_exits)
+
+
+def test_append_applies_stops_like_full_history(tmp_path, signal_inputs):
+    """分批追加生成的信号与一次性生成的结果一致：止损的入场价与状态延续到追加的交易日"""
+    dates, features, prices, engine = signal_inputs
+    risk = RiskManager(stop_loss=0.05, trailing_stop=0.08)
+    full_path, append_path = os.fspath(tmp_path / "full"), os.fspath(tmp_path / "append")
+    generate_signal(features, engine=engine, signal_path=None, store_path=full_path,
+                    risk_manager=risk, price_df=prices)
+    for start in range(0, len(dates), 10):
+        end = dates[min(start + 9, len(dates) - 1)]
+        batch = features[(features["date"] >= dates[start]) & (features["date"] <= end)]
+        generate_signal(batch, engine=engine, signal_path=None, store_path=append_path, append=start > 0,
+                        risk_manager=risk, price_df=prices[prices["date"] <= end])
+
+    full, appended = SignalStore(full_path).read(), SignalStore(append_path).read()
+    assert (full["signal"] != engine.predict(features)["signal"]).any()
+    pd.testing.assert_frame_equal(full, appended)
@@ -0,0 +1,89 @@
+# 推理引擎与模型缓存测试
+import gc
+import os
+import weakref
+
+import joblib
+import numpy as np
+import pytest
+
+from strategy_module.strategy_engine import InferenceEngine, ModelCache
+
+
+class ScaledModel:
+    """上涨概率为 sigmoid(scale × 第一个特征) 的简单模型"""
+
+    def __init__(self, scale):
+        self.scale = scale
+
+    def predict_proba(self, X):
+        p = 1 / (1 + np.exp(-self.scale * X[:, 0]))
+        return np.c_[1 - p, p]
+
+
+@pytest.fixture
+def X():
+    return np.random.default_rng(0).normal(size=(100, 2)).astype(np.float32)
+
+
+def test_model_file_loaded_once(tmp_path):
+    path = tmp_path / "model.pkl"
+    joblib.dump(ScaledModel(1.0), path)
+    cache = ModelCache()
+    key, model = cache.load(path)
+    assert cache.load(path) == (key, model)
+    assert len(cache) == 1
+
+
+def test_empty_shared_cache_is_used(tmp_path):
+    path = tmp_path / "model.pkl"
+    joblib.dump(ScaledModel(1.0), path)
+    cache = ModelCache()
+    engine = InferenceEngine(["a", "b"], cache)
+    assert engine.cache is cache
+    engine.add_model(path, "m")
+    assert len(cache) == 1
+
+
+def test_file_records_are_bounded(tmp_path):
+    """同一路径只保留最新版本的记录，被淘汰模型的文件记录一并删除"""
+    cache = ModelCache(max_models=2)
+    path = tmp_path / "model.pkl"
+    for version in range(5):
+        joblib.dump(ScaledModel(float(version)), path)
+        os.utime(path, ns=(version * 10**9, version * 10**9))
+        cache.load(path)
+    assert len(cache._files) == 1
+    for i in range(5):
+        joblib.dump(ScaledModel(10.0 + i), tmp_path / f"m{i}.pkl")
+        cache.load(tmp_path / f"m{i}.pkl")
+    assert len(cache) == 2 and len(cache._files) == 2
+
+
+def test_evicted_file_models_are_released(tmp_path, X):
+    """模型文件由缓存持有：被LRU淘汰后即释放，打分时按路径重新加载"""
+    cache = ModelCache(max_models=1)
+    engine = InferenceEngine(["a", "b"], cache)
+    scales = (0.5, 1.0, 2.0)
+    for scale in scales:
+        joblib.dump(ScaledModel(scale), tmp_path / f"m{scale}.pkl")
+    first = engine.add_model(tmp_path / f"m{scales[0]}.pkl", "first")
+    released = weakref.ref(cache.get(first))
+    for scale in scales[1:]:
+        engine.add_model(tmp_path / f"m{scale}.pkl", f"m{scale}")
+    gc.collect()
+    assert released() is None and len(cache) == 1
+    proba = engine.predict_proba(X)
+    expected = np.column_stack([1 / (1 + np.exp(-s * X[:, 0])) for s in scales])
+    np.testing.assert_allclose(proba, expected, rtol=1e-6)
+
+
+def test_ensemble_larger_than_cache(X):
+    """模型数超过max_models时被LRU淘汰的模型仍能参与打分"""
+    engine = InferenceEngine(["a", "b"], ModelCache(max_models=2))
+    scales = (0.5, 1.0, 2.0)
+    for scale in scales:
+        engine.add_model(ScaledModel(scale), f"m{scale}")
+    proba = engine.predict_proba(X)
+    expected = np.column_stack([1 / (1 + np.exp(-s * X[:, 0])) for s in scales])
+    np.testing.assert_allclose(proba, expected, rtol=1e-6)
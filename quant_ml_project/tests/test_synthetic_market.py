@@ -0,0 +1,41 @@
+# 模拟行情生成器测试
+import numpy as np
+import pandas as pd
+
+from data_module.synthetic_market import MISSING_COLUMNS, PRICE_LIMIT, SyntheticSource, generate_market
+
+
+def test_small_universe_is_subset_of_large():
+    small = generate_market(30, 80, seed=3, missing_rate=0.01)
+    large = generate_market(60, 80, seed=3, missing_rate=0.01)
+    subset = large[large["stock_code"].isin(small["stock_code"].unique())].reset_index(drop=True)
+    pd.testing.assert_frame_equal(small, subset)
+    pd.testing.assert_frame_equal(small, generate_market(30, 80, seed=3, missing_rate=0.01))
+
+
+def test_amount_missing_with_price_or_volume():
+    df = generate_market(30, 120, seed=5, missing_rate=0.01)
+    missing = df[list(MISSING_COLUMNS)].isna().any(axis=1)
+    assert missing.any()
+    np.testing.assert_array_equal(df["amount"].isna().to_numpy(), missing.to_numpy())
+
+
+def test_price_relations_hold():
+    df = generate_market(30, 120, seed=5, missing_rate=0.0, dtype=np.float64)
+    assert (df["high"] >= df[["open", "close"]].max(axis=1)).all()
+    assert (df["low"] <= df[["open", "close"]].min(axis=1)).all()
+    assert (df["volume"] % 100 == 0).all()
+    daily = df.groupby("stock_code")["close"].pct_change().dropna()
+    # 停牌后复牌的跳空会跨越多个交易日，只检查连续交易日
+    consecutive = df.groupby("stock_code")["date"].diff().dt.days.le(3).loc[daily.index]
+    assert (daily[consecutive].abs() <= PRICE_LIMIT + 1e-5).all()
+
+
+def test_synthetic_source_filters_by_date():
+    market = generate_market(5, 40, seed=1)
+    source = SyntheticSource(market)
+    got = source.fetch("000003", "2015-01-12", "2015-01-23")
+    assert got["date"].between("2015-01-12", "2015-01-23").all()
+    expected = market[(market["stock_code"] == "000003") & market["date"].between("2015-01-12", "2015-01-23")]
+    assert len(got) == len(expected) > 0
+    assert source.fetch("999999", "2015-01-12", "2015-01-23").empty
@@ -9,8 +9,8 @@ def calculate_features(clean_data_path):
     :param clean_data_path: 清洗后数据的路径（如data/cleaned_data/000001_clean.csv）
     :return: 包含因子和涨跌标签的DataFrame
     """
-    # 1. 读取清洗后的股票数据
-    df = pd.read_csv(clean_data_path, encoding="utf-8-sig")
+    # 1. 读取清洗后的股票数据（只读取因子计算用到的列，减少内存占用）
+    df = pd.read_csv(clean_data_path, encoding="utf-8-sig", usecols=["日期", "收盘", "成交量"])
 
     # 数据预处理：确保日期列格式正确，按时间排序
     df["日期"] = pd.to_datetime(df["日期"])
@@ -13,11 +13,11 @@ def train_model(feature_path="strategy/feature_data.csv", model_save_path="strat
     :param model_save_path: 模型保存路径
     :return: 训练好的模型
     """
-    # 1. 读取因子数据
-    df = pd.read_csv(feature_path, encoding="utf-8-sig")
-
-    # 2. 定义特征列和标签列
+    # 1. 定义特征列和标签列
     feature_cols = ["5日收益率", "收盘价_5日均线比率", "成交量变化率"]
+
+    # 2. 读取因子数据（只读取特征列和标签列）
+    df = pd.read_csv(feature_path, encoding="utf-8-sig", usecols=feature_cols + ["明日涨跌标签"])
     X = df[feature_cols]  # 特征矩阵
     y = df["明日涨跌标签"]  # 标签（1涨0跌）
 
@@ -57,8 +57,8 @@ def generate_signal(model_path="strategy/model.pkl", feature_path="strategy/feat
     """
     # 1. 加载模型和因子数据
     model = joblib.load(model_path)
-    df = pd.read_csv(feature_path, encoding="utf-8-sig")
     feature_cols = ["5日收益率", "收盘价_5日均线比率", "成交量变化率"]
+    df = pd.read_csv(feature_path, encoding="utf-8-sig", usecols=["日期", "收盘"] + feature_cols)
 
     # 2. 预测涨跌信号：1=买入（预测涨），0=卖出（预测跌）
     df["交易信号"] = model.predict(df[feature_cols])